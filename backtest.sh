@@ -1,3 +1,3 @@
 #!/bin/bash
 
-python3 scripts/main.py
\ No newline at end of file
+python3 scripts/main.py "$@"
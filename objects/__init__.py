@@ -1,21 +1,53 @@
 import numpy as np
 import pandas as pd
 from datetime import tzinfo, timedelta, datetime
-import matplotlib.pyplot as plt
 from copy import deepcopy
 import os
 import sys
+import importlib
 import warnings
-from tqdm import tqdm
 
 import pyarrow.parquet as pq
 import pyarrow as pa
 import heapq
 
-import statsmodels.api as sm
-from scipy.signal import correlate
-from statsmodels.tsa.stattools import grangercausalitytests
-from statsmodels.tsa.stattools import adfuller
-from statsmodels.stats.diagnostic import het_breuschpagan, het_white
 
-warnings.filterwarnings('ignore')
\ No newline at end of file
+class _Lazy:
+    """Stands in for a heavy module, or one of its attributes, and imports it on first use."""
+
+    def __init__(self, module, attribute=None):
+        self._module = module
+        self._attribute = attribute
+        self._target = None
+
+    def _load(self):
+        if self._target is None:
+            target = importlib.import_module(self._module)
+            self._target = getattr(target, self._attribute) if self._attribute else target
+        return self._target
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._load(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+    def __repr__(self):
+        name = f"{self._module}.{self._attribute}" if self._attribute else self._module
+        return f"<lazy {name}{'' if self._target is None else ' (loaded)'}>"
+
+
+# Research and plotting dependencies cost seconds to import and the engine never needs them
+plt = _Lazy("matplotlib.pyplot")
+sm = _Lazy("statsmodels.api")
+correlate = _Lazy("scipy.signal", "correlate")
+grangercausalitytests = _Lazy("statsmodels.tsa.stattools", "grangercausalitytests")
+adfuller = _Lazy("statsmodels.tsa.stattools", "adfuller")
+het_breuschpagan = _Lazy("statsmodels.stats.diagnostic", "het_breuschpagan")
+het_white = _Lazy("statsmodels.stats.diagnostic", "het_white")
+tqdm = _Lazy("tqdm", "tqdm")
+
+
+warnings.filterwarnings('ignore')
@@ -0,0 +1,201 @@
+from objects.action import ACTION_TYPES, SIDES, INSTRUMENTS
+
+from __init__ import *
+
+import json
+import pyarrow.compute as pc
+
+# Version 2 ("compact") action files store the categorical columns as int8 codes into the
+# tuples of objects.action, prices as integer ticks and timestamps as int64 nanoseconds.
+# A price is `price_ticks / price_scale[instrument]`, with price scales being powers of ten
+# kept in the schema metadata. Files without the format key are the legacy string layout.
+FORMAT_KEY = b"spread_trader.format"
+FORMAT_VERSION = b"2"
+CODES_KEY = b"spread_trader.codes"
+PRICE_SCALE_KEY = b"spread_trader.price_scale"
+
+LEGACY_SCHEMA = pa.schema([
+    ("action_type", pa.string()),
+    ("side", pa.string()),
+    ("price", pa.float64()),
+    ("volume", pa.int64()),
+    ("ts_dt", pa.timestamp('ns')),
+    ("instrument", pa.string())
+])
+
+COMPACT_SCHEMA = pa.schema([
+    ("action_type", pa.int8()),
+    ("side", pa.int8()),
+    ("price_ticks", pa.int64()),
+    ("volume", pa.int64()),
+    ("ts_dt", pa.timestamp('ns')),
+    ("instrument", pa.int8())
+])
+
+# ParquetWriter settings for compact files; small ints and sorted timestamps compress well
+WRITER_OPTIONS = {"compression": "zstd", "compression_level": 3}
+ROW_GROUP_SIZE = 1 << 20
+# Row groups never span two intervals of this length, so a time range can be read by
+# skipping row groups on their ts_dt statistics alone (see ActionStream)
+ROW_GROUP_INTERVAL = 15 * 60 * 10**9  # ns
+ROW_GROUP_INTERVAL_KEY = b"spread_trader.row_group_interval"
+
+MAX_PRICE_DECIMALS = 8
+
+
+def _codes_metadata():
+    return json.dumps({"action_type": ACTION_TYPES, "side": SIDES, "instrument": INSTRUMENTS}).encode()
+
+
+def is_compact(schema):
+    """Tells whether an Arrow schema is a version 2 actions schema."""
+    return (schema.metadata or {}).get(FORMAT_KEY) == FORMAT_VERSION
+
+
+def compact_schema(price_scales, metadata=None):
+    """Returns COMPACT_SCHEMA carrying the format version, codes and per-instrument price scales."""
+    metadata = dict(metadata or {})
+    metadata[FORMAT_KEY] = FORMAT_VERSION
+    metadata[CODES_KEY] = _codes_metadata()
+    metadata[PRICE_SCALE_KEY] = json.dumps(dict(sorted(price_scales.items()))).encode()
+    metadata[ROW_GROUP_INTERVAL_KEY] = str(ROW_GROUP_INTERVAL).encode()
+    return COMPACT_SCHEMA.with_metadata(metadata)
+
+
+def read_price_scales(schema):
+    """Returns the {instrument: price scale} map of a compact schema."""
+    metadata = schema.metadata or {}
+    if metadata.get(CODES_KEY, _codes_metadata()) != _codes_metadata():
+        raise ValueError("Action file was written with different category codes")
+    return json.loads(metadata[PRICE_SCALE_KEY])
+
+
+def infer_price_scale(prices):
+    """Returns the smallest power of ten that turns every price into an exact integer tick count."""
+    prices = np.asarray(prices, dtype=np.float64)
+    for decimals in range(MAX_PRICE_DECIMALS + 1):
+        scale = 10 ** decimals
+        if np.array_equal(np.round(prices * scale) / scale, prices):
+            return scale
+    raise ValueError(f"Prices need more than {MAX_PRICE_DECIMALS} decimals to be stored as ticks")
+
+
+def encode_codes(column, values):
+    """Maps a string column onto the integer codes of `values`."""
+    codes = pc.index_in(column, value_set=pa.array(values))
+    if codes.null_count:
+        raise ValueError(f"Unexpected value in column, expected one of {values}")
+    return codes.cast(pa.int8()).to_numpy()
+
+
+def decode_prices(price_ticks, instrument_codes, price_scales):
+    """Converts integer ticks back to the float prices they were encoded from."""
+    scales = np.array([price_scales.get(inst, np.nan) for inst in INSTRUMENTS], dtype=np.float64)
+    # Dividing by an exact power of ten rounds to the same float as parsing the decimal price
+    return price_ticks / scales[instrument_codes]
+
+
+def file_price_scales(path):
+    """Returns the per-instrument price scales of an actions file, inferring them for legacy files."""
+    parquet_file = pq.ParquetFile(path)
+    if is_compact(parquet_file.schema_arrow):
+        return read_price_scales(parquet_file.schema_arrow)
+
+    scales = {}
+    for batch in parquet_file.iter_batches(columns=["price", "instrument"]):
+        instruments = batch.column(1).to_numpy(zero_copy_only=False)
+        prices = batch.column(0).to_numpy()
+        for inst in np.unique(instruments):
+            scale = infer_price_scale(prices[instruments == inst])
+            scales[inst] = max(scales.get(inst, 1), scale)
+    return scales
+
+
+def to_compact_table(table, price_scales):
+    """Converts an actions table of either format to compact columns at the given price scales."""
+    if "price_ticks" in table.schema.names:
+        instrument = table.column("instrument").to_numpy()
+        own_scales = read_price_scales(table.schema)
+        factors = np.array(
+            [price_scales.get(inst, 1) // own_scales.get(inst, 1) for inst in INSTRUMENTS], dtype=np.int64
+        )
+        for inst, factor in zip(INSTRUMENTS, factors.tolist()):
+            if factor * own_scales.get(inst, 1) != price_scales.get(inst, 1):
+                raise ValueError(f"Cannot convert {inst} prices from scale {own_scales.get(inst, 1)} "
+                                 f"to scale {price_scales.get(inst, 1)} without losing ticks")
+        return pa.table({
+            "action_type": table.column("action_type"),
+            "side": table.column("side"),
+            "price_ticks": pa.array(table.column("price_ticks").to_numpy() * factors[instrument]),
+            "volume": table.column("volume"),
+            "ts_dt": table.column("ts_dt").cast(pa.timestamp('ns')),
+            "instrument": table.column("instrument"),
+        }, schema=COMPACT_SCHEMA)
+
+    instrument = encode_codes(table.column("instrument"), INSTRUMENTS)
+    scales = np.array([price_scales.get(inst, 1) for inst in INSTRUMENTS], dtype=np.float64)
+    return pa.table({
+        "action_type": encode_codes(table.column("action_type"), ACTION_TYPES),
+        "side": encode_codes(table.column("side"), SIDES),
+        "price_ticks": np.round(table.column("price").to_numpy() * scales[instrument]).astype(np.int64),
+        "volume": table.column("volume").cast(pa.int64()),
+        "ts_dt": table.column("ts_dt").cast(pa.timestamp('ns')),
+        "instrument": instrument,
+    }, schema=COMPACT_SCHEMA)
+
+
+def ts_values(table):
+    """Returns the ts_dt column of an actions table as int64 nanoseconds."""
+    return table.column("ts_dt").cast(pa.timestamp("ns")).cast(pa.int64()).to_numpy()
+
+
+class RowGroupWriter:
+    """Writes time-sorted action tables to a ParquetWriter as time-aligned row groups.
+
+    Incoming tables are buffered and cut at ROW_GROUP_INTERVAL boundaries of ts_dt; a row
+    group holds at most ROW_GROUP_SIZE rows. Call close() to flush the last group.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.pending = []
+        self.pending_rows = 0
+        self.interval = None  # Interval number of the buffered rows
+
+    def write_table(self, table):
+        intervals = ts_values(table) // ROW_GROUP_INTERVAL
+        cuts = (np.flatnonzero(intervals[1:] != intervals[:-1]) + 1).tolist() + [table.num_rows]
+        start = 0
+        for cut in cuts:
+            if cut == start:
+                continue
+            if self.interval is not None and intervals[start] != self.interval:
+                self.flush()
+            self.interval = intervals[start]
+            self.pending.append(table.slice(start, cut - start))
+            self.pending_rows += cut - start
+            if self.pending_rows >= ROW_GROUP_SIZE:
+                self.flush()
+            start = cut
+
+    def flush(self):
+        if self.pending:
+            self.writer.write_table(pa.concat_tables(self.pending), row_group_size=ROW_GROUP_SIZE)
+        self.pending, self.pending_rows = [], 0
+
+    def close(self):
+        self.flush()
+
+
+def upgrade_actions_file(input_path, output_path, batch_size=ROW_GROUP_SIZE):
+    """Rewrites an actions file of either format as a compact (version 2) file."""
+    price_scales = file_price_scales(input_path)
+    parquet_file = pq.ParquetFile(input_path)
+    schema = compact_schema(price_scales)
+    with pq.ParquetWriter(output_path, schema, **WRITER_OPTIONS) as writer:
+        row_groups = RowGroupWriter(writer)
+        for batch in parquet_file.iter_batches(batch_size):
+            table = pa.Table.from_batches([batch], schema=parquet_file.schema_arrow)
+            row_groups.write_table(to_compact_table(table, price_scales).cast(schema))
+        row_groups.close()
+    return output_path
@@ -1,54 +1,300 @@
-from objects.action import Action
+from objects.action import Action, ACTION_TYPES, SIDES, INSTRUMENTS
 from objects.order_book import OrderBook
+from objects.manifest import file_manifest, dump_manifest
+from objects.action_format import (
+    encode_codes, decode_prices, is_compact, read_price_scales, file_price_scales,
+    compact_schema, to_compact_table, ts_values, RowGroupWriter, WRITER_OPTIONS,
+    ROW_GROUP_INTERVAL, ROW_GROUP_INTERVAL_KEY,
+)
 
 from __init__ import *
 
+from collections import namedtuple
+
+# Per-event view in the column order of the actions file, so `Action(*view)` keeps working.
+ActionView = namedtuple("ActionView", ["action_type", "side", "price", "volume", "ts_dt", "instrument"])
+
+
+def _column(batch, name):
+    return batch.column(batch.schema.get_field_index(name))
+
+
+class ActionBatch:
+    """Columnar NumPy view over one record batch of actions."""
+
+    __slots__ = ("action_type", "side", "price", "volume", "ts", "instrument")
+
+    def __init__(self, action_type, side, price, volume, ts, instrument):
+        self.action_type = action_type  # int8 codes into ACTION_TYPES
+        self.side = side                # int8 codes into SIDES
+        self.price = price              # float64
+        self.volume = volume            # int64
+        self.ts = ts                    # int64 nanoseconds
+        self.instrument = instrument    # int8 codes into INSTRUMENTS
+
+    @classmethod
+    def from_record_batch(cls, batch, price_scales=None):
+        """Decodes a pyarrow RecordBatch of the compact or the legacy actions schema.
+
+        Compact batches need the {instrument: price scale} map of their file.
+        """
+        volume = _column(batch, "volume").to_numpy(zero_copy_only=False).astype(np.int64, copy=False)
+        ts = _column(batch, "ts_dt").cast(pa.timestamp("ns")).cast(pa.int64()).to_numpy()
+
+        if price_scales is not None:
+            instrument = _column(batch, "instrument").to_numpy()
+            return cls(
+                _column(batch, "action_type").to_numpy(),
+                _column(batch, "side").to_numpy(),
+                decode_prices(_column(batch, "price_ticks").to_numpy(), instrument, price_scales),
+                volume,
+                ts,
+                instrument,
+            )
+
+        return cls(
+            encode_codes(_column(batch, "action_type"), ACTION_TYPES),
+            encode_codes(_column(batch, "side"), SIDES),
+            _column(batch, "price").to_numpy(zero_copy_only=False).astype(np.float64, copy=False),
+            volume,
+            ts,
+            encode_codes(_column(batch, "instrument"), INSTRUMENTS),
+        )
+
+    def __len__(self):
+        return len(self.ts)
+
+    def slice(self, start, stop):
+        """Returns rows [start, stop) as a new ActionBatch sharing the column buffers."""
+        return ActionBatch(*(getattr(self, name)[start:stop] for name in self.__slots__))
+
+    def view(self, i):
+        """Returns row `i` as an ActionView (boxes a single event, use sparingly)."""
+        return ActionView(
+            ACTION_TYPES[self.action_type[i]],
+            SIDES[self.side[i]],
+            float(self.price[i]),
+            int(self.volume[i]),
+            pd.Timestamp(int(self.ts[i])),
+            INSTRUMENTS[self.instrument[i]],
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.view(i)
+
+
+def _ts_bound(value):
+    return None if value is None else pd.Timestamp(value).value
+
+
 class ActionStream:
-    """Handles streaming of actions from Parquet files in sorted order."""
-    def __init__(self, filepath, batch_size=100_000):
+    """Handles streaming of actions from Parquet files in sorted order.
+
+    With `start`/`end`, only actions with start <= ts_dt < end are yielded, and row groups
+    outside that range are skipped on their ts_dt statistics without being read. Skipped
+    actions never reach the books, so `start` is only valid for books that already reflect
+    every action before it; fresh books replayed from `start` are wrong. Backtests build
+    the books from the first action instead (see the config's `start`), and checkpoints
+    resume on row offsets with `iter_batches(checkpoint.row)`.
+    """
+    def __init__(self, filepath, batch_size=100_000, start=None, end=None):
         self.filepath = filepath
         self.batch_size = batch_size
+        self.start = _ts_bound(start)
+        self.end = _ts_bound(end)
         self.parquet_file = pq.ParquetFile(filepath)
-        self.batch_iter = self.parquet_file.iter_batches(batch_size)
+        schema = self.parquet_file.schema_arrow
+        self.price_scales = read_price_scales(schema) if is_compact(schema) else None  # None for legacy files
+        self.batch_iter = None  # Created on the first next_action() call
         self.current_batch = None
         self.current_index = 0
-        self._load_next_batch()
+
+    def row_groups(self):
+        """Returns (first row, number of rows, min ts, max ts) per row group; ts bounds may be None."""
+        metadata = self.parquet_file.metadata
+        ts_column = self.parquet_file.schema_arrow.get_field_index("ts_dt")
+        groups, offset = [], 0
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            statistics = row_group.column(ts_column).statistics
+            if statistics is not None and statistics.has_min_max:
+                bounds = (pd.Timestamp(statistics.min).value, pd.Timestamp(statistics.max).value)
+            else:
+                bounds = (None, None)
+            groups.append((offset, row_group.num_rows) + bounds)
+            offset += row_group.num_rows
+        return groups
+
+    def _in_range(self, min_ts, max_ts):
+        if self.start is not None and max_ts is not None and max_ts < self.start:
+            return False
+        if self.end is not None and min_ts is not None and min_ts >= self.end:
+            return False
+        return True
+
+    def iter_batches(self, start=0, stop=None):
+        """Yields rows [start, stop) of the file as ActionBatch objects, one per record batch.
+
+        Only the row groups overlapping the row range and the time range are read.
+        """
+        metadata = self.parquet_file.metadata
+        stop = metadata.num_rows if stop is None else min(stop, metadata.num_rows)
+
+        row_groups, row = [], None
+        for i, (offset, num_rows, min_ts, max_ts) in enumerate(self.row_groups()):
+            if offset < stop and offset + num_rows > start and self._in_range(min_ts, max_ts):
+                row_groups.append(i)
+                row = offset if row is None else row
+        if not row_groups:
+            return
+
+        # Actions files are time-sorted, so the selected row groups are contiguous
+        for record_batch in self.parquet_file.iter_batches(self.batch_size, row_groups=row_groups):
+            lo, hi = max(start - row, 0), min(stop - row, record_batch.num_rows)
+            row += record_batch.num_rows
+            if hi > lo:
+                batch = ActionBatch.from_record_batch(record_batch.slice(lo, hi - lo), self.price_scales)
+                if self.start is not None or self.end is not None:
+                    batch = self._clip(batch)
+                if len(batch):
+                    yield batch
+            if row >= stop:
+                break
+
+    def _clip(self, batch):
+        lo = 0 if self.start is None else int(np.searchsorted(batch.ts, self.start, side="left"))
+        hi = len(batch) if self.end is None else int(np.searchsorted(batch.ts, self.end, side="left"))
+        return batch if (lo, hi) == (0, len(batch)) else batch.slice(lo, max(lo, hi))
 
     def _load_next_batch(self):
         """Loads the next batch if available."""
         try:
-            self.current_batch = next(self.batch_iter).to_pandas()
+            self.current_batch = next(self.batch_iter)
             self.current_index = 0
         except StopIteration:
             self.current_batch = None  # No more data
 
     def next_action(self):
-        """Retrieves the next action, or None if empty."""
+        """Retrieves the next action as an ActionView, or None if empty."""
+        if self.batch_iter is None:
+            self.batch_iter = self.iter_batches()
+            self._load_next_batch()
         if self.current_batch is None:
             return None
-        action = self.current_batch.iloc[self.current_index]
+        action = self.current_batch.view(self.current_index)
         self.current_index += 1
         if self.current_index >= len(self.current_batch):  # Load next batch
             self._load_next_batch()
         return action
 
 
-def merge_sorted_actions(paths, batch_size=100_000):
-    """Merge-sorts actions from multiple instruments using external sorting."""
-    streams = {inst: ActionStream(path, batch_size) for inst, path in paths.items()}
-    heap = []
+def iter_timestamp_segments(batches, previous_ts=None):
+    """Splits ActionBatches into segments that each end on the first action of a new timestamp.
+
+    Yields (batch, start, stop, ts), where ts is the int64 timestamp opened by row stop - 1,
+    or None for a trailing segment that opens no timestamp. Evaluating the strategy after
+    every segment with a ts sees the books exactly as the old per-event loop did. When the
+    batches resume a stream, `previous_ts` is the timestamp of the row before them.
+    """
+    for batch in batches:
+        ts = batch.ts
+        firsts = np.flatnonzero(ts[1:] != ts[:-1]) + 1
+        if previous_ts is None or ts[0] != previous_ts:
+            firsts = np.concatenate(([0], firsts))
+
+        start = 0
+        for first in firsts.tolist():
+            yield batch, start, first + 1, int(ts[first])
+            start = first + 1
+        if start < len(batch):
+            yield batch, start, len(batch), None
+
+        previous_ts = ts[-1]
+
+
+MANIFEST_KEY = b"spread_trader.sources"
+
+
+def build_merged_actions(paths, output_path, batch_size=1_000_000):
+    """Merges per-instrument action files into one time-sorted file.
+
+    Works a chunk at a time: every row older than the smallest last timestamp among the
+    buffered chunks is final, so it is stable-sorted by timestamp and written out. Ties
+    keep instrument name order, then file order, as the old per-event heap merge did.
+    The output is always compact; legacy sources are converted on the fly.
+    """
+    instruments = sorted(paths)
+    files = {inst: pq.ParquetFile(paths[inst]) for inst in instruments}
+    price_scales = {}
+    for inst in instruments:
+        for name, scale in file_price_scales(paths[inst]).items():
+            price_scales[name] = max(price_scales.get(name, 1), scale)
+    schema = compact_schema(price_scales, {MANIFEST_KEY: dump_manifest(file_manifest(paths)).encode()})
+
+    batch_iters = {inst: files[inst].iter_batches(batch_size) for inst in instruments}
+    buffers = {inst: schema.empty_table() for inst in instruments}
+    last_ts = {}
+
+    def refill(inst):
+        """Appends the next non-empty batch of `inst`, dropping it from last_ts once exhausted."""
+        for record_batch in batch_iters[inst]:
+            if record_batch.num_rows:
+                table = pa.Table.from_batches([record_batch], schema=files[inst].schema_arrow)
+                table = to_compact_table(table, price_scales).cast(schema)
+                buffers[inst] = pa.concat_tables([buffers[inst], table])
+                last_ts[inst] = ts_values(table)[-1]
+                return
+        last_ts.pop(inst, None)
+
+    for inst in instruments:
+        refill(inst)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    with pq.ParquetWriter(tmp_path, schema, **WRITER_OPTIONS) as writer:
+        row_groups = RowGroupWriter(writer)
+        while True:
+            watermark = min(last_ts.values()) if last_ts else None
+
+            parts = []
+            for inst in instruments:
+                buffer = buffers[inst]
+                if watermark is None:
+                    cut = buffer.num_rows
+                else:
+                    cut = int(np.searchsorted(ts_values(buffer), watermark, side="left"))
+                if cut:
+                    parts.append(buffer.slice(0, cut))
+                    buffers[inst] = buffer.slice(cut)
+
+            if parts:
+                chunk = pa.concat_tables(parts)
+                order = np.argsort(ts_values(chunk), kind="stable")
+                row_groups.write_table(chunk.take(order))
+
+            if watermark is None:
+                break
+
+            for inst in [inst for inst, ts in last_ts.items() if ts == watermark]:
+                refill(inst)
+
+        row_groups.close()
 
-    # Initialize heap with the first action from each stream
-    for inst, stream in streams.items():
-        action = stream.next_action()
-        if action is not None:
-            heapq.heappush(heap, (action.ts_dt, inst, action))
+    os.replace(tmp_path, output_path)
+    return output_path
 
-    while heap:
-        ts_dt, inst, action = heapq.heappop(heap)
-        yield action  # Process the action (or store it in another list)
 
-        # Load the next action from the same instrument and push it to the heap
-        next_action = streams[inst].next_action()
-        if next_action is not None:
-            heapq.heappush(heap, (next_action.ts_dt, inst, next_action))
\ No newline at end of file
+def ensure_merged_actions(paths, output_path, batch_size=1_000_000):
+    """Returns `output_path`, rebuilding it only if the source action files changed."""
+    if os.path.exists(output_path):
+        schema = pq.read_schema(output_path)
+        metadata = schema.metadata or {}
+        if (
+            is_compact(schema)
+            and metadata.get(ROW_GROUP_INTERVAL_KEY) == str(ROW_GROUP_INTERVAL).encode()
+            and metadata.get(MANIFEST_KEY) == dump_manifest(file_manifest(paths)).encode()
+        ):
+            return output_path
+    print(f"🔀 Merging action files into {output_path}...")
+    return build_merged_actions(paths, output_path, batch_size)
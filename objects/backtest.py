@@ -0,0 +1,211 @@
+from objects.action import apply_actions
+from objects.portfolio import Portfolio
+from objects.trader import SpreadTrader
+from objects.order_book import OrderBook
+from objects.action_stream import ActionStream, iter_timestamp_segments
+from objects.metrics import StreamingMetrics
+
+from __init__ import *
+
+from datetime import time
+
+CNY_INITIAL = 10_000_000
+UNWIND_TIME = time(11, 0)
+
+# Every parameter of a backtest run. Configs are plain JSON-compatible dicts, so they can be
+# hashed, cached and sent to worker processes as they are.
+DEFAULT_CONFIG = {
+    "obi_thresholds": {"spot_perp": 0.1, "spot_itrf": 0.1, "perp_itrf": 0.1},
+    "unwind_time": UNWIND_TIME.isoformat(),
+    "leverage_limit": 5.0,
+    "cny_initial": CNY_INITIAL,
+    "mark_interval": 1.0,  # Seconds of exchange time between mark-to-market samples of the metrics
+    "start": None,  # Inclusive; earlier actions only build the books
+    "end": None,    # Exclusive; the replay stops at the first action at or after it
+}
+
+
+def make_config(**overrides):
+    """Returns DEFAULT_CONFIG with overrides, in the normalized form used for hashing."""
+    config = deepcopy(DEFAULT_CONFIG)
+    thresholds = overrides.pop("obi_thresholds", None) or {}
+    unknown = set(overrides) - set(config)
+    if unknown:
+        raise ValueError(f"Unknown backtest parameters: {sorted(unknown)}")
+    config.update(overrides)
+    config["obi_thresholds"].update({pair: float(value) for pair, value in thresholds.items()})
+
+    config["leverage_limit"] = float(config["leverage_limit"])
+    config["cny_initial"] = int(config["cny_initial"])
+    config["mark_interval"] = float(config["mark_interval"])
+    unwind_time = config["unwind_time"]
+    config["unwind_time"] = (unwind_time if isinstance(unwind_time, time) else time.fromisoformat(unwind_time)).isoformat()
+    for bound in ("start", "end"):
+        if config[bound] is not None:
+            config[bound] = pd.Timestamp(config[bound]).isoformat()
+    return config
+
+
+class StrategyRun:
+    """One strategy configuration: its portfolio, trader and per-timestamp decision step."""
+
+    def __init__(self, order_books, cny_initial=CNY_INITIAL, unwind_time=UNWIND_TIME,
+                 obi_thresholds=None, leverage_limit=5, journal=None, mark_interval=1.0, curve_interval=None,
+                 features=None):
+        self.order_books = order_books
+        self.cny_initial = cny_initial
+        self.unwind_time = unwind_time
+        self.portfolio = Portfolio(initial_cny=cny_initial, initial_rub=0, leverage_limit=leverage_limit)
+        self.trader = SpreadTrader(order_books, self.portfolio, obi_thresholds, journal, features)
+        self.trade_count = 0  # Timestamps at which an opening rule fired
+        self.metrics = StreamingMetrics(pd.Timedelta(seconds=mark_interval), curve_interval)
+
+    @classmethod
+    def from_config(cls, config, order_books, **kwargs):
+        """Builds the run of a config (see make_config); kwargs go to the constructor."""
+        return cls(
+            order_books,
+            cny_initial=config["cny_initial"],
+            unwind_time=time.fromisoformat(config["unwind_time"]),
+            obi_thresholds=dict(config["obi_thresholds"]),
+            leverage_limit=config["leverage_limit"],
+            mark_interval=config["mark_interval"],
+            **kwargs,
+        )
+
+    def on_timestamp(self, ts_dt):
+        """Runs the strategy once the books reflect the first action of a new timestamp."""
+        if self.portfolio.last_update_ts_dt in [None, 0]:
+            self.portfolio.last_update_ts_dt = ts_dt
+
+        if ts_dt.time() >= self.unwind_time:
+            self.trader.unwind(cny_initial=self.cny_initial)
+        else:
+            self.trade_count += self.trader.find_trade_opportunity()
+        self.metrics.mark(ts_dt.value, self.portfolio, self.order_books, self.cny_initial)
+
+    def summary(self):
+        """Returns the end-of-run balances and metrics as a flat dict."""
+        return {
+            "signals": self.trade_count,
+            "trades": len(self.trader.trades),
+            "cny_balance": self.portfolio.cny_balance,
+            "rub_balance": self.portfolio.rub_balance,
+            "perp_balance": self.portfolio.perp_balance,
+            "itrf_balance": self.portfolio.itrf_balance,
+            "approx_pnl": self.portfolio.approximate_pnl(self.order_books, self.cny_initial),
+            **self.metrics.summary(self.trader.trades.notional),
+            "evaluations": self.trader.evaluations,
+            "skipped_evaluations": self.trader.skipped_evaluations,
+        }
+
+
+def replay(batches, order_books, on_timestamp, on_segment=None, previous_ts=None, first_row=0, after_timestamp=None,
+           profiler=None):
+    """Replays ActionBatches into the books, calling on_timestamp(ts_dt) once per new timestamp.
+
+    `on_segment(batch, start, stop)` runs after every applied segment, before the strategy.
+    `after_timestamp(row, ts)` runs after the strategy with the absolute index of the next
+    row to apply, counted from `first_row`, and the int64 timestamp. To resume mid-stream,
+    pass the timestamp of the row before `batches` as `previous_ts`. A `profiler` times
+    the book updates as stage "apply_ob".
+    Returns the last timestamp seen.
+    """
+    apply = apply_actions if profiler is None else profiler.wrap(apply_actions, "apply_ob")
+    ts_dt = None
+    row, current = first_row, None
+    # Each segment ends on the first action of a new timestamp: apply it, then evaluate once
+    for batch, start, stop, ts in iter_timestamp_segments(batches, previous_ts):
+        if batch is not current:
+            row += len(current) if current is not None else 0
+            current = batch
+
+        apply(order_books, batch, start, stop)
+        if on_segment is not None:
+            on_segment(batch, start, stop)
+        if ts is None:
+            continue
+
+        ts_dt = pd.Timestamp(ts)
+        for ob in order_books.values():
+            ob.ts_dt = ts_dt
+
+        on_timestamp(ts_dt)
+        if after_timestamp is not None:
+            after_timestamp(row + stop, ts)
+
+    return ts_dt
+
+
+def clip_batches(batches, end_ns):
+    """Yields ActionBatches up to, but excluding, the first action at or after `end_ns`."""
+    for batch in batches:
+        if end_ns is None or batch.ts[-1] < end_ns:
+            yield batch
+            continue
+        stop = int(np.searchsorted(batch.ts, end_ns, side="left"))
+        if stop:
+            yield batch.slice(0, stop)
+        return
+
+
+def run_backtest(config, batches, order_books=None, on_evaluated=None, initial_state=None,
+                 checkpoint=None, checkpoint_writer=None, profiler=None, journal=None, curve_interval=None, features=None):
+    """Replays ActionBatches under a config (see make_config) and returns (StrategyRun, last timestamp).
+
+    `on_evaluated(run, ts_dt)` is called after every strategy step. The portfolio starts
+    flat, or from `initial_state` (see Portfolio.get_state) if given. With a `checkpoint`,
+    the batches must start at its row: the books, the strategy state and the journal are
+    restored from it. A `checkpoint_writer` saves checkpoints along the way. Trades
+    go to `journal` (see objects.trade_journal), or to an in-memory one. The run's metrics
+    keep an equity curve sampled every `curve_interval` if given. With `features` (see
+    objects.feature_store.FeatureView), the trader reads OBI from the feature store. A
+    `profiler` (see objects.profiler) times batch decoding, book updates, the strategy
+    step and its signal and sizing calls, reporting and checkpoint writes.
+    """
+    previous_ts, first_row = None, 0
+    if checkpoint is not None:
+        order_books, previous_ts, first_row = checkpoint.order_books, checkpoint.ts, checkpoint.row
+    elif order_books is None:
+        order_books = {inst: OrderBook(None, inst) for inst in ["spot", "itrf", "perp"]}
+    run = StrategyRun.from_config(config, order_books, journal=journal, curve_interval=curve_interval, features=features)
+    if initial_state is not None:
+        run.portfolio.set_state(initial_state)
+    if checkpoint is not None:
+        checkpoint.restore(run)
+    start = pd.Timestamp(config["start"]) if config["start"] is not None else None
+    end_ns = pd.Timestamp(config["end"]).value if config["end"] is not None else None
+
+    step = run.on_timestamp
+    if profiler is not None:
+        batches = profiler.wrap_iter(batches, "decode")
+        profiler.wrap_method(run.trader, "find_trade_opportunity")
+        profiler.wrap_method(run.trader, "unwind")
+        profiler.wrap_method(run.portfolio, "can_trade")
+        step = profiler.wrap(step, "strategy")
+        if on_evaluated is not None:
+            on_evaluated = profiler.wrap(on_evaluated, "reporting")
+
+    def on_timestamp(ts_dt):
+        if start is not None and ts_dt < start:
+            return
+        step(ts_dt)
+        if on_evaluated is not None:
+            on_evaluated(run, ts_dt)
+
+    after_timestamp = None
+    if checkpoint_writer is not None:
+        after_timestamp = lambda row, ts: checkpoint_writer.maybe_write(order_books, run, row, ts)
+        if profiler is not None:
+            after_timestamp = profiler.wrap(after_timestamp, "checkpoints")
+
+    last_ts = replay(clip_batches(batches, end_ns), order_books, on_timestamp, previous_ts=previous_ts,
+                     first_row=first_row, after_timestamp=after_timestamp, profiler=profiler)
+    return run, last_ts
+
+
+def cached_backtest(config, merged_path, cache, key):
+    """Worker entry point: runs one config over the merged actions file and stores it in `cache`."""
+    run, _ = run_backtest(config, ActionStream(merged_path).iter_batches())
+    cache.put(key, config, run.summary(), run.trader.trades)
+    return len(run.trader.trades)
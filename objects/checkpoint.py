@@ -0,0 +1,184 @@
+from objects.action import INSTRUMENTS, SIDES
+from objects.order_book import OrderBook, BookSide
+from objects.result_cache import config_hash
+from objects.trade_journal import JOURNAL_SCHEMA
+
+from __init__ import *
+
+import json
+
+CHECKPOINT_FORMAT = 3
+INDEX_SCHEMA = pa.schema([("ts_dt", pa.timestamp("ns")), ("row", pa.int64()), ("file", pa.string())])
+
+
+def checkpoint_dir(root, input_hash, config):
+    """Returns the directory of the checkpoints of one config over one set of input files."""
+    return os.path.join(root, input_hash[:16], config_hash(config)[:16])
+
+
+def _ts_value(ts_dt):
+    return None if ts_dt is None or ts_dt == 0 else pd.Timestamp(ts_dt).value
+
+
+def _ts_from_value(value):
+    return None if value is None else pd.Timestamp(value)
+
+
+class Checkpoint:
+    """Replay state after the strategy ran at timestamp `ts`, with rows [0, row) applied.
+
+    `state` holds the strategy state (portfolio, counters, running metrics, journal totals)
+    of the config that wrote the checkpoint, and `trades` the journal's trades that were
+    not flushed to part files yet. Stored as one compressed .npz: the book levels and
+    pending trades as typed columns plus the state as JSON.
+    """
+
+    def __init__(self, row, ts, order_books, state, trades):
+        self.row = row
+        self.ts = ts
+        self.order_books = order_books
+        self.state = state
+        self.trades = trades
+
+    @classmethod
+    def capture(cls, order_books, run, row, ts):
+        portfolio = run.portfolio
+        state = {
+            "portfolio": {**portfolio.get_state(), "last_update_ts_dt": _ts_value(portfolio.last_update_ts_dt)},
+            "last_pnl": portfolio.last_pnl,
+            "trade_count": run.trade_count,
+            "trades": run.trader.trades.get_state(),
+            "evaluations": run.trader.evaluations,
+            "skipped_evaluations": run.trader.skipped_evaluations,
+            "metrics": run.metrics.get_state(),
+        }
+        return cls(row, ts, order_books, state, run.trader.trades.pending_table())
+
+    def restore(self, run):
+        """Continues `run` from this checkpoint's strategy state.
+
+        The trader's signal-skip state is not stored, so every pair is re-evaluated once.
+        The metrics continue from their running sums; a kept equity curve restarts here. The
+        run's journal must hold the checkpoint's flushed trades (see TradeJournal.resume).
+        """
+        portfolio = run.portfolio
+        portfolio.set_state({
+            **self.state["portfolio"],
+            "last_update_ts_dt": _ts_from_value(self.state["portfolio"]["last_update_ts_dt"]),
+        })
+        portfolio.last_pnl = self.state["last_pnl"]
+        run.metrics.set_state(self.state["metrics"])
+        run.trade_count = self.state["trade_count"]
+        run.trader.evaluations = self.state["evaluations"]
+        run.trader.skipped_evaluations = self.state["skipped_evaluations"]
+        run.trader.trades.resume(self.state["trades"], self.trades)
+
+    def save(self, path):
+        columns = {"instrument": [], "side": [], "price": [], "volume": []}
+        for inst, ob in self.order_books.items():
+            for side, book in (("ask", ob.asks), ("bid", ob.bids)):
+                columns["instrument"].extend([INSTRUMENTS.index(inst)] * len(book))
+                columns["side"].extend([SIDES.index(side)] * len(book))
+                columns["price"].extend(book.keys())
+                columns["volume"].extend(book.values())
+
+        trades = {
+            f"trade_{name}": self.trades.column(name).cast(pa.int64() if name == "ts_dt" else field.type).to_numpy()
+            for name, field in zip(JOURNAL_SCHEMA.names, JOURNAL_SCHEMA)
+        }
+
+        meta = {"format": CHECKPOINT_FORMAT, "row": self.row, "ts": self.ts, "state": self.state}
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            instrument=np.array(columns["instrument"], dtype=np.int8),
+            side=np.array(columns["side"], dtype=np.int8),
+            price=np.array(columns["price"], dtype=np.float64),
+            volume=np.array(columns["volume"], dtype=np.int64),
+            meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8),
+            **trades,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes())
+            if meta["format"] != CHECKPOINT_FORMAT:
+                raise ValueError(f"Unsupported checkpoint format {meta['format']} in {path}")
+
+            levels = {(inst, side): [] for inst in range(len(INSTRUMENTS)) for side in range(len(SIDES))}
+            for inst, side, price, volume in zip(
+                data["instrument"].tolist(), data["side"].tolist(), data["price"].tolist(), data["volume"].tolist()
+            ):
+                levels[(inst, side)].append((price, volume))
+            trades = pa.table({name: data[f"trade_{name}"] for name in JOURNAL_SCHEMA.names}, schema=JOURNAL_SCHEMA)
+
+        ts_dt = pd.Timestamp(meta["ts"])
+        order_books = {}
+        for code, inst in enumerate(INSTRUMENTS):
+            ob = OrderBook(None, inst)
+            ob.asks = BookSide(is_bid=False, levels=levels[(code, SIDES.index("ask"))])
+            ob.bids = BookSide(is_bid=True, levels=levels[(code, SIDES.index("bid"))])
+            ob.ts_dt = ts_dt
+            order_books[inst] = ob
+
+        return cls(meta["row"], meta["ts"], order_books, meta["state"], trades)
+
+
+class CheckpointWriter:
+    """Writes a checkpoint every `interval` of market time, and keeps the directory's index.parquet."""
+
+    def __init__(self, directory, interval=pd.Timedelta(minutes=5)):
+        self.directory = directory
+        self.interval = pd.Timedelta(interval).value
+        self.last_ts = None
+        os.makedirs(directory, exist_ok=True)
+        # Checkpoints of earlier runs stay valid, as they are keyed by input files and config
+        self.index = {int(row): (ts_dt, file) for ts_dt, row, file in _read_index(directory).itertuples(index=False)}
+
+    def maybe_write(self, order_books, run, row, ts):
+        if self.last_ts is not None and ts - self.last_ts < self.interval:
+            return
+        self.last_ts = ts
+
+        # The journal's unflushed trades are saved with the checkpoint, so parts stay full chunks
+        file_name = f"{row:012d}.npz"
+        Checkpoint.capture(order_books, run, row, ts).save(os.path.join(self.directory, file_name))
+        self.index[row] = (pd.Timestamp(ts), file_name)
+
+        rows = sorted(self.index)
+        table = pa.table({
+            "ts_dt": [self.index[row][0] for row in rows],
+            "row": rows,
+            "file": [self.index[row][1] for row in rows],
+        }, schema=INDEX_SCHEMA)
+        tmp_path = os.path.join(self.directory, "index.parquet.tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(self.directory, "index.parquet"))
+
+
+def _read_index(directory):
+    path = os.path.join(directory, "index.parquet")
+    if not os.path.exists(path):
+        return INDEX_SCHEMA.empty_table().to_pandas()
+    return pq.read_table(path).to_pandas()
+
+
+def find_checkpoint(directories, ts_dt, inclusive=True):
+    """Returns the path of the latest checkpoint at or before `ts_dt` in any of the directories.
+
+    With inclusive=False the checkpoint must be strictly before `ts_dt`. Returns None if
+    there is none.
+    """
+    best = None
+    ts_dt = pd.Timestamp(ts_dt)
+    for directory in directories:
+        index = _read_index(directory)
+        index = index[(index["ts_dt"] <= ts_dt) if inclusive else (index["ts_dt"] < ts_dt)]
+        if len(index):
+            entry = index.iloc[-1]
+            if best is None or entry["row"] > best[0]:
+                best = (entry["row"], os.path.join(directory, entry["file"]))
+    return best[1] if best else None
+
@@ -0,0 +1,149 @@
+from objects.action import apply_actions, INSTRUMENTS
+from objects.order_book import OrderBook
+from objects.portfolio import Portfolio
+from objects.backtest import run_backtest
+from objects.action_stream import ActionStream
+from objects.trade_journal import TradeJournal
+from objects.metrics import StreamingMetrics
+
+from __init__ import *
+
+NS_PER_DAY = 24 * 60 * 60 * 10**9
+
+
+def scan_days(merged_path, batch_size=1_000_000):
+    """Splits a merged actions file into trading days, with the market books at each day start.
+
+    Returns a list of (day, start_row, stop_row, order_books) in file order. The books are
+    built by a single apply-only pass, which is much cheaper than a strategy replay.
+    """
+    order_books = {inst: OrderBook(None, inst) for inst in ["spot", "itrf", "perp"]}
+    days = []
+    row = 0
+    for batch in ActionStream(merged_path, batch_size).iter_batches():
+        day_codes = batch.ts // NS_PER_DAY
+        starts = np.flatnonzero(day_codes[1:] != day_codes[:-1]) + 1
+        if not days or day_codes[0] != days[-1][0]:
+            starts = np.concatenate(([0], starts))
+
+        applied = 0
+        for start in starts.tolist():
+            apply_actions(order_books, batch, applied, start)
+            applied = start
+            days.append((int(day_codes[start]), row + start, deepcopy(order_books)))
+        apply_actions(order_books, batch, applied, len(batch))
+        row += len(batch)
+
+    stops = [start for _, start, _ in days[1:]] + [row]
+    return [
+        (pd.Timestamp(code * NS_PER_DAY).strftime("%Y-%m-%d"), start, stop, books)
+        for (code, start, books), stop in zip(days, stops)
+    ]
+
+
+def traded_positions(trades, positions=None):
+    """Returns the open positions after a journal's trades, starting from `positions` (default: flat).
+
+    Positions are summed from trade sizes, so the interest accrued on the CNY balance does
+    not count as a spot position, unlike in the balances.
+    """
+    table = trades.to_table()
+    sizes = table.column("size").to_numpy()
+    buys, sells = table.column("buy_market").to_numpy(), table.column("sell_market").to_numpy()
+    positions = dict(positions or dict.fromkeys(INSTRUMENTS, 0))
+    for code, inst in enumerate(INSTRUMENTS):
+        positions[inst] += int(sizes[buys == code].sum() - sizes[sells == code].sum())
+    return positions
+
+
+def residual_positions(positions):
+    """Returns the non-zero open positions, empty when the day ended flat."""
+    return {inst: position for inst, position in positions.items() if position}
+
+
+def run_day(config, merged_path, day, start_row, stop_row, order_books, initial_state=None, initial_positions=None):
+    """Worker entry point: backtests rows [start_row, stop_row) of one trading day.
+
+    The books are seeded from `scan_days`, or from the previous day's `end_books` when
+    carrying. The portfolio starts flat unless `initial_state` and `initial_positions`
+    are carried in from the previous day.
+    """
+    order_books = deepcopy(order_books)  # The seed stays reusable when run in-process
+    batches = ActionStream(merged_path).iter_batches(start_row, stop_row)
+    # The metrics keep every clock sample of the day, so that the days can be stitched
+    run, _ = run_backtest(config, batches, order_books, initial_state=initial_state,
+                          curve_interval=pd.Timedelta(seconds=config["mark_interval"]))
+    summary = run.summary()
+
+    return {
+        "day": day,
+        "carried_in": initial_state is not None,
+        "start_state": initial_state or Portfolio(initial_cny=config["cny_initial"]).get_state(),
+        "end_state": run.portfolio.get_state(),
+        "positions": traded_positions(run.trader.trades, initial_positions),
+        "closing_bids": {inst: ob.get_best_bid_ask()[0] for inst, ob in order_books.items()},
+        "end_books": order_books,
+        "curve": run.metrics.curve,
+        "metrics": run.metrics.get_state(),
+        "summary": summary,
+        "trades": run.trader.trades,
+    }
+
+
+def stitch_days(config, results):
+    """Combines per-day results into one summary, TradeJournal and per-day table.
+
+    Each day contributes the balance changes from its start to its end state, so both
+    flat and carried-in days add up. PnL is marked at the last day's closing bids.
+    """
+    cny_initial = config["cny_initial"]
+    portfolio = Portfolio(initial_cny=cny_initial, leverage_limit=config["leverage_limit"])
+    metrics = StreamingMetrics(pd.Timedelta(seconds=config["mark_interval"]))
+    balances = ("cny_balance", "rub_balance", "itrf_balance", "perp_balance")
+
+    trades, rows, base, offset = TradeJournal(), [], 0.0, 0.0
+    for result in results:
+        for field in balances:
+            setattr(portfolio, field, getattr(portfolio, field) + result["end_state"][field] - result["start_state"][field])
+        trades.extend(result["trades"])
+
+        # Stack each day's valuation curve on the PnL of the days before it. A carried-in
+        # day already values what it inherited, so it shares the base of its chain.
+        if not result["carried_in"]:
+            base = offset
+        for ts, value in zip(*result["curve"]):
+            metrics.update(ts, value + base)
+        if result["curve"][0]:
+            offset = base + result["summary"]["approx_pnl"]
+        day_metrics = result["metrics"]
+        metrics.exposures += day_metrics["exposures"]
+        metrics.exposure_sum += day_metrics["exposure_sum"]
+        metrics.max_exposure = max(metrics.max_exposure, day_metrics["max_exposure"])
+
+        residual = residual_positions(result["positions"])
+        rows.append({
+            "day": result["day"],
+            "carried_in": result["carried_in"],
+            **result["summary"],
+            "residual": residual or None,
+        })
+
+    summary = {
+        "signals": sum(result["summary"]["signals"] for result in results),
+        "trades": len(trades),
+        **{field: getattr(portfolio, field) for field in balances},
+        "approx_pnl": _mark_to_market(portfolio, results[-1]["closing_bids"], cny_initial) if results else 0,
+        **metrics.summary(trades.notional),
+        "residual_days": [row["day"] for row in rows if row["residual"]],
+    }
+    return summary, trades, pd.DataFrame(rows)
+
+
+def _mark_to_market(portfolio, bids, cny_initial):
+    if not all(bids.values()):
+        return float("nan")
+    value = (
+        portfolio.rub_balance + portfolio.cny_balance * bids["spot"]
+        + portfolio.perp_balance * bids["perp"] + portfolio.itrf_balance * bids["itrf"]
+    )
+    return value - cny_initial * bids["spot"]
@@ -0,0 +1,206 @@
+from objects.trader import SpreadTrader
+from objects.portfolio import Portfolio
+from objects.trade import Trade
+from objects.trade_journal import TradeJournal
+from objects.metrics import StreamingMetrics
+from objects.feature_store import FeatureStore
+
+from __init__ import *
+
+from datetime import time
+
+FAST_INSTRUMENTS = ("spot", "perp", "itrf")
+QUOTE_FIELDS = ("obi", "bid_price", "bid_volume", "ask_price", "ask_volume")
+# Relative gap allowed between fired_timestamps and the `signals` of the event-driven
+# backtest reading the same feature store; trades and PnL have no such bound
+FAST_TOLERANCE = 1e-3
+
+
+def last_per_timestamp(df):
+    """Keeps the last snapshot of each timestamp of a feature frame."""
+    ts = df["ts"].to_numpy()
+    return df[np.r_[ts[1:] != ts[:-1], True]].reset_index(drop=True)
+
+
+def align_features(features):
+    """As-of joins per-instrument feature frames on the union of their timestamps.
+
+    Returns (timeline, quotes, snapshot) where quotes[inst][field] holds the latest value
+    strictly before each timeline entry (NaN before the first snapshot) and snapshot[inst]
+    the row index it came from (-1 before the first snapshot). The event-driven replay
+    runs the strategy once the first action of a new timestamp is applied, so it mostly
+    sees the books of the previous timestamp.
+    """
+    timeline = np.unique(np.concatenate([df["ts"].to_numpy() for df in features.values()]))
+    quotes, snapshot = {}, {}
+    for inst, df in features.items():
+        rows = np.searchsorted(df["ts"].to_numpy(), timeline, side="left") - 1
+        snapshot[inst] = rows
+        quotes[inst] = {}
+        for field in QUOTE_FIELDS:
+            values = df[field].to_numpy().astype(np.float64)
+            quotes[inst][field] = np.where(rows >= 0, values[np.maximum(rows, 0)], np.nan)
+    return timeline, quotes, snapshot
+
+
+class FastBacktest:
+    """Vectorized screening backtest of the OBI pair rules on top-of-book snapshot series.
+
+    The pair rules of SpreadTrader.find_trade_opportunity and unwind are evaluated as
+    array expressions over the as-of joined timeline; only the timestamps where a rule
+    can fire, plus the mark-to-market clock ticks, are stepped through to size trades
+    with Portfolio.can_trade. Trades are taken at the best quotes of the latest snapshot.
+    What a trade takes from a quote is remembered until that instrument's next snapshot,
+    but not replayed against later market actions, so results approximate the
+    event-driven engine (objects.backtest), which stays the reference.
+    """
+
+    def __init__(self, pqt_dir, days, n_levels=10):
+        # Top of book and OBI come from the feature store, built there on first use
+        store = FeatureStore(pqt_dir, n_levels)
+        features = {inst: last_per_timestamp(store.frame(days, inst, QUOTE_FIELDS)) for inst in FAST_INSTRUMENTS}
+        self.timeline, self.quotes, self.snapshot = align_features(features)
+
+    def signals(self, config):
+        """Returns (fires, unwind_candidates, in_range, opening) as boolean arrays over the timeline.
+
+        fires[(a, b)] marks the timestamps where the pair rule buying `a` and selling `b`
+        holds; opening marks those before the unwind time.
+        """
+        obi = {inst: self.quotes[inst]["obi"] for inst in FAST_INSTRUMENTS}
+        valid = np.ones(len(self.timeline), dtype=bool)
+        for inst in FAST_INSTRUMENTS:  # `if obi[...]` in the trader: no book, or a zero OBI
+            valid &= ~np.isnan(obi[inst]) & (obi[inst] != 0)
+
+        ts = self.timeline
+        in_range = np.ones(len(ts), dtype=bool)
+        if config["start"] is not None:
+            in_range &= ts >= pd.Timestamp(config["start"]).value
+        if config["end"] is not None:
+            in_range &= ts < pd.Timestamp(config["end"]).value
+        unwind = time.fromisoformat(config["unwind_time"])
+        day_ns = ts % (24 * 60 * 60 * 10**9)
+        unwind_ns = (unwind.hour * 3600 + unwind.minute * 60 + unwind.second) * 10**9 + unwind.microsecond * 1000
+        opening = in_range & valid & (day_ns < unwind_ns)
+        closing = in_range & valid & (day_ns >= unwind_ns)
+
+        fires, unwind_candidates = {}, np.zeros(len(ts), dtype=bool)
+        for a, b in SpreadTrader.PAIRS:
+            threshold = config["obi_thresholds"][f"{a}_{b}"]
+            fires[(a, b)] = opening & (obi[a] > threshold) & (obi[b] < -threshold)
+            fires[(b, a)] = opening & (obi[b] > threshold) & (obi[a] < -threshold)
+            unwind_candidates |= closing & ((obi[a] > threshold) | (obi[b] > threshold))
+        return fires, unwind_candidates, in_range, opening
+
+    def run(self, config):
+        """Backtests one config (see objects.backtest.make_config); returns (summary, TradeJournal).
+
+        `fired_timestamps` counts the timestamps where an opening pair rule holds. It matches
+        the `signals` of StrategyRun.summary to within FAST_TOLERANCE when the backtest reads
+        OBI from the same feature store; with OBI from its own books, it does not.
+        """
+        fires, unwind_candidates, in_range, opening = self.signals(config)
+        any_fire = np.zeros(len(self.timeline), dtype=bool)
+        for mask in fires.values():
+            any_fire |= mask
+
+        # Mark-to-market samples: the first valued timestamp of each clock tick
+        interval = pd.Timedelta(seconds=config["mark_interval"]).value
+        valued = in_range.copy()
+        for inst in FAST_INSTRUMENTS:
+            valued &= self.quotes[inst]["bid_price"] > 0
+        marked = np.flatnonzero(valued)
+        ticks = self.timeline[marked] // interval
+        marks = np.zeros(len(self.timeline), dtype=bool)
+        marks[marked[np.r_[True, ticks[1:] != ticks[:-1]]]] = True
+
+        cny_initial = config["cny_initial"]
+        portfolio = Portfolio(initial_cny=cny_initial, initial_rub=0, leverage_limit=config["leverage_limit"])
+        journal = TradeJournal()
+        metrics = StreamingMetrics(pd.Timedelta(interval))
+        taken = {}  # (instrument, side) -> (snapshot row, volume taken from its best quote)
+        quotes, snapshot = self.quotes, self.snapshot
+
+        def execute(i, ts_dt, buy, sell):
+            ask_row, bid_row = snapshot[buy][i], snapshot[sell][i]
+            ask_taken = taken.get((buy, "ask"), (None, 0))
+            bid_taken = taken.get((sell, "bid"), (None, 0))
+            ask_left = quotes[buy]["ask_volume"][i] - (ask_taken[1] if ask_taken[0] == ask_row else 0)
+            bid_left = quotes[sell]["bid_volume"][i] - (bid_taken[1] if bid_taken[0] == bid_row else 0)
+            available = int(min(ask_left, bid_left))
+            if available <= 0:
+                return
+            trade = Trade(ts_dt, buy, sell, quotes[buy]["ask_price"][i].item(), quotes[sell]["bid_price"][i].item(),
+                          available, "taker")
+            size = portfolio.can_trade(trade)
+            if size == 0:
+                return
+            trade.size = size
+            trade.apply(portfolio)
+            taken[(buy, "ask")] = (ask_row, quotes[buy]["ask_volume"][i] - ask_left + size)
+            taken[(sell, "bid")] = (bid_row, quotes[sell]["bid_volume"][i] - bid_left + size)
+            journal.append(trade)
+            portfolio.last_update_ts_dt = ts_dt
+
+        steps = np.flatnonzero(any_fire | unwind_candidates | marks)
+        first = np.flatnonzero(in_range)
+        if len(first):
+            portfolio.last_update_ts_dt = pd.Timestamp(self.timeline[first[0]])
+
+        for i in steps.tolist():
+            ts = int(self.timeline[i])
+            if any_fire[i] or unwind_candidates[i]:
+                ts_dt = pd.Timestamp(ts)
+                if any_fire[i]:
+                    for a, b in SpreadTrader.PAIRS:
+                        if fires[(a, b)][i]:
+                            execute(i, ts_dt, a, b)
+                        elif fires[(b, a)][i]:
+                            execute(i, ts_dt, b, a)
+                elif unwind_candidates[i]:
+                    self._unwind(i, ts_dt, config, portfolio, execute)
+            if marks[i]:
+                bids = {inst: quotes[inst]["bid_price"][i] for inst in FAST_INSTRUMENTS}
+                value = (
+                    portfolio.rub_balance + portfolio.cny_balance * bids["spot"]
+                    + portfolio.perp_balance * bids["perp"] + portfolio.itrf_balance * bids["itrf"]
+                )
+                exposure = (
+                    abs(portfolio.cny_balance - cny_initial) * bids["spot"]
+                    + abs(portfolio.perp_balance) * bids["perp"] + abs(portfolio.itrf_balance) * bids["itrf"]
+                )
+                metrics.update(ts, float(value), float(exposure / value) if value > 0 else float("nan"))
+
+        last = first[-1] if len(first) else None
+        bids = {inst: quotes[inst]["bid_price"][last] if last is not None else np.nan for inst in FAST_INSTRUMENTS}
+        approx_pnl = (
+            portfolio.rub_balance + portfolio.cny_balance * bids["spot"] + portfolio.perp_balance * bids["perp"]
+            + portfolio.itrf_balance * bids["itrf"] - cny_initial * bids["spot"]
+        )
+        summary = {
+            "fired_timestamps": int(np.count_nonzero(any_fire)),
+            "trades": len(journal),
+            "cny_balance": portfolio.cny_balance,
+            "rub_balance": portfolio.rub_balance,
+            "perp_balance": portfolio.perp_balance,
+            "itrf_balance": portfolio.itrf_balance,
+            "approx_pnl": float(approx_pnl),
+            **metrics.summary(journal.notional),
+        }
+        return summary, journal
+
+    def _unwind(self, i, ts_dt, config, portfolio, execute):
+        """SpreadTrader.unwind's pair rules at one timestamp, on the current positions."""
+        obi = {inst: self.quotes[inst]["obi"][i] for inst in FAST_INSTRUMENTS}
+        # Taken once for all pairs, as in the trader
+        positions = {
+            "spot": portfolio.cny_balance - config["cny_initial"],
+            "perp": portfolio.perp_balance,
+            "itrf": portfolio.itrf_balance,
+        }
+        for a, b in SpreadTrader.PAIRS:
+            threshold = config["obi_thresholds"][f"{a}_{b}"]
+            if positions[a] < 0 and positions[b] > 0 and obi[b] > threshold:
+                execute(i, ts_dt, a, b)
+            elif positions[a] > 0 and positions[b] < 0 and obi[a] > threshold:
+                execute(i, ts_dt, b, a)
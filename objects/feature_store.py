@@ -0,0 +1,204 @@
+from objects.manifest import file_digest
+
+from __init__ import *
+
+import json
+
+FEATURE_VERSION = 1  # Bump when the feature definitions change, to rebuild every file
+FEATURE_INSTRUMENTS = ("spot", "perp", "itrf")
+MANIFEST_NAME = "features_manifest.json"
+
+FEATURE_SCHEMA = pa.schema([
+    ("ts_dt", pa.timestamp('ns')),
+    ("bid_price", pa.float64()),
+    ("ask_price", pa.float64()),
+    ("bid_volume", pa.int64()),
+    ("ask_volume", pa.int64()),
+    ("spread", pa.float64()),
+    ("mid", pa.float64()),
+    ("bid_depth", pa.int64()),
+    ("ask_depth", pa.int64()),
+    ("bid_depth_weighted", pa.float64()),
+    ("ask_depth_weighted", pa.float64()),
+    ("obi", pa.float64()),
+])
+
+
+def compute_features(table, n_levels=10):
+    """Computes the features of a table of snapshots (see FEATURE_SCHEMA), one row per snapshot.
+
+    Best prices are 0 for an empty side, and spread and mid are then NaN. Depth is the total
+    volume of a side, and weighted depth weighs level i by 1/i. OBI is taken over the full
+    depth, as SpreadTrader.get_obi does on the books, and is NaN for an empty book.
+    """
+    weights = 1.0 / np.arange(1, n_levels + 1)
+
+    def levels(name):
+        return np.column_stack([table.column(f"{name}_{i}").to_numpy() for i in range(1, n_levels + 1)])
+
+    bid_volumes, ask_volumes = levels("bid_volume").astype(np.int64), levels("ask_volume").astype(np.int64)
+    bid_price = table.column("bid_price_1").to_numpy().astype(np.float64)
+    ask_price = table.column("ask_price_1").to_numpy().astype(np.float64)
+    bid_depth, ask_depth = bid_volumes.sum(axis=1), ask_volumes.sum(axis=1)
+    total = bid_depth + ask_depth
+    quoted = (bid_price > 0) & (ask_price > 0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pa.table({
+            "ts_dt": table.column("ts_dt").cast(pa.timestamp('ns')),
+            "bid_price": bid_price,
+            "ask_price": ask_price,
+            "bid_volume": bid_volumes[:, 0],
+            "ask_volume": ask_volumes[:, 0],
+            "spread": np.where(quoted, ask_price - bid_price, np.nan),
+            "mid": np.where(quoted, (ask_price + bid_price) / 2, np.nan),
+            "bid_depth": bid_depth,
+            "ask_depth": ask_depth,
+            "bid_depth_weighted": bid_volumes @ weights,
+            "ask_depth_weighted": ask_volumes @ weights,
+            "obi": np.where(total > 0, (bid_depth - ask_depth) / total, np.nan),
+        }, schema=FEATURE_SCHEMA)
+
+
+def build_features(source_path, output_path, n_levels=10):
+    """Writes the features of a preprocessed `*_ob_data.parquet`, one row group at a time.
+
+    Returns the number of rows written.
+    """
+    columns = ["ts_dt"] + [f"{side}_{field}_{i}" for side in ("bid", "ask") for field in ("price", "volume")
+                           for i in range(1, n_levels + 1)]
+    reader = pq.ParquetFile(source_path)
+    tmp_path = f"{output_path}.tmp"
+    rows = 0
+    with pq.ParquetWriter(tmp_path, FEATURE_SCHEMA, compression="zstd") as writer:
+        for i in range(reader.num_row_groups):
+            table = compute_features(reader.read_row_group(i, columns=columns), n_levels)
+            writer.write_table(table)
+            rows += table.num_rows
+    os.replace(tmp_path, output_path)
+    return rows
+
+
+class FeatureStore:
+    """Per-snapshot features materialized next to the snapshots, as `<day>/<instrument>_features.parquet`.
+
+    `features_manifest.json` in `pqt_dir` records the SHA-256 of every source file the
+    features were built from. Features are rebuilt only when that content changes; a source
+    whose size and modification time are unchanged is not hashed again. Reading a missing or
+    stale feature file builds it first.
+    """
+
+    def __init__(self, pqt_dir="data/preprocessed_data/pqt", n_levels=10):
+        self.pqt_dir = pqt_dir
+        self.n_levels = n_levels
+        self.manifest_path = os.path.join(pqt_dir, MANIFEST_NAME)
+        self.entries = self._load_entries()
+
+    def _load_entries(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") != FEATURE_VERSION or manifest.get("n_levels") != self.n_levels:
+            return {}  # Built with other definitions
+        return manifest["files"]
+
+    def save(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": FEATURE_VERSION, "n_levels": self.n_levels, "files": self.entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def days(self):
+        """Returns the day folders of `pqt_dir`, in order."""
+        return sorted(name for name in os.listdir(self.pqt_dir) if os.path.isdir(os.path.join(self.pqt_dir, name)))
+
+    @staticmethod
+    def _key(day, instrument):
+        return f"{day}/{instrument}"
+
+    def source_path(self, day, instrument):
+        return os.path.join(self.pqt_dir, day, f"{instrument}_ob_data.parquet")
+
+    def feature_path(self, day, instrument):
+        return os.path.join(self.pqt_dir, day, f"{instrument}_features.parquet")
+
+    def status(self, day, instrument):
+        """Returns None if the features of a source are up to date, else the digest to rebuild them for."""
+        key = self._key(day, instrument)
+        entry = self.entries.get(key)
+        stat = os.stat(self.source_path(day, instrument))
+        if entry is not None and os.path.exists(self.feature_path(day, instrument)):
+            if (entry["size"], entry["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+                return None
+            digest = file_digest(self.source_path(day, instrument))
+            if digest == entry["sha256"]:  # Touched, not changed: remember the new stat, so it is not hashed again
+                entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                self.save()
+                return None
+            return digest
+        return file_digest(self.source_path(day, instrument))
+
+    def record(self, day, instrument, digest, rows):
+        """Registers freshly built features of a source with the digest they were built from."""
+        stat = os.stat(self.source_path(day, instrument))
+        self.entries[self._key(day, instrument)] = {
+            "sha256": digest,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "rows": rows,
+        }
+
+    def build(self, day, instrument, force=False):
+        """Builds the features of one source if stale (or `force`); returns whether they were built."""
+        digest = self.status(day, instrument)
+        if digest is None and not force:
+            return False
+        digest = digest or file_digest(self.source_path(day, instrument))
+        rows = build_features(self.source_path(day, instrument), self.feature_path(day, instrument), self.n_levels)
+        self.record(day, instrument, digest, rows)
+        self.save()
+        return True
+
+    def read(self, day, instrument, columns=None):
+        """Returns the features of one (day, instrument) as an Arrow table, building them if needed."""
+        self.build(day, instrument)
+        return pq.read_table(self.feature_path(day, instrument), columns=columns, memory_map=True)
+
+    def frame(self, days, instrument, columns=None):
+        """Returns the features of several days as one DataFrame, with `ts` in int64 ns instead of ts_dt."""
+        columns = list(columns) if columns is not None else [name for name in FEATURE_SCHEMA.names if name != "ts_dt"]
+        tables = [self.read(day, instrument, ["ts_dt"] + columns) for day in days]
+        table = pa.concat_tables(tables)
+        df = pd.DataFrame({name: table.column(name).to_numpy() for name in columns})
+        df.insert(0, "ts", table.column("ts_dt").cast(pa.int64()).to_numpy())
+        return df
+
+    def view(self, days=None, instruments=FEATURE_INSTRUMENTS, columns=("obi",)):
+        """Returns a FeatureView of some columns over `days` (default: every day in the store)."""
+        days = self.days() if days is None else days
+        return FeatureView({inst: self.frame(days, inst, columns) for inst in instruments})
+
+
+class FeatureView:
+    """As-of lookups into store features, e.g. for SpreadTrader(features=...).
+
+    A lookup at `ts` returns the value of the last snapshot strictly before it: the replay
+    runs the strategy once the first action of a new timestamp is applied, so the books
+    mostly reflect the previous snapshot. Values ignore the liquidity a run's own trades took.
+    """
+
+    def __init__(self, frames):
+        self.ts = {inst: df["ts"].to_numpy() for inst, df in frames.items()}
+        self.columns = {inst: {name: df[name].to_numpy() for name in df.columns if name != "ts"} for inst, df in frames.items()}
+
+    def asof(self, instrument, ts, name):
+        """Returns `name` of the last snapshot of `instrument` before `ts` (int64 ns), or None."""
+        row = int(np.searchsorted(self.ts[instrument], ts, side="left")) - 1
+        if row < 0:
+            return None
+        value = self.columns[instrument][name][row].item()
+        return None if value != value else value  # NaN: not defined for that snapshot
+
+    def obi(self, instrument, ts):
+        return self.asof(instrument, ts, "obi")
@@ -0,0 +1,361 @@
+from objects.action import apply_actions, INSTRUMENTS
+from objects.action_stream import ActionBatch, ActionStream, iter_timestamp_segments
+from objects.profiler import LatencyHistogram
+
+from __init__ import *
+
+import asyncio
+import struct
+import time
+from collections import namedtuple
+
+# Wire records: little-endian and packed, so a frame body is a NumPy array as it is
+ACTION_RECORD = np.dtype([
+    ("ts", "<i8"), ("price", "<f8"), ("volume", "<i8"),
+    ("action_type", "i1"), ("side", "i1"), ("instrument", "i1"),
+])
+ORDER_RECORD = np.dtype([
+    ("ts", "<i8"), ("buy_price", "<f8"), ("sell_price", "<f8"), ("size", "<i8"),
+    ("buy_market", "i1"), ("sell_market", "i1"),
+])
+
+# Frame header: kind, number of records, sender wall clock in ns (time.time_ns)
+FRAME_HEADER = struct.Struct("<BIq")
+ACTIONS, ORDERS, END = 0, 1, 2
+_RECORD_SIZES = {ACTIONS: ACTION_RECORD.itemsize, ORDERS: ORDER_RECORD.itemsize, END: 0}
+
+# One frame of actions as received: sent_ns and received_ns are wall clock (comparable
+# across processes on one host), received_clock is time.perf_counter_ns of the receiver.
+Tick = namedtuple("Tick", ["batch", "sent_ns", "received_ns", "received_clock"])
+
+LATENCIES = ("feed", "tick_to_decision", "dequeue_to_decision", "decision_to_order")
+BACKPRESSURE_POLICIES = ("block", "skip")
+
+
+def encode_actions(batch):
+    """Packs an ActionBatch into an ACTION_RECORD array."""
+    records = np.empty(len(batch), dtype=ACTION_RECORD)
+    for name in ACTION_RECORD.names:
+        records[name] = getattr(batch, name)
+    return records
+
+
+def decode_actions(payload):
+    """Returns the ActionBatch of an actions frame body, as views into the payload."""
+    records = np.frombuffer(payload, dtype=ACTION_RECORD)
+    return ActionBatch(records["action_type"], records["side"], records["price"], records["volume"],
+                       records["ts"], records["instrument"])
+
+
+def encode_frame(kind, records=None):
+    """Returns a frame of `kind` stamped with the current wall clock."""
+    count = len(records) if records is not None else 0
+    header = FRAME_HEADER.pack(kind, count, time.time_ns())
+    return header + records.tobytes() if count else header
+
+
+async def read_frame(reader):
+    """Reads one frame; returns (kind, payload, sent_ns), or None once the peer closed."""
+    try:
+        kind, count, sent_ns = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+        size = _RECORD_SIZES[kind] * count
+        return kind, await reader.readexactly(size) if size else b"", sent_ns
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        return None
+
+
+def timestamp_groups(batch):
+    """Returns the (start, stop) rows of every run of equal timestamps of an ActionBatch."""
+    edges = [0, *(np.flatnonzero(batch.ts[1:] != batch.ts[:-1]) + 1).tolist(), len(batch)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+class Pacer:
+    """Holds a replay to exchange time divided by `speed`; a speed of 0 replays as fast as possible.
+
+    Exchange-time gaps longer than `max_gap` seconds (e.g. overnight) are cut to it. `max_lag`
+    is how far, in ns, the replay fell behind its schedule at worst, e.g. under backpressure.
+    """
+
+    def __init__(self, speed=1.0, max_gap=1.0):
+        self.speed = speed
+        self.max_gap = pd.Timedelta(seconds=max_gap).value
+        self.origin_ts = self.origin_clock = self.last_ts = None
+        self.max_lag = 0
+
+    async def wait(self, ts):
+        if not self.speed:
+            return
+        clock = time.perf_counter_ns()
+        if self.origin_ts is None:
+            self.origin_ts, self.origin_clock = ts, clock
+        elif ts - self.last_ts > self.max_gap:
+            self.origin_ts += ts - self.last_ts - self.max_gap
+        self.last_ts = ts
+
+        delay = self.origin_clock + (ts - self.origin_ts) / self.speed - clock
+        if delay > 0:
+            await asyncio.sleep(delay / 1e9)
+        else:
+            self.max_lag = max(self.max_lag, -delay)
+
+
+class ParquetSource:
+    """Async source replaying a merged actions file in process, one frame per timestamp.
+
+    Sources are any object with an async `ticks()` generator of Ticks. One that can take
+    orders back also has an async `send_orders(records)`, and may have an async `close()`.
+    """
+
+    def __init__(self, path, speed=1.0, max_gap=1.0, end=None):
+        self.path = path
+        self.pacer = Pacer(speed, max_gap)
+        self.end = end
+
+    async def ticks(self):
+        for batch in ActionStream(self.path, end=self.end).iter_batches():
+            for start, stop in timestamp_groups(batch):
+                await self.pacer.wait(int(batch.ts[start]))
+                now = time.time_ns()
+                yield Tick(batch.slice(start, stop), now, now, time.perf_counter_ns())
+
+
+class SocketSource:
+    """Async source reading frames from a ReplayServer over TCP, or a Unix socket with `path`.
+
+    Orders go back to the server on the same connection.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765, path=None):
+        self.host, self.port, self.path = host, port, path
+        self.reader = self.writer = None
+
+    async def connect(self):
+        if self.path is not None:
+            self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def ticks(self):
+        if self.reader is None:
+            await self.connect()
+        while True:
+            frame = await read_frame(self.reader)
+            if frame is None or frame[0] == END:
+                return
+            _, payload, sent_ns = frame
+            yield Tick(decode_actions(payload), sent_ns, time.time_ns(), time.perf_counter_ns())
+
+    async def send_orders(self, records):
+        self.writer.write(encode_frame(ORDERS, records))
+        await self.writer.drain()
+
+    async def close(self):
+        if self.writer is None:
+            return
+        try:
+            self.writer.write(encode_frame(END))  # Tells the server the run is over
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+class ReplayServer:
+    """Stands in for the exchange feed, replaying a merged actions file to every client that connects.
+
+    Each timestamp is sent as one frame, paced by a Pacer. A client that does not keep up
+    fills the socket buffers and `drain` blocks the replay, which then falls behind its
+    schedule (`max_lag_ms` in the session stats) instead of buffering without bound. Orders
+    the client sends back are counted, and each session ends when the client closes.
+    """
+
+    def __init__(self, path, speed=1.0, max_gap=1.0, end=None, sessions=None):
+        self.path = path
+        self.speed = speed
+        self.max_gap = max_gap
+        self.end = end
+        self.sessions = sessions  # Stop serving after this many sessions
+        self.stats = []
+        self._done = None
+
+    async def _read_orders(self, reader):
+        orders = 0
+        while True:
+            frame = await read_frame(reader)
+            if frame is None or frame[0] == END:
+                return orders
+            if frame[0] == ORDERS:
+                orders += len(frame[1]) // ORDER_RECORD.itemsize
+
+    async def handle(self, reader, writer):
+        pacer = Pacer(self.speed, self.max_gap)
+        orders = asyncio.create_task(self._read_orders(reader))
+        stats = {"frames": 0, "actions": 0, "orders": 0}
+        start = time.perf_counter()
+        try:
+            for batch in ActionStream(self.path, end=self.end).iter_batches():
+                records = encode_actions(batch)
+                for first, stop in timestamp_groups(batch):
+                    await pacer.wait(int(batch.ts[first]))
+                    writer.write(encode_frame(ACTIONS, records[first:stop]))
+                    await writer.drain()  # Blocks while the client is not reading
+                    stats["frames"] += 1
+                    stats["actions"] += stop - first
+            writer.write(encode_frame(END))
+            await writer.drain()
+            stats["orders"] = await orders
+        except ConnectionError:
+            orders.cancel()
+            print("⚠️ Client disconnected before the end of the replay")
+        finally:
+            writer.close()
+
+        stats.update(seconds=time.perf_counter() - start, max_lag_ms=pacer.max_lag / 1e6)
+        self.stats.append(stats)
+        print(f"📡 Session {len(self.stats)}: {stats['frames']:,} frames, {stats['actions']:,} actions, "
+              f"{stats['orders']:,} orders in {stats['seconds']:.2f}s (max lag {stats['max_lag_ms']:.1f} ms)")
+        if self.sessions is not None and len(self.stats) >= self.sessions:
+            self._done.set()
+
+    async def serve(self, host="127.0.0.1", port=8765, path=None):
+        """Serves on TCP `host:port`, or on the Unix socket `path`, until `sessions` have ended."""
+        self._done = asyncio.Event()
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            print(f"📡 Replaying {self.path} on {path or f'{host}:{port}'} at "
+                  f"{f'{self.speed:g}x' if self.speed else 'full speed'}")
+            await self._done.wait()
+
+
+class LiveRunner:
+    """Runs a StrategyRun on an async source of Ticks and measures its latencies.
+
+    A reader task moves ticks into a queue of at most `max_queue` frames, so a strategy
+    that falls behind stops the reading (and, over a socket, the replay server) instead of
+    buffering without bound. With `backpressure="skip"`, a frame with newer ones queued
+    behind it only updates the books: the strategy is evaluated again once it has caught up.
+    Book updates are never dropped. Trades are sent to the source as order frames.
+
+    Latencies: `feed`, from the server's send to receipt, per frame; `tick_to_decision`,
+    from receipt of the frame, queueing included, to the end of the strategy step, per
+    evaluated timestamp; `dequeue_to_decision`, the same from the frame leaving the queue,
+    i.e. the book updates and the strategy alone; and `decision_to_order`, from a trade
+    decision to its order being handed to the source, per order. A source replaying faster
+    than real time keeps the queue full, so `tick_to_decision` then mostly measures queueing.
+    """
+
+    def __init__(self, run, source, max_queue=1024, backpressure="block", start=None):
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy {backpressure!r}, expected one of {BACKPRESSURE_POLICIES}")
+        self.strategy = run
+        self.source = source
+        self.max_queue = max_queue
+        self.backpressure = backpressure
+        self.start = pd.Timestamp(start) if start is not None else None
+        self.latency = {name: LatencyHistogram() for name in LATENCIES}
+        self.frames = self.evaluations = self.skipped_evaluations = self.orders = self.max_queue_depth = 0
+        self._pending = []  # (trade, decision clock) not yet sent
+        run.trader.on_trade = self._on_trade
+
+    def _on_trade(self, trade):
+        self._pending.append((trade, time.perf_counter_ns()))
+
+    async def _read(self, queue):
+        async for tick in self.source.ticks():
+            await queue.put(tick)
+        await queue.put(None)
+
+    async def _send_orders(self):
+        pending, self._pending = self._pending, []
+        records = np.empty(len(pending), dtype=ORDER_RECORD)
+        for i, (trade, _) in enumerate(pending):
+            records[i] = (trade.ts_dt.value, trade.buy_price, trade.sell_price, trade.size,
+                          INSTRUMENTS.index(trade.buy_market), INSTRUMENTS.index(trade.sell_market))
+        send_orders = getattr(self.source, "send_orders", None)
+        if send_orders is not None:
+            await send_orders(records)
+        sent = time.perf_counter_ns()
+        for _, decided in pending:
+            self.latency["decision_to_order"].record(sent - decided)
+        self.orders += len(pending)
+
+    async def _consume(self, queue):
+        books = self.strategy.order_books
+        previous_ts = None
+        while True:
+            tick = await queue.get()
+            if tick is None:
+                return
+            dequeued = time.perf_counter_ns()
+            self.frames += 1
+            self.max_queue_depth = max(self.max_queue_depth, queue.qsize() + 1)
+            self.latency["feed"].record(tick.received_ns - tick.sent_ns)
+            stale = self.backpressure == "skip" and not queue.empty()
+
+            # Same segments as the replay: the strategy sees the first action of each new timestamp
+            for batch, start, stop, ts in iter_timestamp_segments((tick.batch,), previous_ts):
+                apply_actions(books, batch, start, stop)
+                if ts is None:
+                    continue
+                ts_dt = pd.Timestamp(ts)
+                for ob in books.values():
+                    ob.ts_dt = ts_dt
+                if self.start is not None and ts_dt < self.start:
+                    continue
+                if stale:
+                    self.skipped_evaluations += 1
+                    continue
+
+                self.strategy.on_timestamp(ts_dt)
+                self.evaluations += 1
+                decided = time.perf_counter_ns()
+                self.latency["tick_to_decision"].record(decided - tick.received_clock)
+                self.latency["dequeue_to_decision"].record(decided - dequeued)
+                if self._pending:
+                    await self._send_orders()
+            previous_ts = int(tick.batch.ts[-1])
+
+    async def run(self):
+        """Consumes the source to its end; returns the report."""
+        queue = asyncio.Queue(self.max_queue)
+        tasks = [asyncio.create_task(self._read(queue)), asyncio.create_task(self._consume(queue))]
+        try:
+            await asyncio.gather(*tasks)  # The first error stops both
+        finally:
+            for task in tasks:
+                task.cancel()
+            close = getattr(self.source, "close", None)
+            if close is not None:
+                await close()
+        return self.report()
+
+    def report(self):
+        return {
+            "frames": self.frames,
+            "evaluations": self.evaluations,
+            "skipped_evaluations": self.skipped_evaluations,
+            "orders": self.orders,
+            "max_queue_depth": self.max_queue_depth,
+            "backpressure": self.backpressure,
+            "latency": {name: histogram.summary() for name, histogram in self.latency.items()},
+        }
+
+    def print_report(self, report=None):
+        report = report or self.report()
+        print(f"\n⏱️  Live run: {report['frames']:,} frames, {report['evaluations']:,} evaluations, "
+              f"{report['orders']:,} orders | skipped (behind): {report['skipped_evaluations']:,} | "
+              f"max queue depth: {report['max_queue_depth']:,}")
+        print(f"  {'Latency':<19} | {'Count':>10} | {'Mean':>9} | {'p50':>9} | {'p90':>9} | {'p99':>9} | {'p99.9':>9} | {'Max':>10}")
+        for name, stage in report["latency"].items():
+            print(
+                f"  {name:<19} | {stage['count']:>10,} | {stage['mean_us']:>7.1f}µs | {stage['p50_us']:>7.1f}µs | "
+                f"{stage['p90_us']:>7.1f}µs | {stage['p99_us']:>7.1f}µs | {stage['p999_us']:>7.1f}µs | {stage['max_us']:>8.1f}µs"
+            )
@@ -0,0 +1,36 @@
+from __init__ import *
+
+import json
+import hashlib
+
+
+def file_manifest(paths):
+    """Describes named input files by absolute path, size and modification time."""
+    manifest = {}
+    for name, path in sorted(paths.items()):
+        stat = os.stat(path)
+        manifest[str(name)] = {
+            "path": os.path.abspath(path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+    return manifest
+
+
+def dump_manifest(manifest):
+    """Serializes a manifest deterministically, so equal inputs give equal bytes."""
+    return json.dumps(manifest, sort_keys=True)
+
+
+def manifest_hash(manifest):
+    """Returns a hex digest identifying a manifest."""
+    return hashlib.sha256(dump_manifest(manifest).encode()).hexdigest()
+
+
+def file_digest(path, block_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
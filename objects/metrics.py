@@ -0,0 +1,133 @@
+from __init__ import *
+
+TRADING_DAYS_PER_YEAR = 252
+METRIC_STATE_FIELDS = (
+    "next_mark", "marks", "days", "last_day", "last_value", "first_value",
+    "returns", "mean", "m2", "peak", "max_drawdown",
+    "exposures", "exposure_sum", "max_exposure", "next_curve",
+)
+
+
+class StreamingMetrics:
+    """Performance metrics of a portfolio marked to market on a fixed clock, in constant memory.
+
+    The portfolio is valued at the best bids at the first timestamp at or after every
+    `interval` tick of exchange time, so results do not depend on how often anything is
+    printed. Ticks without market activity are not sampled. Returns feed a running
+    Welford mean and variance; the running peak gives the maximum drawdown. Gross exposure
+    is the absolute value of the open positions relative to the portfolio value. With
+    `curve_interval`, a downsampled equity curve is kept as well.
+    """
+
+    def __init__(self, interval=pd.Timedelta(seconds=1), curve_interval=None, risk_free_rate=0.02):
+        self.interval = pd.Timedelta(interval).value
+        self.curve_interval = pd.Timedelta(curve_interval).value if curve_interval is not None else None
+        self.risk_free_rate = risk_free_rate
+        self.curve = ([], [])  # (ts, value) at curve_interval
+        self.set_state({field: None if field in ("last_day", "last_value", "first_value", "peak") else 0
+                        for field in METRIC_STATE_FIELDS})
+
+    def get_state(self):
+        """Returns the running sums, enough to continue from this point (without the curve)."""
+        return {field: getattr(self, field) for field in METRIC_STATE_FIELDS}
+
+    def set_state(self, state):
+        for field in METRIC_STATE_FIELDS:
+            setattr(self, field, state[field])
+
+    def mark(self, ts, portfolio, order_books, cny_initial):
+        """Values the portfolio if `ts` (int64 ns) reached the next clock tick."""
+        if ts < self.next_mark:
+            return
+        bids = {inst: order_books[inst].get_best_bid_ask()[0] for inst in ("spot", "perp", "itrf")}
+        if not all(bids.values()):  # Cannot be valued yet; retried at the next timestamp
+            return
+        self.next_mark = (ts // self.interval + 1) * self.interval
+
+        positions = (
+            abs(portfolio.cny_balance - cny_initial) * bids["spot"]
+            + abs(portfolio.perp_balance) * bids["perp"]
+            + abs(portfolio.itrf_balance) * bids["itrf"]
+        )
+        value = (
+            portfolio.rub_balance + portfolio.cny_balance * bids["spot"]
+            + portfolio.perp_balance * bids["perp"] + portfolio.itrf_balance * bids["itrf"]
+        )
+        self.update(ts, value, positions / value if value > 0 else float("nan"))
+
+    def update(self, ts, value, exposure=None):
+        """Adds one clock sample of the portfolio value, and optionally its gross exposure."""
+        self.marks += 1
+        day = ts // (24 * 60 * 60 * 10**9)
+        if day != self.last_day:
+            self.days += 1
+            self.last_day = day
+        if self.first_value is None:
+            self.first_value = value
+
+        if self.last_value is not None and self.last_value:
+            # Welford's update with the return since the previous sample
+            ret = value / self.last_value - 1
+            self.returns += 1
+            delta = ret - self.mean
+            self.mean += delta / self.returns
+            self.m2 += delta * (ret - self.mean)
+        self.last_value = value
+
+        if self.peak is None or value > self.peak:
+            self.peak = value
+        if self.peak > 0:
+            self.max_drawdown = min(self.max_drawdown, (value - self.peak) / self.peak)
+
+        if exposure is not None and exposure == exposure:
+            self.exposures += 1
+            self.exposure_sum += exposure
+            self.max_exposure = max(self.max_exposure, exposure)
+
+        if self.curve_interval is not None and ts >= self.next_curve:
+            self.next_curve = (ts // self.curve_interval + 1) * self.curve_interval
+            self.curve[0].append(ts)
+            self.curve[1].append(value)
+
+    @property
+    def periods_per_year(self):
+        return TRADING_DAYS_PER_YEAR * self.marks / self.days if self.days else 0
+
+    @property
+    def sharpe(self):
+        """Annualized Sharpe ratio of the clock-sampled returns."""
+        if self.returns < 2 or self.m2 <= 0:
+            return 0
+        periods = self.periods_per_year
+        std = np.sqrt(self.m2 / self.returns)
+        return (self.mean - self.risk_free_rate / periods) / std * np.sqrt(periods)
+
+    @property
+    def volatility(self):
+        """Annualized standard deviation of the clock-sampled returns."""
+        if self.returns < 2:
+            return 0
+        return np.sqrt(self.m2 / self.returns * self.periods_per_year)
+
+    @property
+    def mean_exposure(self):
+        return self.exposure_sum / self.exposures if self.exposures else 0
+
+    def summary(self, turnover=0.0):
+        """Returns the metrics as a flat dict; `turnover` is the traded notional in RUB."""
+        return {
+            "sharpe": self.sharpe,
+            "volatility": self.volatility,
+            "max_drawdown": self.max_drawdown,
+            "turnover": turnover / self.first_value if self.first_value else 0,
+            "mean_exposure": self.mean_exposure,
+            "max_exposure": self.max_exposure,
+            "marks": self.marks,
+        }
+
+    def curve_frame(self):
+        """Returns the downsampled equity curve as a (ts_dt, value) DataFrame."""
+        return pd.DataFrame({"ts_dt": pd.to_datetime(np.array(self.curve[0], dtype=np.int64)), "value": self.curve[1]})
+
+    def save_curve(self, path):
+        self.curve_frame().to_parquet(path, engine='pyarrow', index=False)
@@ -1,7 +1,101 @@
-from objects.action import Action
+from objects.action import Action, ACTION_TYPES, SIDES
 
 from __init__ import *
 
+from bisect import bisect_left, insort
+from itertools import count
+
+# Book versions are drawn from one counter, so a replaced side never repeats an old version
+_versions = count()
+
+
+class BookSide(dict):
+    """One side of the book: a price -> volume dict that also keeps its prices sorted.
+
+    The sorted price list makes the best price and the n-th level O(1) lookups, at the
+    cost of a bisect on insertion and removal of a price level. `total` is the running
+    sum of all volumes on the side, kept up to date on every write. `version` changes on
+    every write, so readers can tell an untouched side without looking at its levels.
+    """
+
+    __slots__ = ("is_bid", "prices", "total", "version")
+
+    def __init__(self, is_bid, levels=()):
+        super().__init__()
+        self.is_bid = is_bid
+        self.prices = []  # Ascending
+        self.total = 0
+        self.version = next(_versions)
+        for price, volume in levels:
+            self[price] = volume
+
+    def __setitem__(self, price, volume):
+        old_volume = dict.get(self, price)
+        if old_volume is None:
+            insort(self.prices, price)
+            old_volume = 0
+        self.total += volume - old_volume
+        self.version = next(_versions)
+        dict.__setitem__(self, price, volume)
+
+    def __delitem__(self, price):
+        self.total -= self[price]
+        self.version = next(_versions)
+        dict.__delitem__(self, price)
+        del self.prices[bisect_left(self.prices, price)]
+
+    def pop(self, price, *default):
+        if price in self:
+            volume = self[price]
+            del self[price]
+            return volume
+        return dict.pop(self, price, *default)
+
+    def clear(self):
+        dict.clear(self)
+        self.prices.clear()
+        self.total = 0
+        self.version = next(_versions)
+
+    def update(self, *args, **kwargs):
+        for price, volume in dict(*args, **kwargs).items():
+            self[price] = volume
+
+    def setdefault(self, price, volume=None):
+        if price not in self:
+            self[price] = volume
+        return self[price]
+
+    def popitem(self):
+        if not self:
+            raise KeyError("popitem(): book side is empty")
+        price = next(reversed(self))  # Last inserted, as dict.popitem
+        return price, self.pop(price)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def copy(self):
+        return type(self)(self.is_bid, self.items())
+
+    def best(self):
+        """Returns the best price of this side, or None if it is empty."""
+        if not self.prices:
+            return None
+        return self.prices[-1] if self.is_bid else self.prices[0]
+
+    def level(self, n):
+        """Returns (price, volume) of the n-th best level (1-based), or None if too shallow."""
+        if n > len(self.prices):
+            return None
+        price = self.prices[-n] if self.is_bid else self.prices[n - 1]
+        return price, self[price]
+
+    def __reduce__(self):
+        return type(self), (self.is_bid, list(self.items()))
+
+
 class OrderBook:
     def __init__(self, row, instrument):
         """Initialize order book from a row."""
@@ -19,12 +113,12 @@ class OrderBook:
             self.ts_ns = 0
             self.ts_dt = 0
             
-            self.asks = {}
-            self.bids = {}
+            self.asks = BookSide(is_bid=False)
+            self.bids = BookSide(is_bid=True)
 
     def _parse_levels(self, row, side):
         """Parse order book levels into a structured format."""
-        book = {}
+        book = BookSide(is_bid=(side == 'bid'))
         n_levels = 10
         for i in range(1, n_levels + 1):
             price = row[f'{side}_price_{i}']
@@ -69,9 +163,70 @@ class OrderBook:
 
     def get_best_bid_ask(self):
         """Returns the best available bid and ask prices."""
-        best_bid = max(self.bids.keys()) if self.bids else None
-        best_ask = min(self.asks.keys()) if self.asks else None
-        return best_bid, best_ask
+        return self.bids.best(), self.asks.best()
+
+    def get_side_volumes(self):
+        """Returns the total (bid, ask) volume resting in the book."""
+        return self.bids.total, self.asks.total
+
+    def get_version(self):
+        """Returns a value that changes whenever either side of the book is written."""
+        # Both sides draw from one increasing counter, so a write to either raises the sum
+        return self.bids.version + self.asks.version
+
+    def get_level(self, side, n):
+        """Returns (price, volume) of the n-th best level (1-based) of a side, or None."""
+        book = self.asks if side == "ask" else self.bids
+        return book.level(n)
 
     def __repr__(self):
-        return f"OrderBook({self.ts_dt}, Asks: {list(self.asks.items())[:3]}, Bids: {list(self.bids.items())[:3]})"
\ No newline at end of file
+        return f"OrderBook({self.ts_dt}, Asks: {list(self.asks.items())[:3]}, Bids: {list(self.bids.items())[:3]})"
+
+
+def _side_differences(old_prices, old_volumes, new_prices, new_volumes):
+    """Volume changes of one book side between consecutive (n, levels) snapshot arrays.
+
+    Returns (remove_volumes, remove_mask, add_volumes, add_mask), aligned with the old and
+    new levels respectively. Assumes the price levels of one side of a snapshot are distinct.
+    """
+    old_live = old_volumes > 0
+    new_live = new_volumes > 0
+
+    # Volume of the same price on the other snapshot, 0 if that level is absent
+    same_price = (
+        (old_prices[:, :, None] == new_prices[:, None, :]) & old_live[:, :, None] & new_live[:, None, :]
+    )
+    new_at_old = (same_price * new_volumes[:, None, :]).sum(axis=2)
+    old_at_new = (same_price * old_volumes[:, :, None]).sum(axis=1)
+
+    remove_mask = old_live & (new_at_old < old_volumes)
+    add_mask = new_live & (new_volumes > old_at_new)
+    return old_volumes - new_at_old, remove_mask, new_volumes - old_at_new, add_mask
+
+
+def compute_snapshot_differences(ask_prices, ask_volumes, bid_prices, bid_volumes):
+    """Vectorized `OrderBook.compute_differences` over consecutive snapshots.
+
+    Every argument is an (n, levels) array with levels in book order, and row i + 1 is
+    diffed against row i. Returns (row, action_type, side, price, volume) arrays in the
+    order compute_differences emits them, where `row` indexes the newer snapshot and
+    action_type/side are codes into ACTION_TYPES/SIDES.
+    """
+    remove, add = ACTION_TYPES.index("remove"), ACTION_TYPES.index("add")
+    ask, bid = SIDES.index("ask"), SIDES.index("bid")
+
+    ask_removed, ask_remove_mask, ask_added, ask_add_mask = _side_differences(
+        ask_prices[:-1], ask_volumes[:-1], ask_prices[1:], ask_volumes[1:])
+    bid_removed, bid_remove_mask, bid_added, bid_add_mask = _side_differences(
+        bid_prices[:-1], bid_volumes[:-1], bid_prices[1:], bid_volumes[1:])
+
+    # (rows, group, level) blocks in emission order: ask removes, ask adds, bid removes, bid adds
+    prices = np.stack([ask_prices[:-1], ask_prices[1:], bid_prices[:-1], bid_prices[1:]], axis=1)
+    volumes = np.stack([ask_removed, ask_added, bid_removed, bid_added], axis=1)
+    mask = np.stack([ask_remove_mask, ask_add_mask, bid_remove_mask, bid_add_mask], axis=1)
+
+    rows = np.broadcast_to(np.arange(1, len(ask_prices))[:, None, None], mask.shape)
+    action_types = np.broadcast_to(np.array([remove, add, remove, add], dtype=np.int8)[None, :, None], mask.shape)
+    sides = np.broadcast_to(np.array([ask, ask, bid, bid], dtype=np.int8)[None, :, None], mask.shape)
+
+    return rows[mask], action_types[mask], sides[mask], prices[mask], volumes[mask]
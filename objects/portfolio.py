@@ -3,6 +3,8 @@ from objects.order_book import OrderBook
 
 from __init__ import *
 
+from copy import copy
+
 class Portfolio:
     """Tracks the user's portfolio and applies interest rates."""
     
@@ -13,7 +15,6 @@ class Portfolio:
         self.perp_balance = initial_perp
         self.leverage_limit = leverage_limit
         self.last_update_ts_dt = None  # Track last interest update
-        self.value_history = []  # Store portfolio value over time
 
         self.interest_rates = {
             "CNY": 0.05,  # 5% annual rate
@@ -22,49 +23,115 @@ class Portfolio:
         
         self.last_pnl = 0
 
+    STATE_FIELDS = ("cny_balance", "rub_balance", "itrf_balance", "perp_balance", "last_update_ts_dt")
+
+    def get_state(self):
+        """Returns the balances and interest clock, enough to continue from this point."""
+        return {field: getattr(self, field) for field in self.STATE_FIELDS}
+
+    def set_state(self, state):
+        for field in self.STATE_FIELDS:
+            setattr(self, field, state[field])
+
     def apply_interest(self, current_ts_dt):
         """Accrues interest on balances based on time elapsed."""
         if self.last_update_ts_dt is None:
             self.last_update_ts_dt = current_ts_dt
             return
 
-        time_diff = (current_ts_dt.value - self.last_update_ts_dt.value) / (365 * 24 * 60 * 60 * 10**9)
-        self.cny_balance *= (1 + self.interest_rates["CNY"] * time_diff)
-        self.rub_balance *= (1 + self.interest_rates["RUB"] * time_diff)
+        cny_factor, rub_factor = self._interest_factors(current_ts_dt)
+        self.cny_balance *= cny_factor
+        self.rub_balance *= rub_factor
         self.last_update_ts_dt = current_ts_dt
 
+    def _interest_factors(self, current_ts_dt):
+        """Returns the (CNY, RUB) growth factors accrued since the last update."""
+        if self.last_update_ts_dt is None:
+            return 1, 1
+
+        time_diff = (current_ts_dt.value - self.last_update_ts_dt.value) / (365 * 24 * 60 * 60 * 10**9)
+        return 1 + self.interest_rates["CNY"] * time_diff, 1 + self.interest_rates["RUB"] * time_diff
+
     def can_trade(self, trade):
-        """Uses binary search to find the maximum safe trade size within leverage constraints."""
+        """Finds the maximum trade size, up to trade.size, that keeps leverage within the limit.
+
+        After interest accrual every balance moves linearly with the trade size, so the
+        leveraged balance is a convex piecewise-linear function of the size. It is
+        evaluated at its breakpoints and the limit crossing is interpolated exactly.
+        """
         unleveraged_balance = (
             (self.cny_balance + self.itrf_balance + self.perp_balance) * 14 + self.rub_balance
         )
-    
+
         if unleveraged_balance <= 0:
             return 0
-    
+
+        cny_factor, rub_factor = self._interest_factors(trade.ts_dt)
+        fee_rate = trade.fee_rate
+        max_size = trade.size
+        max_leveraged_balance = self.leverage_limit * unleveraged_balance
+
+        # (weight, balance at size 0, change per unit of size) for each leveraged term
+        terms = (
+            (14, self.cny_balance * cny_factor, (trade.buy_market == "spot") - (trade.sell_market == "spot")),
+            (14, self.itrf_balance, (trade.buy_market == "itrf") - (trade.sell_market == "itrf")),
+            (14, self.perp_balance, (trade.buy_market == "perp") - (trade.sell_market == "perp")),
+            (1, self.rub_balance * rub_factor,
+             trade.sell_price * (1 - fee_rate) - trade.buy_price * (1 + fee_rate)),
+        )
+
+        def leveraged_balance(size):
+            return sum(weight * abs(balance + slope * size) for weight, balance, slope in terms)
+
+        if leveraged_balance(0) > max_leveraged_balance:
+            # Already over the limit, e.g. after interest accrual at the limit: the bisection
+            # of the original implementation decides, as the limit crossing does not
+            return self._bisect_size(trade, unleveraged_balance)
+
+        sizes = sorted({0, max_size} | {
+            -balance / slope for _, balance, slope in terms
+            if slope and 0 < -balance / slope < max_size
+        })
+
+        # The feasible sizes form one interval, so the feasible breakpoints are contiguous
+        best_size = 0
+        last_feasible = None
+        for size in sizes:
+            balance = leveraged_balance(size)
+            if balance <= max_leveraged_balance:
+                best_size, last_feasible = size, (size, balance)
+            elif last_feasible is not None:
+                # Linear between breakpoints: interpolate where the limit is crossed
+                left, left_balance = last_feasible
+                best_size = left + (max_leveraged_balance - left_balance) * (size - left) / (balance - left_balance)
+                break
+
+        return round(best_size)
+
+    def _leverage_after(self, trade, size, unleveraged_balance):
+        """Leverage after trading `size`, with the balances changed exactly as Trade.apply does."""
+        portfolio = copy(self)
+        trade = copy(trade)
+        trade.size = size
+        trade.apply(portfolio)
+        leveraged_balance = (
+            (abs(portfolio.cny_balance) + abs(portfolio.itrf_balance) + abs(portfolio.perp_balance)) * 14
+            + abs(portfolio.rub_balance)
+        )
+        return leveraged_balance / unleveraged_balance
+
+    def _bisect_size(self, trade, unleveraged_balance):
+        """The original binary search for the largest size within the limit, in steps of 1e-3."""
         left, right = 0, trade.size
-        best_size = 0  
-    
+        best_size = 0
         while left <= right:
-            mid = (left + right) / 2  
-            temp_trade = deepcopy(trade)
-            temp_trade.size = mid  
-            
-            temp_portfolio = deepcopy(self)
-            temp_trade.apply(temp_portfolio)
-    
-            leveraged_balance = (
-                (abs(temp_portfolio.cny_balance) + abs(temp_portfolio.itrf_balance) + abs(temp_portfolio.perp_balance)) * 14
-                + abs(temp_portfolio.rub_balance)
-            )
-    
-            if leveraged_balance / unleveraged_balance <= self.leverage_limit:
-                best_size = mid  
-                left = mid + 1e-3  
+            mid = (left + right) / 2
+            if self._leverage_after(trade, mid, unleveraged_balance) <= self.leverage_limit:
+                best_size = mid
+                left = mid + 1e-3
             else:
-                right = mid - 1e-3  
-    
-        return round(best_size)  
+                right = mid - 1e-3
+        return round(best_size)
 
     def update_balances(self, trade):
         """Updates the portfolio after a spread trade."""
@@ -106,29 +173,9 @@ class Portfolio:
         total_value = self.rub_balance + spot_value + perp_value + itrf_value
         initial_value = cny_initial * (spot_bid if spot_bid else 0)
 
-        self.value_history.append(total_value)  
         self.last_pnl = total_value - initial_value
         return self.last_pnl
 
-    def calculate_sharpe(self, risk_free_rate=0.02):
-        """Calculates the Sharpe ratio for portfolio performance."""
-        if len(self.value_history) < 2:
-            return 0
-
-        returns = np.diff(self.value_history) / self.value_history[:-1]
-        excess_returns = returns - risk_free_rate / 252  
-
-        return np.mean(excess_returns) / np.std(excess_returns) * np.sqrt(252) if np.std(excess_returns) > 0 else 0
-
-    def calculate_max_drawdown(self):
-        """Calculates the maximum drawdown experienced by the portfolio."""
-        if not self.value_history:
-            return 0
-
-        cumulative_max = np.maximum.accumulate(self.value_history)
-        drawdowns = (self.value_history - cumulative_max) / cumulative_max
-        return np.min(drawdowns)  
-
     def __repr__(self):
         return (
             f"Portfolio:\n"
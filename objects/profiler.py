@@ -0,0 +1,180 @@
+from __init__ import *
+
+import json
+import time
+from array import array
+from contextlib import contextmanager
+
+
+class Profiler:
+    """Call counts and timers for the stages of a replay.
+
+    Stages are timed by wrapping their callables (`wrap`, `wrap_method`, `wrap_iter`), so
+    code that is handed no profiler runs unwrapped and pays nothing. With `sample_every=N`
+    only every Nth call is timed; counts stay exact and totals are scaled up from the
+    sampled calls. Times are inclusive: `find_trade_opportunity` contains `can_trade`.
+    """
+
+    def __init__(self, sample_every=1):
+        self.sample_every = max(int(sample_every), 1)
+        self.counts = {}
+        self.samples = {}  # Stage -> array of sampled call durations in ns
+        self.started = time.perf_counter_ns()
+
+    def _stage(self, name):
+        if name not in self.counts:
+            self.counts[name] = 0
+            self.samples[name] = array("q")
+        return self.samples[name]
+
+    def wrap(self, func, name):
+        """Returns func, timed as stage `name`."""
+        samples = self._stage(name)
+        counts = self.counts
+        sample_every = self.sample_every
+        clock = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            count = counts[name]
+            counts[name] = count + 1
+            if count % sample_every:
+                return func(*args, **kwargs)
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                samples.append(clock() - start)
+
+        return timed
+
+    def wrap_method(self, obj, method, name=None):
+        """Times a bound method of one object, e.g. a trader's find_trade_opportunity."""
+        setattr(obj, method, self.wrap(getattr(obj, method), name or method))
+
+    def wrap_iter(self, iterable, name):
+        """Yields from `iterable`, timing the production of every item as stage `name`."""
+        iterator = iter(iterable)
+        next_item = self.wrap(lambda: next(iterator, StopIteration), name)
+        while True:
+            item = next_item()
+            if item is StopIteration:
+                # Drop the call that found the end, and its duration if it was timed
+                self.counts[name] -= 1
+                if self.counts[name] % self.sample_every == 0:
+                    self.samples[name].pop()
+                return
+            yield item
+
+    @contextmanager
+    def timed(self, name):
+        """Times one block as a call of stage `name`, e.g. a one-off file merge."""
+        samples = self._stage(name)
+        self.counts[name] += 1
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            samples.append(time.perf_counter_ns() - start)
+
+    def report(self):
+        """Returns the per-stage totals, call counts and latency percentiles as a dict."""
+        wall = (time.perf_counter_ns() - self.started) / 1e9
+        stages = {}
+        for name, count in self.counts.items():
+            samples = np.frombuffer(self.samples[name], dtype=np.int64) if len(self.samples[name]) else np.zeros(0, np.int64)
+            sampled = len(samples)
+            total = samples.sum() / 1e9 * (count / sampled) if sampled else 0.0
+            p50, p90, p99 = (np.percentile(samples, [50, 90, 99]) / 1e3).tolist() if sampled else (0.0, 0.0, 0.0)
+            stages[name] = {
+                "calls": count,
+                "sampled_calls": sampled,
+                "total_seconds": total,
+                "share": total / wall if wall else 0.0,
+                "mean_us": total / count * 1e6 if count else 0.0,
+                "p50_us": p50,
+                "p90_us": p90,
+                "p99_us": p99,
+                "max_us": samples.max() / 1e3 if sampled else 0.0,
+            }
+        return {"wall_seconds": wall, "sample_every": self.sample_every, "stages": stages}
+
+    def print_report(self, report=None):
+        report = report or self.report()
+        print(f"\n⏱️  Replay profile ({report['wall_seconds']:.2f}s wall, every {report['sample_every']} call(s) timed)")
+        print(f"  {'Stage':<24} | {'Calls':>10} | {'Total':>8} | {'Share':>6} | {'p50':>9} | {'p90':>9} | {'p99':>9} | {'Max':>10}")
+        for name, stage in sorted(report["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+            print(
+                f"  {name:<24} | {stage['calls']:>10,} | {stage['total_seconds']:>7.2f}s | {stage['share']:>6.1%} | "
+                f"{stage['p50_us']:>7.1f}µs | {stage['p90_us']:>7.1f}µs | {stage['p99_us']:>7.1f}µs | {stage['max_us']:>8.1f}µs"
+            )
+
+    def save(self, path, report=None, **meta):
+        """Writes the report as JSON, with optional extra fields (e.g. a commit id)."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({**meta, **(report or self.report())}, f, indent=2)
+
+
+class LatencyHistogram:
+    """Latencies in nanoseconds, counted in log-linear buckets of constant memory.
+
+    Each power of two is split into 2**sub_bucket_bits buckets, so percentiles are exact to
+    within 1/2**sub_bucket_bits of the value (about 3% by default) whatever the range.
+    Count, mean, min and max are exact.
+    """
+
+    def __init__(self, sub_bucket_bits=5):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_buckets = 1 << sub_bucket_bits
+        self.counts = array("q", bytes(8 * self.sub_buckets * 64))
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, ns):
+        ns = max(int(ns), 0)
+        shift = max(ns.bit_length() - 1 - self.sub_bucket_bits, 0)
+        self.counts[shift * self.sub_buckets + (ns >> shift)] += 1
+        self.count += 1
+        self.total += ns
+        if self.min is None or ns < self.min:
+            self.min = ns
+        if ns > self.max:
+            self.max = ns
+
+    def _bucket_bounds(self, index):
+        shift = max(index // self.sub_buckets - 1, 0)
+        low = (index - shift * self.sub_buckets) << shift
+        return low, low + (1 << shift)
+
+    def percentiles(self, quantiles=(50, 90, 99, 99.9)):
+        """Returns the bucket midpoints of the requested percentiles, in ns, clipped to min and max."""
+        if not self.count:
+            return [0.0] * len(quantiles)
+        counts = np.frombuffer(self.counts, dtype=np.int64)
+        cumulative = np.cumsum(counts)
+        values = []
+        for q in quantiles:
+            index = int(np.searchsorted(cumulative, max(q / 100 * self.count, 1), side="left"))
+            low, high = self._bucket_bounds(index)
+            values.append(float(min(max((low + high - 1) / 2, self.min), self.max)))
+        return values
+
+    def summary(self):
+        """Returns count, mean and percentiles in microseconds as a dict."""
+        p50, p90, p99, p999 = (value / 1e3 for value in self.percentiles())
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count / 1e3 if self.count else 0.0,
+            "min_us": (self.min or 0) / 1e3,
+            "p50_us": p50,
+            "p90_us": p90,
+            "p99_us": p99,
+            "p999_us": p999,
+            "max_us": self.max / 1e3,
+        }
+
+    def buckets(self):
+        """Returns the non-empty buckets as (low ns, high ns, count) tuples."""
+        return [(*self._bucket_bounds(index), count) for index, count in enumerate(self.counts) if count]
@@ -0,0 +1,64 @@
+from objects.trade_journal import TradeJournal
+
+from __init__ import *
+
+import json
+import shutil
+import hashlib
+
+
+def config_hash(config):
+    """Returns a hex digest identifying a backtest config, independent of key order."""
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+def _to_json(value):
+    """json.dump fallback for NumPy scalars."""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class ResultCache:
+    """Backtest results on disk, one directory per (config hash, input manifest hash) key.
+
+    Each entry holds `summary.json` (the config and its run summary) and `trades.parquet`.
+    Entries are written to a temporary directory and renamed, so a killed run never
+    leaves a partial entry behind.
+    """
+
+    def __init__(self, root="data/results"):
+        self.root = root
+
+    @staticmethod
+    def key(config, input_hash):
+        return f"{config_hash(config)[:16]}-{input_hash[:16]}"
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self.path(key), "summary.json"))
+
+    def get(self, key):
+        """Returns the stored {"config", "summary"} entry, or None if missing."""
+        if key not in self:
+            return None
+        with open(os.path.join(self.path(key), "summary.json")) as f:
+            return json.load(f)
+
+    def load_trades(self, key):
+        """Returns the stored trade journal as a memory-mapped Arrow table (see TradeJournal.to_frame)."""
+        return TradeJournal.read(os.path.join(self.path(key), "trades.parquet"))
+
+    def put(self, key, config, summary, trades):
+        final_path = self.path(key)
+        tmp_path = f"{final_path}.tmp-{os.getpid()}"
+        os.makedirs(tmp_path, exist_ok=True)
+
+        trades.save(os.path.join(tmp_path, "trades.parquet"))
+        with open(os.path.join(tmp_path, "summary.json"), "w") as f:
+            json.dump({"config": config, "summary": summary}, f, indent=2, default=_to_json)
+
+        shutil.rmtree(final_path, ignore_errors=True)
+        os.replace(tmp_path, final_path)
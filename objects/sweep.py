@@ -0,0 +1,182 @@
+from objects.action import INSTRUMENTS, SIDES
+from objects.backtest import StrategyRun, clip_batches, make_config, replay
+
+from __init__ import *
+
+
+class OverlaySide:
+    """One configuration's private view of a shared BookSide.
+
+    Only levels where this configuration has taken liquidity are stored, as their private
+    volume, which never exceeds the shared one (0 means fully consumed). Every other level
+    reads through to the shared side, so an untouched overlay costs nothing per action.
+    """
+
+    __slots__ = ("shared", "levels", "key", "index", "consumed")
+
+    def __init__(self, shared, key, index):
+        self.shared = shared
+        self.levels = {}   # price -> private volume, only where it differs from shared
+        self.key = key     # (instrument code, side code)
+        self.index = index # Shared (instrument code, side code, price) -> overlays registry
+        self.consumed = 0  # Private writes; market actions change the shared version
+
+    def get(self, price, default=None):
+        volume = self.levels.get(price)
+        if volume is None:
+            return self.shared.get(price, default)
+        return volume if volume > 0 else default
+
+    def __contains__(self, price):
+        return self.get(price, 0) > 0
+
+    def __getitem__(self, price):
+        volume = self.get(price)
+        if volume is None:
+            raise KeyError(price)
+        return volume
+
+
+    @property
+    def total(self):
+        shared = self.shared
+        return shared.total + sum(volume - shared.get(price, 0) for price, volume in self.levels.items())
+
+    def best(self):
+        """Returns the best price not fully consumed by this configuration, or None."""
+        prices = self.shared.prices
+        ordered = reversed(prices) if self.shared.is_bid else prices
+        levels = self.levels
+        for price in ordered:
+            if levels.get(price) != 0:
+                return price
+        return None
+
+    def consume(self, price, volume):
+        """Takes executed volume off a level, as OrderBook.update_liquidity does."""
+        current = self.get(price, 0)
+        if current <= 0:
+            return
+        self.consumed += 1
+        self._set(price, max(current - volume, 0))
+
+    def _set(self, price, volume):
+        if price not in self.levels:
+            self.index.setdefault(self.key + (price,), []).append(self)
+        self.levels[price] = volume
+
+    def _drop(self, price):
+        del self.levels[price]
+        key = self.key + (price,)
+        overlays = self.index[key]
+        overlays.remove(self)
+        if not overlays:
+            del self.index[key]
+
+
+class OverlayOrderBook:
+    """Per-configuration order book: a shared OrderBook plus private liquidity consumption."""
+
+    def __init__(self, shared, index):
+        self.shared = shared
+        self.instrument = shared.instrument
+        code = INSTRUMENTS.index(shared.instrument)
+        self.asks = OverlaySide(shared.asks, (code, SIDES.index("ask")), index)
+        self.bids = OverlaySide(shared.bids, (code, SIDES.index("bid")), index)
+
+    @property
+    def ts_dt(self):
+        return self.shared.ts_dt
+
+    def update_liquidity(self, side, price, volume):
+        """Removes executed volume from this configuration's view only."""
+        (self.asks if side == "ask" else self.bids).consume(price, volume)
+
+    def get_best_bid_ask(self):
+        return self.bids.best(), self.asks.best()
+
+    def get_side_volumes(self):
+        return self.bids.total, self.asks.total
+
+    def get_version(self):
+        return self.shared.get_version(), self.bids.consumed + self.asks.consumed
+
+
+class Sweep:
+    """Evaluates several strategy configurations over a single replay of the action stream.
+
+    The market books are shared and updated once per action. Each configuration trades
+    against OverlayOrderBooks with its own Portfolio and trades, so what one configuration
+    takes out of the book is invisible to the others. Market actions are forwarded only to
+    the levels some configuration has consumed, through one shared registry lookup.
+    """
+
+    def __init__(self, order_books, configs, **run_kwargs):
+        """`configs` are backtest configs or overrides of the defaults (see make_config).
+
+        Each configuration trades from its own `start`. The replay is shared, so all of them
+        must have the same `end`. `run_kwargs` go to every StrategyRun.
+        """
+        self.order_books = order_books
+        self.configs = [make_config(**config) for config in configs]
+        ends = {config["end"] for config in self.configs}
+        if len(ends) > 1:
+            raise ValueError(f"Configurations of one sweep must share the same end, got {sorted(map(str, ends))}")
+        self.end = ends.pop() if ends else None
+        self._index = {}
+        self.runs = []
+        self._starts = []
+        for config in self.configs:
+            books = {inst: OverlayOrderBook(ob, self._index) for inst, ob in order_books.items()}
+            self.runs.append(StrategyRun.from_config(config, books, **run_kwargs))
+            self._starts.append(pd.Timestamp(config["start"]) if config["start"] is not None else None)
+
+    def on_segment(self, batch, start, stop):
+        """Replays the segment's market actions onto the consumed private levels."""
+        index = self._index
+        if not index:
+            return
+
+        touched = {}
+        for action_type, side, price, volume, instrument in zip(
+            batch.action_type[start:stop].tolist(),
+            batch.side[start:stop].tolist(),
+            batch.price[start:stop].tolist(),
+            batch.volume[start:stop].tolist(),
+            batch.instrument[start:stop].tolist(),
+        ):
+            overlays = index.get((instrument, side, price))
+            if overlays is None:
+                continue
+            for overlay in overlays:
+                levels = overlay.levels
+                if action_type:  # remove
+                    levels[price] = max(levels[price] - volume, 0)
+                else:
+                    levels[price] += volume
+                touched[(id(overlay), price)] = (overlay, price)
+
+        # A private level that caught up with the market follows it from then on
+        for overlay, price in touched.values():
+            if overlay.levels[price] == overlay.shared.get(price, 0):
+                overlay._drop(price)
+
+    def on_timestamp(self, ts_dt):
+        for run, start in zip(self.runs, self._starts):
+            if start is None or ts_dt >= start:
+                run.on_timestamp(ts_dt)
+
+    def run(self, batches):
+        """Replays the batches once, evaluating every configuration at each timestamp."""
+        end_ns = pd.Timestamp(self.end).value if self.end is not None else None
+        return replay(clip_batches(batches, end_ns), self.order_books, self.on_timestamp, self.on_segment)
+
+    def results(self):
+        """Returns one summary row per configuration, with its parameters first."""
+        rows = []
+        for config, run in zip(self.configs, self.runs):
+            params = {k: v for k, v in config.items() if k != "obi_thresholds"}
+            rows.append({**config.get("obi_thresholds", {}), **params, **run.summary()})
+        results = pd.DataFrame(rows)
+        metrics = list(self.runs[0].summary()) if self.runs else []
+        return results[[c for c in results.columns if c not in metrics] + metrics]
@@ -2,11 +2,18 @@ from objects.portfolio import Portfolio
 
 from __init__ import *
 
+TRADE_TYPES = ("maker", "taker")
+
 class Trade:
     """Represents a completed spread trade, supporting maker/taker fees."""
 
+    __slots__ = ("ts_dt", "buy_market", "sell_market", "buy_price", "sell_price", "size", "trade_type")
+
+    taker_fee = 0.55 / 10**4  # 0.55 bps taker fee
+    maker_fee = 0  # 0 bps maker rebate
+
     def __init__(self, ts_dt, buy_market, sell_market, buy_price, sell_price, size, trade_type):
-        assert trade_type in {"maker", "taker"}, "Invalid trade type"
+        assert trade_type in TRADE_TYPES, "Invalid trade type"
 
         self.ts_dt = ts_dt
         self.buy_market = buy_market
@@ -15,15 +22,18 @@ class Trade:
         self.sell_price = sell_price
         self.size = size
         self.trade_type = trade_type  # "maker" or "taker"
-        self.taker_fee = 0.55 / 10**4  # 0.55 bps taker fee
-        self.maker_fee = 0  # 0 bps maker rebate
+
+    @property
+    def fee_rate(self):
+        """Commission rate charged on each leg of the trade."""
+        return self.taker_fee if self.trade_type == "taker" else self.maker_fee
 
     def apply(self, portfolio):
         """Applies the trade's impact on the portfolio balances, considering maker/taker fees."""
         portfolio.apply_interest(self.ts_dt)
 
         # Compute commission rate
-        fee_rate = self.taker_fee if self.trade_type == "taker" else self.maker_fee
+        fee_rate = self.fee_rate
 
         # Buy side impact
         buy_cost = self.size * self.buy_price
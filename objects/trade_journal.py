@@ -0,0 +1,215 @@
+from objects.action import INSTRUMENTS
+from objects.action_format import CODES_KEY
+from objects.trade import Trade, TRADE_TYPES
+
+from __init__ import *
+
+import glob
+import json
+
+JOURNAL_SCHEMA = pa.schema([
+    ("ts_dt", pa.timestamp('ns')),
+    ("buy_market", pa.int8()),
+    ("sell_market", pa.int8()),
+    ("buy_price", pa.float64()),
+    ("sell_price", pa.float64()),
+    ("size", pa.int64()),
+    ("fee", pa.float64()),
+    ("trade_type", pa.int8()),
+], metadata={CODES_KEY: json.dumps({"market": INSTRUMENTS, "trade_type": TRADE_TYPES}).encode()})
+
+_DTYPES = {field.name: np.dtype("int64") if field.name == "ts_dt" else field.type.to_pandas_dtype() for field in JOURNAL_SCHEMA}
+
+
+class TradeJournal:
+    """Append-only trade log in preallocated typed columns, written out `chunk_size` trades at a time.
+
+    Markets and trade types are int8 codes into INSTRUMENTS and TRADE_TYPES, and `fee` is
+    the RUB commission of both legs. With a `directory`, every full chunk is written as its
+    own Parquet part file, so memory stays bounded and a crashed run keeps all flushed
+    trades. Without one, full chunks are kept as Arrow tables. Iterating yields Trade
+    objects, in order. `notional` and `fees` are running RUB totals over all trades.
+    """
+
+    def __init__(self, directory=None, chunk_size=1 << 16, keep=0):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.chunks = []  # Full chunks, when there is no directory
+        self.flushed = 0
+        self.parts = 0
+        self.notional = 0.0
+        self.fees = 0.0
+        self._columns = {name: np.empty(chunk_size, dtype=dtype) for name, dtype in _DTYPES.items()}
+        self._size = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._truncate(keep)
+
+    def _part_paths(self):
+        return _part_paths(self.directory)
+
+    def _truncate(self, keep):
+        """Keeps the first `keep` trades of earlier parts, e.g. those before a resumed checkpoint."""
+        for path in self._part_paths():
+            rows = pq.ParquetFile(path).metadata.num_rows
+            if self.flushed + rows <= keep:
+                self._add_totals(pq.read_table(path))
+                self.flushed += rows
+                self.parts += 1
+                continue
+            if self.flushed < keep:
+                table = pq.read_table(path).slice(0, keep - self.flushed)
+                self._add_totals(table)
+                os.remove(path)
+                self._write_part(table)
+            else:
+                os.remove(path)
+
+    def _add_totals(self, table):
+        size = table.column("size").to_numpy()
+        prices = table.column("buy_price").to_numpy() + table.column("sell_price").to_numpy()
+        self.notional += float(np.dot(size, prices))
+        self.fees += float(np.sum(table.column("fee").to_numpy()))
+
+    def _write_part(self, table):
+        path = os.path.join(self.directory, f"part-{self.parts:06d}.parquet")
+        pq.write_table(table, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        self.flushed += table.num_rows
+        self.parts += 1
+
+    def append(self, trade):
+        i = self._size
+        columns = self._columns
+        columns["ts_dt"][i] = trade.ts_dt.value
+        columns["buy_market"][i] = INSTRUMENTS.index(trade.buy_market)
+        columns["sell_market"][i] = INSTRUMENTS.index(trade.sell_market)
+        columns["buy_price"][i] = trade.buy_price
+        columns["sell_price"][i] = trade.sell_price
+        columns["size"][i] = trade.size
+        notional = trade.size * (trade.buy_price + trade.sell_price)
+        columns["fee"][i] = fee = notional * trade.fee_rate
+        self.notional += notional
+        self.fees += fee
+        columns["trade_type"][i] = TRADE_TYPES.index(trade.trade_type)
+        self._size = i + 1
+        if self._size == self.chunk_size:
+            self.flush()
+
+    def _buffered_table(self):
+        # Copied, as the buffer is reused once flushed
+        return pa.table(
+            {name: column[:self._size].copy() for name, column in self._columns.items()}, schema=JOURNAL_SCHEMA
+        )
+
+    def flush(self):
+        """Moves the buffered trades to a part file, or to the in-memory chunks."""
+        if not self._size:
+            return
+        table = self._buffered_table()
+        if self.directory is not None:
+            self._write_part(table)
+        else:
+            self.chunks.append(table)
+        self._size = 0
+
+    close = flush
+
+    def pending_table(self):
+        """Returns the trades not in part files yet: the buffer, or every trade without a directory."""
+        tables = list(self.chunks)
+        if self._size:
+            tables.append(self._buffered_table())
+        return pa.concat_tables(tables) if tables else JOURNAL_SCHEMA.empty_table()
+
+    def get_state(self):
+        """Returns the flushed trade count and running totals; with `pending_table`, enough to resume."""
+        return {"flushed": self.flushed, "notional": self.notional, "fees": self.fees}
+
+    def resume(self, state, pending):
+        """Continues from `get_state` and `pending_table` of an earlier run of this journal.
+
+        The first `state["flushed"]` trades must be on disk already, e.g. kept with `keep`.
+        """
+        if len(self) != self.flushed or self.flushed != state["flushed"]:
+            raise ValueError(f"Journal has {len(self):,} trades, expected {state['flushed']:,} flushed ones to resume")
+        if self.directory is None:
+            if pending.num_rows:
+                self.chunks.append(pending)
+        elif pending.num_rows >= self.chunk_size:
+            self._write_part(pending)
+        else:
+            for name in JOURNAL_SCHEMA.names:
+                column = pending.column(name)
+                if name == "ts_dt":
+                    column = column.cast(pa.int64())
+                self._columns[name][:pending.num_rows] = column.to_numpy()
+            self._size = pending.num_rows
+        # Totals as they were, not summed again in another order
+        self.notional, self.fees = state["notional"], state["fees"]
+
+    def extend(self, other):
+        """Appends every trade of another journal."""
+        self.flush()
+        table = other.to_table()
+        if not table.num_rows:
+            return
+        self.notional += other.notional
+        self.fees += other.fees
+        if self.directory is not None:
+            self._write_part(table)
+        else:
+            self.chunks.append(table)
+
+    def __len__(self):
+        return self.flushed + sum(chunk.num_rows for chunk in self.chunks) + self._size
+
+    def to_table(self):
+        """Returns all trades as one Arrow table; part files are memory-mapped, not copied."""
+        tables = list(self.chunks)
+        if self.directory is not None:
+            tables = _read_parts(self.directory)
+        if self._size:
+            tables.append(self._buffered_table())
+        return pa.concat_tables(tables) if tables else JOURNAL_SCHEMA.empty_table()
+
+    @staticmethod
+    def read(path):
+        """Reads a journal saved with `save`, or a part directory, memory-mapped."""
+        if os.path.isdir(path):
+            tables = _read_parts(path)
+            return pa.concat_tables(tables) if tables else JOURNAL_SCHEMA.empty_table()
+        return pq.read_table(path, memory_map=True)
+
+    @staticmethod
+    def to_frame(table):
+        """Decodes a journal table into a DataFrame with market and trade type names."""
+        df = table.to_pandas()
+        for name in ("buy_market", "sell_market"):
+            df[name] = np.array(INSTRUMENTS, dtype=object)[df[name].to_numpy()]
+        df["trade_type"] = np.array(TRADE_TYPES, dtype=object)[df["trade_type"].to_numpy()]
+        return df
+
+    def save(self, path):
+        pq.write_table(self.to_table(), path)
+
+    def __iter__(self):
+        table = self.to_table()
+        for ts, buy, sell, buy_price, sell_price, size, trade_type in zip(
+            table.column("ts_dt").cast(pa.int64()).to_pylist(),
+            table.column("buy_market").to_pylist(),
+            table.column("sell_market").to_pylist(),
+            table.column("buy_price").to_pylist(),
+            table.column("sell_price").to_pylist(),
+            table.column("size").to_pylist(),
+            table.column("trade_type").to_pylist(),
+        ):
+            yield Trade(pd.Timestamp(ts), INSTRUMENTS[buy], INSTRUMENTS[sell], buy_price, sell_price, size, TRADE_TYPES[trade_type])
+
+
+def _part_paths(directory):
+    return sorted(glob.glob(os.path.join(directory, "part-*.parquet")))
+
+
+def _read_parts(directory):
+    return [pq.read_table(path, memory_map=True) for path in _part_paths(directory)]
@@ -2,6 +2,7 @@ from objects.action import Action
 from objects.order_book import OrderBook
 from objects.portfolio import Portfolio
 from objects.trade import Trade
+from objects.trade_journal import TradeJournal
 
 from __init__ import *
 
@@ -10,10 +11,16 @@ from datetime import time
 class SpreadTrader:
     """Executes taker spread trades using Order Book Imbalance (OBI), with specific thresholds per pair."""
 
-    def __init__(self, order_books, portfolio, obi_thresholds=None):
+    PAIRS = (("spot", "perp"), ("spot", "itrf"), ("perp", "itrf"))
+
+    def __init__(self, order_books, portfolio, obi_thresholds=None, journal=None, features=None, on_trade=None):
         self.order_books = order_books
         self.portfolio = portfolio
-        self.trades = []
+        self.trades = journal if journal is not None else TradeJournal()
+        # Optional objects.feature_store.FeatureView to read OBI from instead of the books
+        self.features = features
+        # Optional on_trade(trade), called once a trade is journaled, e.g. to route it as an order
+        self.on_trade = on_trade
         
         self.obi_thresholds = obi_thresholds or {
             "spot_perp": 0.1,
@@ -21,51 +28,103 @@ class SpreadTrader:
             "perp_itrf": 0.1
         }
 
+        # Signal state of each (mode, pair) at its last evaluation that did not fire a rule.
+        # A pair rule only depends on this state, so an unchanged state means no trade.
+        self._pair_states = {}
+        # Book versions of each (mode, pair) at that evaluation, and the OBI of each book version.
+        # A pair whose books were not written since is skipped without reading them.
+        self._pair_versions = {}
+        self._obi_cache = dict.fromkeys(("spot", "perp", "itrf"), (None, None))
+        self.evaluations = 0
+        self.skipped_evaluations = 0
+
     def get_obi(self, instrument):
-        """Calculates Order Book Imbalance for an instrument using first 10 levels."""
-        ob = self.order_books[instrument]
-        total_bid_vol = sum(ob.bids.values())
-        total_ask_vol = sum(ob.asks.values())
+        """Calculates Order Book Imbalance for an instrument from the running side totals.
+
+        With a feature view, returns the stored OBI of the last snapshot before the book's timestamp.
+        """
+        if self.features is not None:
+            return self.features.obi(instrument, self.order_books[instrument].ts_dt.value)
+
+        total_bid_vol, total_ask_vol = self.order_books[instrument].get_side_volumes()
         
         if total_bid_vol + total_ask_vol == 0:
             return None  # Avoid division by zero
         
         return (total_bid_vol - total_ask_vol) / (total_bid_vol + total_ask_vol)
 
+    @staticmethod
+    def _obi_regime(obi, threshold):
+        """Places an OBI value relative to the (-threshold, threshold) band."""
+        if obi > threshold:
+            return 1
+        if obi < -threshold:
+            return -1
+        return 0
+
+    def _is_unchanged(self, key, state):
+        """Counts the evaluation and tells whether the pair can be skipped."""
+        if self._pair_states.get(key) == state:
+            self.skipped_evaluations += 1
+            return True
+        self.evaluations += 1
+        return False
+
+    def _current_obi(self):
+        """Returns {instrument: (book version, OBI)}, recomputing OBI only for books written since.
+
+        The version changes whenever the book is written (see BookSide.version); with a
+        feature view, whenever the book's timestamp does.
+        """
+        cache = self._obi_cache
+        features = self.features
+        for inst in ("spot", "perp", "itrf"):
+            ob = self.order_books[inst]
+            version = ob.ts_dt if features is not None else ob.get_version()
+            if cache[inst][0] != version:
+                cache[inst] = (version, self.get_obi(inst))
+        return cache
+
+    def _best_prices(self):
+        return {inst: self.order_books[inst].get_best_bid_ask() for inst in ("spot", "itrf", "perp")}
+
     def find_trade_opportunity(self):
         """Checks for trading opportunities based on OBI per pair."""
-        spot_ob, itrf_ob, perp_ob = self.order_books["spot"], self.order_books["itrf"], self.order_books["perp"]
-        spot_bid, spot_ask = spot_ob.get_best_bid_ask()
-        itrf_bid, itrf_ask = itrf_ob.get_best_bid_ask()
-        perp_bid, perp_ask = perp_ob.get_best_bid_ask()
-
-        obi_spot = self.get_obi("spot")
-        obi_perp = self.get_obi("perp")
-        obi_itrf = self.get_obi("itrf")
+        signals = self._current_obi()
+        obi = {inst: signal[1] for inst, signal in signals.items()}
+        best = None  # Read once a rule fires, before any trade of this step
 
         flag = False
 
-        if obi_spot and obi_perp and obi_itrf:
-            if obi_spot > self.obi_thresholds["spot_perp"] and obi_perp < -self.obi_thresholds["spot_perp"]:
-                self.execute_trade("spot", "perp", spot_ask, perp_bid)
-                flag = True
-            elif obi_perp > self.obi_thresholds["spot_perp"] and obi_spot < -self.obi_thresholds["spot_perp"]:
-                self.execute_trade("perp", "spot", perp_ask, spot_bid)
-                flag = True
-
-            if obi_spot > self.obi_thresholds["spot_itrf"] and obi_itrf < -self.obi_thresholds["spot_itrf"]:
-                self.execute_trade("spot", "itrf", spot_ask, itrf_bid)
-                flag = True
-            elif obi_itrf > self.obi_thresholds["spot_itrf"] and obi_spot < -self.obi_thresholds["spot_itrf"]:
-                self.execute_trade("itrf", "spot", itrf_ask, spot_bid)
-                flag = True
-
-            if obi_perp > self.obi_thresholds["perp_itrf"] and obi_itrf < -self.obi_thresholds["perp_itrf"]:
-                self.execute_trade("perp", "itrf", perp_ask, itrf_bid)
-                flag = True
-            elif obi_itrf > self.obi_thresholds["perp_itrf"] and obi_perp < -self.obi_thresholds["perp_itrf"]:
-                self.execute_trade("itrf", "perp", itrf_ask, perp_bid)
-                flag = True
+        if obi["spot"] and obi["perp"] and obi["itrf"]:
+            for a, b in self.PAIRS:
+                key = ("open", a, b)
+                # Neither book written since the pair last did not fire: same OBI, same outcome
+                versions = (signals[a][0], signals[b][0])
+                if self._pair_versions.get(key) == versions:
+                    self.skipped_evaluations += 1
+                    continue
+
+                threshold = self.obi_thresholds[f"{a}_{b}"]
+                state = (self._obi_regime(obi[a], threshold), self._obi_regime(obi[b], threshold))
+                if self._is_unchanged(key, state):
+                    self._pair_versions[key] = versions
+                    continue
+
+                fired = True
+                if obi[a] > threshold and obi[b] < -threshold:
+                    best = best or self._best_prices()
+                    self.execute_trade(a, b, best[a][1], best[b][0])
+                elif obi[b] > threshold and obi[a] < -threshold:
+                    best = best or self._best_prices()
+                    self.execute_trade(b, a, best[b][1], best[a][0])
+                else:
+                    fired = False
+
+                # A fired pair is always re-evaluated, as its liquidity and sizing may differ next time
+                self._pair_states[key] = None if fired else state
+                self._pair_versions[key] = None if fired else versions
+                flag = flag or fired
 
         return flag
 
@@ -102,15 +161,14 @@ class SpreadTrader:
     
         self.trades.append(trade)
         self.portfolio.last_update_ts_dt = trade.ts_dt
+        if self.on_trade is not None:
+            self.on_trade(trade)
 
     def unwind(self, cny_initial=10_000_000):
         """Unwinds open positions based on OBI, ensuring minimal market impact."""
         # print("🔄 Unwinding positions...")
 
-        spot_ob, itrf_ob, perp_ob = self.order_books["spot"], self.order_books["itrf"], self.order_books["perp"]
-        spot_bid, spot_ask = spot_ob.get_best_bid_ask()
-        itrf_bid, itrf_ask = itrf_ob.get_best_bid_ask()
-        perp_bid, perp_ask = perp_ob.get_best_bid_ask()
+        best = None  # Read once a rule fires, before any trade of this step
 
         open_positions = {
             'spot': self.portfolio.cny_balance - cny_initial,
@@ -118,33 +176,39 @@ class SpreadTrader:
             'itrf': self.portfolio.itrf_balance
         }
 
-        obi_spot = self.get_obi("spot")
-        obi_perp = self.get_obi("perp")
-        obi_itrf = self.get_obi("itrf")
+        signals = self._current_obi()
+        obi = {inst: signal[1] for inst, signal in signals.items()}
 
         flag = False
 
-        if obi_spot and obi_perp and obi_itrf:
-            if open_positions['spot'] < 0 and open_positions['perp'] > 0 and obi_perp > self.obi_thresholds["spot_perp"]:
-                self.execute_trade("spot", "perp", spot_ask, perp_bid)
-                flag = True
-            elif open_positions['spot'] > 0 and open_positions['perp'] < 0 and obi_spot > self.obi_thresholds["spot_perp"]:
-                self.execute_trade("perp", "spot", perp_ask, spot_bid)
-                flag = True
-
-            if open_positions['spot'] < 0 and open_positions['itrf'] > 0 and obi_itrf > self.obi_thresholds["spot_itrf"]:
-                self.execute_trade("spot", "itrf", spot_ask, itrf_bid)
-                flag = True
-            elif open_positions['spot'] > 0 and open_positions['itrf'] < 0 and obi_spot > self.obi_thresholds["spot_itrf"]:
-                self.execute_trade("itrf", "spot", itrf_ask, spot_bid)
-                flag = True
-
-            if open_positions['perp'] < 0 and open_positions['itrf'] > 0 and obi_itrf > self.obi_thresholds["perp_itrf"]:
-                self.execute_trade("perp", "itrf", perp_ask, itrf_bid)
-                flag = True
-            elif open_positions['perp'] > 0 and open_positions['itrf'] < 0 and obi_perp > self.obi_thresholds["perp_itrf"]:
-                self.execute_trade("itrf", "perp", itrf_ask, perp_bid)
-                flag = True
+        if obi["spot"] and obi["perp"] and obi["itrf"]:
+            for a, b in self.PAIRS:
+                key = ("unwind", a, b)
+                signs = (np.sign(open_positions[a]), np.sign(open_positions[b]))
+                versions = (signals[a][0], signals[b][0], signs)
+                if self._pair_versions.get(key) == versions:
+                    self.skipped_evaluations += 1
+                    continue
+
+                threshold = self.obi_thresholds[f"{a}_{b}"]
+                state = (self._obi_regime(obi[a], threshold), self._obi_regime(obi[b], threshold), *signs)
+                if self._is_unchanged(key, state):
+                    self._pair_versions[key] = versions
+                    continue
+
+                fired = True
+                if open_positions[a] < 0 and open_positions[b] > 0 and obi[b] > threshold:
+                    best = best or self._best_prices()
+                    self.execute_trade(a, b, best[a][1], best[b][0])
+                elif open_positions[a] > 0 and open_positions[b] < 0 and obi[a] > threshold:
+                    best = best or self._best_prices()
+                    self.execute_trade(b, a, best[b][1], best[a][0])
+                else:
+                    fired = False
+
+                self._pair_states[key] = None if fired else state
+                self._pair_versions[key] = None if fired else versions
+                flag = flag or fired
 
         #print("✅ Unwinding attempt completed.")
         return flag
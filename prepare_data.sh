@@ -5,14 +5,21 @@ read -p "Enter the days to process (comma-separated, e.g., 12-04,12-05,12-06): "
 
 pqt_output_dir="data/preprocessed_data/pqt"
 actions_output_dir="data/preprocessed_data/actions"
+jobs=$(nproc 2>/dev/null || echo 1)
 
 python3 scripts/organize_raw_data.py "$raw_csv_folder" "$days"
-echo "✅ Raw .csv files organized and extracted."
+echo "✅ Raw .csv.gz files organized."
 
-python3 scripts/preprocess_order_book.py "$days" "data/raw_data" "$pqt_output_dir"
+python3 scripts/preprocess_order_book.py "$days" "data/raw_data" "$pqt_output_dir" --jobs "$jobs"
 echo "✅ CSV to Parquet conversion complete."
 
-python3 scripts/generate_market_actions.py "$days" "$pqt_output_dir" "$actions_output_dir"
+python3 scripts/build_features.py "$days" "$pqt_output_dir" --jobs "$jobs"
+echo "✅ Order book features materialized."
+
+python3 scripts/generate_market_actions.py "$days" "$pqt_output_dir" "$actions_output_dir" --jobs "$jobs"
 echo "✅ Market actions extracted."
 
+python3 scripts/merge_actions.py "$actions_output_dir"
+echo "✅ Market actions merged into a single timeline."
+
 echo "🎉 Data preprocessing completed!"
@@ -1,14 +1,12 @@
 import numpy as np
 import pandas as pd
 from datetime import tzinfo, timedelta, datetime
-import matplotlib.pyplot as plt
 from copy import deepcopy
 import os
 import re
 import sys
 import argparse
 import warnings
-from tqdm import tqdm
 import shutil
 from pathlib import Path
 
@@ -16,11 +14,9 @@ import pyarrow.parquet as pq
 import pyarrow as pa
 import heapq
 
-import statsmodels.api as sm
-from scipy.signal import correlate
-from statsmodels.tsa.stattools import grangercausalitytests
-from statsmodels.tsa.stattools import adfuller
-from statsmodels.stats.diagnostic import het_breuschpagan, het_white
 
+# Research and plotting dependencies stay lazy, as in the engine (see objects/__init__.py)
+from objects import plt, sm, correlate, grangercausalitytests, adfuller, het_breuschpagan, het_white, tqdm
 
-warnings.filterwarnings('ignore')
\ No newline at end of file
+
+warnings.filterwarnings('ignore')
@@ -0,0 +1,332 @@
+import sys
+import os
+import time
+import argparse
+import json
+import resource
+import tempfile
+import contextlib
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils import parse_order_book, process_dataframe_chunk, preprocess_and_save_to_parquet, extract_actions, action_paths
+from synthetic import RAW_FILE_NAMES, generate_dataset
+from objects.action import ACTION_TYPES, SIDES, INSTRUMENTS, apply_actions
+from objects.action_format import LEGACY_SCHEMA, upgrade_actions_file
+from objects.action_stream import ActionStream, build_merged_actions
+from objects.order_book import OrderBook
+from objects.portfolio import Portfolio
+from objects.trader import SpreadTrader
+from objects.backtest import make_config, run_backtest
+
+
+# Modules a backtest worker imports, and dependencies they must not pull in at startup
+ENGINE_MODULES = [
+    "objects.action", "objects.order_book", "objects.portfolio", "objects.trader",
+    "objects.action_stream", "objects.backtest", "objects.daily", "objects.sweep",
+]
+HEAVY_MODULES = ["matplotlib", "statsmodels", "scipy"]
+IMPORT_BUDGET = 1.0  # Seconds for a cold import of ENGINE_MODULES
+
+# Stages of the end-to-end suite, in pipeline order, with the unit of their events
+SUITE_STAGES = {
+    "csv_parse": "snapshots",
+    "snapshot_to_actions": "snapshots",
+    "merge": "actions",
+    "apply_ob": "actions",
+    "find_trade_opportunity": "calls",
+    "can_trade": "calls",
+    "full_replay": "actions",
+}
+SUITE_BASELINE = "data/benchmarks/baseline.json"
+SUITE_TOLERANCE = 0.2  # Allowed relative drop in events/s, or growth in peak memory
+
+
+def _rate(rows, seconds):
+    return rows / seconds if seconds > 0 else float("inf")
+
+
+def benchmark_parse(csv_path, rows, max_levels=10):
+    """Times the vectorized chunk parser against the row-wise `parse_order_book` path."""
+    df = pd.read_csv(csv_path, nrows=rows, low_memory=False)
+
+    start = time.perf_counter()
+    process_dataframe_chunk(df, max_levels)
+    vectorized = time.perf_counter() - start
+
+    ms_rows = df[df.iloc[:, 31] == 'MS']
+    start = time.perf_counter()
+    ms_rows.iloc[:, 5:15].apply(lambda row: parse_order_book(row, max_levels), axis=1)
+    ms_rows.iloc[:, 16:26].apply(lambda row: parse_order_book(row, max_levels), axis=1)
+    row_wise = time.perf_counter() - start
+
+    print(f"📊 Parsed {len(df):,} raw rows from {csv_path}")
+    print(f"  {'Vectorized chunk (full)':<28} | {_rate(len(df), vectorized):>14,.0f} rows/s")
+    print(f"  {'Row-wise levels (parse only)':<28} | {_rate(len(df), row_wise):>14,.0f} rows/s")
+
+
+def _write_legacy(input_path, output_path):
+    """Rewrites an actions file of either format in the legacy string layout."""
+    with pq.ParquetWriter(output_path, LEGACY_SCHEMA) as writer:
+        for batch in ActionStream(input_path).iter_batches():
+            writer.write_table(pa.table({
+                "action_type": pa.array(ACTION_TYPES).take(batch.action_type),
+                "side": pa.array(SIDES).take(batch.side),
+                "price": batch.price,
+                "volume": batch.volume,
+                "ts_dt": pa.array(batch.ts, type=pa.timestamp('ns')),
+                "instrument": pa.array(INSTRUMENTS).take(batch.instrument),
+            }, schema=LEGACY_SCHEMA))
+
+
+def _decode_rate(path):
+    start = time.perf_counter()
+    rows = sum(len(batch) for batch in ActionStream(path).iter_batches())
+    return rows, _rate(rows, time.perf_counter() - start)
+
+
+def benchmark_format(actions_path):
+    """Compares file size and decode speed of the legacy and compact action layouts."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        legacy_path = os.path.join(tmp_dir, "legacy.parquet")
+        compact_path = os.path.join(tmp_dir, "compact.parquet")
+        _write_legacy(actions_path, legacy_path)
+        upgrade_actions_file(legacy_path, compact_path)
+
+        print(f"📊 Action file layouts for {actions_path}")
+        for name, path in [("Legacy (strings, float64)", legacy_path), ("Compact (codes, ticks)", compact_path)]:
+            rows, rate = _decode_rate(path)
+            print(f"  {name:<28} | {os.path.getsize(path) / 2**20:>9.2f} MiB | {rate:>14,.0f} rows/s decoded ({rows:,} rows)")
+
+
+def benchmark_imports(budget=IMPORT_BUDGET, repeat=5):
+    """Times a cold import of the engine in fresh interpreters.
+
+    Returns 1 if the best time exceeds `budget` or a heavy research dependency got imported.
+    """
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+    code = (
+        f"import sys, time; sys.path[:0] = {[scripts_dir, os.path.dirname(scripts_dir)]!r}; "
+        f"start = time.perf_counter(); import {', '.join(ENGINE_MODULES)}; "
+        f"print(time.perf_counter() - start); "
+        f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+    )
+    seconds, heavy = [], ""
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        elapsed, heavy = output.split("\n")[:2]
+        seconds.append(float(elapsed))
+
+    print(f"📊 Cold engine import: best {min(seconds):.3f}s, median {sorted(seconds)[len(seconds) // 2]:.3f}s (budget {budget:.3f}s)")
+    if heavy:
+        print(f"❌ Engine import pulled in heavy modules: {heavy}")
+        return 1
+    if min(seconds) > budget:
+        print("❌ Engine import is over budget")
+        return 1
+    print("✅ Engine import within budget")
+    return 0
+
+
+def _suite_paths(work_dir, days):
+    raw = {(day, inst): os.path.join(work_dir, "raw", f"{RAW_FILE_NAMES[inst]}.2024-{day}.gz") for day in days for inst in INSTRUMENTS}
+    return raw, os.path.join(work_dir, "pqt"), os.path.join(work_dir, "actions")
+
+
+def _stage_csv_parse(work_dir, days):
+    raw, pqt_dir, _ = _suite_paths(work_dir, days)
+    snapshots = 0
+    for (day, inst), path in raw.items():
+        os.makedirs(os.path.join(pqt_dir, day), exist_ok=True)
+        snapshots += preprocess_and_save_to_parquet(path, os.path.join(pqt_dir, day, f"{inst}_ob_data.parquet"), show_progress=False)
+    return {"csv_parse": snapshots}
+
+
+def _stage_snapshot_to_actions(work_dir, days):
+    _, pqt_dir, actions_dir = _suite_paths(work_dir, days)
+    extract_actions(pqt_dir, actions_dir, list(INSTRUMENTS), days)
+    snapshots = sum(
+        pq.ParquetFile(os.path.join(pqt_dir, day, f"{inst}_ob_data.parquet")).metadata.num_rows
+        for day in days for inst in INSTRUMENTS
+    )
+    return {"snapshot_to_actions": snapshots}
+
+
+def _stage_merge(work_dir, days):
+    paths, merged_path = action_paths(_suite_paths(work_dir, days)[2])
+    build_merged_actions(paths, merged_path)
+    return {"merge": pq.ParquetFile(merged_path).metadata.num_rows}
+
+
+def _stage_apply_ob(work_dir, days):
+    merged_path = action_paths(_suite_paths(work_dir, days)[2])[1]
+    order_books = {inst: OrderBook(None, inst) for inst in INSTRUMENTS}
+    rows = 0
+    for batch in ActionStream(merged_path).iter_batches():
+        apply_actions(order_books, batch, 0, len(batch))
+        rows += len(batch)
+    return {"apply_ob": rows}
+
+
+def _timed_method(cls, name, timing):
+    """Replaces cls.name by a wrapper adding its calls and seconds to `timing` (worker processes only)."""
+    method = getattr(cls, name)
+
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            timing[0] += 1
+            timing[1] += time.perf_counter() - start
+
+    setattr(cls, name, timed)
+
+
+def _stage_strategy(work_dir, days):
+    """Times the strategy calls within one replay; their own time, not the replay's, is reported."""
+    merged_path = action_paths(_suite_paths(work_dir, days)[2])[1]
+    timings = {"find_trade_opportunity": [0, 0.0], "can_trade": [0, 0.0]}
+    _timed_method(SpreadTrader, "find_trade_opportunity", timings["find_trade_opportunity"])
+    _timed_method(Portfolio, "can_trade", timings["can_trade"])
+    run_backtest(make_config(), ActionStream(merged_path).iter_batches())
+    return {name: tuple(timing) for name, timing in timings.items()}
+
+
+def _stage_full_replay(work_dir, days):
+    merged_path = action_paths(_suite_paths(work_dir, days)[2])[1]
+    run_backtest(make_config(), ActionStream(merged_path).iter_batches())
+    return {"full_replay": pq.ParquetFile(merged_path).metadata.num_rows}
+
+
+def _run_stage(stage, work_dir, days):
+    """Worker entry point: runs one stage quietly and returns {name: (events, seconds)} plus peak RSS in MiB.
+
+    Stages returning a bare event count are timed as a whole.
+    """
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        start = time.perf_counter()
+        events = stage(work_dir, days)
+        elapsed = time.perf_counter() - start
+    results = {name: value if isinstance(value, tuple) else (value, elapsed) for name, value in events.items()}
+    return results, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def compare_to_baseline(results, baseline, tolerance=SUITE_TOLERANCE):
+    """Returns the stages that got slower, or used more memory, than `baseline` allows."""
+    regressions = []
+    for name, result in results["stages"].items():
+        reference = baseline["stages"].get(name)
+        if reference is None:
+            continue
+        if result["events_per_s"] < reference["events_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['events_per_s']:,.0f} events/s vs {reference['events_per_s']:,.0f}")
+        if result["peak_rss_mib"] > reference["peak_rss_mib"] * (1 + tolerance):
+            regressions.append(f"{name}: {result['peak_rss_mib']:,.0f} MiB vs {reference['peak_rss_mib']:,.0f}")
+    return regressions
+
+
+def benchmark_suite(days, minutes, rate, seed=0, work_dir=None, baseline_path=SUITE_BASELINE,
+                    save_baseline=False, tolerance=SUITE_TOLERANCE, output=None):
+    """Times every pipeline stage on synthetic feeds and compares them to a stored baseline.
+
+    Each stage runs in a fresh process, so its peak memory is its own. The feeds are
+    deterministic for (days, minutes, rate, seed); a baseline recorded for other
+    parameters is not compared against. Returns 1 on a regression beyond `tolerance`.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = work_dir or tmp_dir
+        rows = generate_dataset(os.path.join(work_dir, "raw"), days, year=2024, minutes=minutes, rate=rate, seed=seed)
+        params = {"days": days, "minutes": minutes, "rate": rate, "seed": seed}
+        print(f"🧪 Synthetic feeds: {sum(rows.values()):,} raw rows ({', '.join(days)}, {minutes} min at {rate:g} events/s)")
+
+        stages = {}
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context, max_tasks_per_child=1) as pool:
+            for stage in (_stage_csv_parse, _stage_snapshot_to_actions, _stage_merge, _stage_apply_ob,
+                          _stage_strategy, _stage_full_replay):
+                timings, peak_rss = pool.submit(_run_stage, stage, work_dir, days).result()
+                for name, (events, seconds) in timings.items():
+                    stages[name] = {"events": events, "seconds": seconds,
+                                    "events_per_s": _rate(events, seconds), "peak_rss_mib": peak_rss}
+
+    results = {"params": params, "stages": {name: stages[name] for name in SUITE_STAGES}}
+    print("📊 Pipeline stages")
+    for name, stage in results["stages"].items():
+        print(f"  {name:<24} | {stage['events']:>10,} {SUITE_STAGES[name]:<9} | {stage['seconds']:>7.2f}s | "
+              f"{stage['events_per_s']:>12,.0f}/s | {stage['peak_rss_mib']:>7,.0f} MiB")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results saved to {output}")
+
+    if save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Baseline saved to {baseline_path}")
+        return 0
+
+    if not os.path.exists(baseline_path):
+        print(f"⚠️  No baseline at {baseline_path}; record one with --save-baseline")
+        return 0
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline["params"] != params:
+        print(f"⚠️  Baseline was recorded with {baseline['params']}, not compared")
+        return 0
+
+    regressions = compare_to_baseline(results, baseline, tolerance)
+    for regression in regressions:
+        print(f"❌ {regression}")
+    if regressions:
+        return 1
+    print(f"✅ Every stage within {tolerance:.0%} of the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput benchmarks for the preprocessing and backtest stages.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    parse_parser = subparsers.add_parser("parse", help="CSV order book level parsing throughput")
+    parse_parser.add_argument("csv_path", type=str, help="Raw CSV file (e.g., data/raw_data/12-04/spot.csv)")
+    parse_parser.add_argument("--rows", type=int, default=100_000, help="Number of raw rows to parse")
+
+    format_parser = subparsers.add_parser("format", help="Actions file size and decode speed per layout")
+    format_parser.add_argument("actions_path", type=str, help="Actions file (e.g., data/preprocessed_data/actions/spot_actions.parquet)")
+
+    imports_parser = subparsers.add_parser("imports", help="Cold import time of the engine modules, checked against a budget")
+    imports_parser.add_argument("--budget", type=float, default=IMPORT_BUDGET, help="Maximum import time in seconds")
+    imports_parser.add_argument("--repeat", type=int, default=5, help="Number of fresh interpreters to time")
+
+    suite_parser = subparsers.add_parser("suite", help="Every pipeline stage on synthetic feeds, checked against a baseline")
+    suite_parser.add_argument("--days", type=str, default="12-04,12-05", help="Comma-separated synthetic days (MM-DD)")
+    suite_parser.add_argument("--minutes", type=int, default=10, help="Session length in minutes")
+    suite_parser.add_argument("--rate", type=float, default=50.0, help="Events per second per instrument")
+    suite_parser.add_argument("--seed", type=int, default=0, help="Random seed of the feeds")
+    suite_parser.add_argument("--work-dir", type=str, default=None, help="Keep the generated data here instead of a temporary directory")
+    suite_parser.add_argument("--baseline", type=str, default=SUITE_BASELINE, help="Baseline results file")
+    suite_parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    suite_parser.add_argument("--tolerance", type=float, default=SUITE_TOLERANCE, help="Allowed relative regression")
+    suite_parser.add_argument("--output", type=str, default=None, help="Optional JSON file for the results")
+
+    args = parser.parse_args()
+
+    if args.benchmark == "parse":
+        benchmark_parse(args.csv_path, args.rows)
+    elif args.benchmark == "format":
+        benchmark_format(args.actions_path)
+    elif args.benchmark == "imports":
+        sys.exit(benchmark_imports(args.budget, args.repeat))
+    elif args.benchmark == "suite":
+        sys.exit(benchmark_suite(args.days.split(","), args.minutes, args.rate, args.seed, args.work_dir,
+                                 args.baseline, args.save_baseline, args.tolerance, args.output))
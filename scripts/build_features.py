@@ -0,0 +1,45 @@
+import sys
+import os
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import run_parallel
+from objects.manifest import file_digest
+from objects.feature_store import FeatureStore, FEATURE_INSTRUMENTS, build_features
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materialize per-snapshot order book features next to the Parquet snapshots.")
+    parser.add_argument("days", type=str, nargs="?", default=None, help="Comma-separated list of days (default: every day in the folder)")
+    parser.add_argument("folder", type=str, nargs="?", default="data/preprocessed_data/pqt", help="Path to preprocessed Parquet files (e.g., data/preprocessed_data/pqt)")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes, one (day, instrument) unit each")
+    parser.add_argument("--force", action="store_true", help="Rebuild every feature file, even if its source is unchanged")
+    args = parser.parse_args()
+
+    store = FeatureStore(args.folder)
+    days = args.days.split(",") if args.days else store.days()
+
+    # Only sources whose content changed since their features were built
+    units = []
+    for day in days:
+        for instrument in FEATURE_INSTRUMENTS:
+            if not os.path.exists(store.source_path(day, instrument)):
+                print(f"⚠️ Skipping {store.source_path(day, instrument)} (File not found)")
+                continue
+            digest = store.status(day, instrument)
+            if digest is None and args.force:
+                digest = file_digest(store.source_path(day, instrument))
+            if digest is not None:
+                units.append((day, instrument, digest))
+    store.save()  # Keeps refreshed modification times of unchanged sources
+
+    print(f"🚀 Building features for {len(units)} of {len(days) * len(FEATURE_INSTRUMENTS)} files...")
+    if units:
+        tasks = [(store.source_path(day, inst), store.feature_path(day, inst), store.n_levels) for day, inst, _ in units]
+        rows = run_parallel(build_features, tasks, args.jobs, desc="Building features",
+                            labels=[f"{day} {inst}" for day, inst, _ in units])
+        for (day, instrument, digest), count in zip(units, rows):
+            store.record(day, instrument, digest, count)
+        store.save()
+
+    print(f"\n✅ Features up to date in {args.folder} ({store.manifest_path})")
@@ -0,0 +1,95 @@
+import sys
+import os
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import run_parallel, add_config_arguments, config_from_args, action_paths
+from objects.daily import scan_days, run_day, stitch_days, residual_positions
+from objects.action_stream import ensure_merged_actions
+from __init__ import *
+
+
+def select_days(days, config):
+    """Keeps the days that overlap the config's [start, end) range."""
+    start = pd.Timestamp(config["start"]) if config["start"] else None
+    end = pd.Timestamp(config["end"]) if config["end"] else None
+    return [
+        day for day in days
+        if (start is None or pd.Timestamp(day[0]) + pd.Timedelta(days=1) > start)
+        and (end is None or pd.Timestamp(day[0]) < end)
+    ]
+
+
+def run_days(config, merged_path, jobs=1, carry=False):
+    """Backtests every trading day in its own worker and returns the per-day results in order.
+
+    Days start flat. With `carry`, a day following one that ended with an open position is
+    re-run from that day's end state and books, in rounds, until no such day is left. Days
+    following a flat day keep their market-only books, so the result only matches the
+    sequential backtest when every day is carried in. Without `carry`, the per-day results
+    are not comparable to a sequential backtest: on the two synthetic test days they stitch
+    to a PnL of -19,033 RUB against -437 with `carry`, which matches the sequential run.
+    """
+    days = select_days(scan_days(merged_path), config)
+    tasks = [(config, merged_path, day, start, stop, books, None) for day, start, stop, books in days]
+    results = run_parallel(run_day, tasks, jobs=jobs, desc="Trading days", labels=[day[0] for day in days],
+                           unit="trades", count=lambda result: len(result["trades"]))
+
+    while carry:
+        reruns = [
+            i for i in range(1, len(results))
+            if residual_positions(results[i - 1]["positions"])
+            and results[i]["start_state"] != results[i - 1]["end_state"]
+        ]
+        if not reruns:
+            break
+        carried = [
+            tasks[i][:5] + (results[i - 1]["end_books"], results[i - 1]["end_state"], results[i - 1]["positions"])
+            for i in reruns
+        ]
+        for i, result in zip(reruns, run_parallel(run_day, carried, jobs=jobs, desc="Carried-in days",
+                                                  labels=[days[i][0] for i in reruns], unit="trades",
+                                                  count=lambda result: len(result["trades"]))):
+            results[i] = result
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest each trading day in its own worker process and stitch the results.")
+    add_config_arguments(parser)
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes, one trading day each")
+    parser.add_argument("--carry", action="store_true", help="Carry residual positions into the next day instead of starting it flat. "
+                        "Without it, per-day results are not comparable to a sequential backtest")
+    parser.add_argument("--trades-output", type=str, default=None, help="Optional Parquet file for the stitched trade log")
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    paths, merged_path = action_paths(args.actions_dir)
+    merged_path = ensure_merged_actions(paths, merged_path)
+
+    results = run_days(config, merged_path, jobs=args.jobs, carry=args.carry)
+    summary, trades, per_day = stitch_days(config, results)
+
+    print("\n📅 Per-day results:")
+    print(per_day[["day", "carried_in", "signals", "trades", "rub_balance", "approx_pnl", "residual"]].to_string(index=False))
+
+    print("\n" + "=" * 60)
+    print(f"  Stitched over {len(results)} days | Trades: {summary['trades']:,}")
+    print("-" * 60)
+    for name in ("cny_balance", "rub_balance", "perp_balance", "itrf_balance"):
+        print(f"  {name.split('_')[0].upper():<10} | {summary[name]:>15,.2f}")
+    print("-" * 60)
+    print(f"  Approx. PnL (No Liquidity Constraints): {summary['approx_pnl']:>15,.2f} RUB")
+    print(f"  Sharpe Ratio: {summary['sharpe']:>15.4f}")
+    print(f"  Max Drawdown: {summary['max_drawdown']:>15.2%}")
+    print("=" * 60)
+
+    if summary["residual_days"]:
+        action = "carried into the next day" if args.carry else "not carried over, so these results are not comparable to a sequential backtest (see --carry)"
+        print(f"⚠️  Open positions at the end of {', '.join(summary['residual_days'])}: {action}")
+
+    if args.trades_output:
+        trades.save(args.trades_output)
+        print(f"✅ Trades saved to {args.trades_output}")
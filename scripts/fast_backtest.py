@@ -0,0 +1,76 @@
+import sys
+import os
+import time
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import action_paths, parse_values, parse_range, build_configs
+from objects.fast_backtest import FastBacktest
+from objects.backtest import run_backtest
+from objects.action_stream import ActionStream, ensure_merged_actions
+from __init__ import *
+
+COMPARED_METRICS = ("trades", "approx_pnl", "sharpe", "max_drawdown", "turnover")
+
+
+def list_days(pqt_dir):
+    """Returns the day folders of a snapshot directory, in order."""
+    return sorted(name for name in os.listdir(pqt_dir) if os.path.isdir(os.path.join(pqt_dir, name)))
+
+
+def screen(backtest, configs):
+    """Runs every config on the fast path and returns one row per config, parameters first."""
+    rows = []
+    for config in configs:
+        summary, _ = backtest.run(config)
+        rows.append({
+            **config["obi_thresholds"],
+            **{name: value for name, value in config.items() if name != "obi_thresholds"},
+            **summary,
+        })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Screen OBI thresholds with the vectorized fast-path backtest (no liquidity feedback).")
+    parser.add_argument("--pqt-dir", type=str, default="data/preprocessed_data/pqt", help="Directory with the <day>/*_ob_data.parquet snapshots")
+    parser.add_argument("--days", type=str, default=None, help="Comma-separated days (default: every day in --pqt-dir)")
+    parser.add_argument("--spot-perp", type=parse_values, default=[0.1], help="OBI thresholds for spot/perp, e.g. 0.05,0.1,0.2")
+    parser.add_argument("--spot-itrf", type=parse_values, default=[0.1], help="OBI thresholds for spot/itrf")
+    parser.add_argument("--perp-itrf", type=parse_values, default=[0.1], help="OBI thresholds for perp/itrf")
+    parser.add_argument("--unwind-time", type=str, default="11:00", help="Comma-separated unwind times, e.g. 11:00,16:00")
+    parser.add_argument("--leverage-limit", type=parse_values, default=[5], help="Portfolio leverage limits")
+    parser.add_argument("--cny-initial", type=parse_values, default=[10_000_000], help="Initial CNY balances")
+    parser.add_argument("--range", type=parse_range, action="append", help="START,END date range; repeat for several (e.g., 2024-12-04,2024-12-05)")
+    parser.add_argument("--verify", action="store_true", help="Re-run the best configuration with the event-driven backtest")
+    parser.add_argument("--actions-dir", type=str, default="data/preprocessed_data/actions", help="Directory with the *_actions.parquet files (for --verify)")
+    parser.add_argument("--output", type=str, default=None, help="Optional CSV file for the results table")
+    args = parser.parse_args()
+
+    days = args.days.split(",") if args.days else list_days(args.pqt_dir)
+    configs = build_configs(args)
+
+    start = time.perf_counter()
+    backtest = FastBacktest(args.pqt_dir, days)
+    loaded = time.perf_counter() - start
+    results = screen(backtest, configs).sort_values("approx_pnl", ascending=False)
+    print(f"⚡ {len(configs)} configurations over {len(backtest.timeline):,} timestamps in {time.perf_counter() - start:.2f}s "
+          f"({loaded:.2f}s loading snapshots)")
+    print(results.to_string(index=False))
+
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"✅ Results saved to {args.output}")
+
+    if args.verify and configs:
+        best = configs[results.index[0]]
+        paths, merged_path = action_paths(args.actions_dir)
+        start = time.perf_counter()
+        run, _ = run_backtest(best, ActionStream(ensure_merged_actions(paths, merged_path)).iter_batches())
+        reference = run.summary()
+        print(f"\n🔎 Best configuration, event-driven reference ({time.perf_counter() - start:.2f}s):")
+        print(pd.DataFrame({
+            "fast": [results.iloc[0][name] for name in COMPARED_METRICS],
+            "reference": [reference[name] for name in COMPARED_METRICS],
+        }, index=COMPARED_METRICS).to_string())
@@ -0,0 +1,69 @@
+import sys
+import os
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import run_parallel, action_paths, parse_values, parse_range, build_configs
+from objects.backtest import cached_backtest
+from objects.result_cache import ResultCache
+from objects.manifest import file_manifest, manifest_hash
+from objects.action_stream import ensure_merged_actions
+from __init__ import *
+
+
+def run_grid(configs, paths, merged_path, cache, jobs=1):
+    """Runs every config missing from the cache on a process pool and returns all summaries."""
+    merged_path = ensure_merged_actions(paths, merged_path)
+    input_hash = manifest_hash(file_manifest(paths))
+    keys = [cache.key(config, input_hash) for config in configs]
+
+    missing = list({key: (config, key) for config, key in zip(configs, keys) if key not in cache}.values())
+    print(f"🗂️  {len(configs) - len(missing)} of {len(configs)} configurations found in {cache.root}")
+    if missing:
+        run_parallel(
+            cached_backtest,
+            [(config, merged_path, cache, key) for config, key in missing],
+            jobs=jobs,
+            desc="Backtests",
+            labels=[key for _, key in missing],
+            unit="trades",
+        )
+
+    rows = []
+    for key in keys:
+        entry = cache.get(key)
+        config = entry["config"]
+        rows.append({
+            "key": key,
+            **config["obi_thresholds"],
+            **{name: value for name, value in config.items() if name != "obi_thresholds"},
+            **entry["summary"],
+        })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a grid of backtest configurations on a process pool, with cached results.")
+    parser.add_argument("--actions-dir", type=str, default="data/preprocessed_data/actions", help="Directory with the *_actions.parquet files")
+    parser.add_argument("--cache-dir", type=str, default="data/results", help="Result cache directory")
+    parser.add_argument("--spot-perp", type=parse_values, default=[0.1], help="OBI thresholds for spot/perp, e.g. 0.05,0.1,0.2")
+    parser.add_argument("--spot-itrf", type=parse_values, default=[0.1], help="OBI thresholds for spot/itrf")
+    parser.add_argument("--perp-itrf", type=parse_values, default=[0.1], help="OBI thresholds for perp/itrf")
+    parser.add_argument("--unwind-time", type=str, default="11:00", help="Comma-separated unwind times, e.g. 11:00,16:00")
+    parser.add_argument("--leverage-limit", type=parse_values, default=[5], help="Portfolio leverage limits")
+    parser.add_argument("--cny-initial", type=parse_values, default=[10_000_000], help="Initial CNY balances")
+    parser.add_argument("--range", type=parse_range, action="append", help="START,END date range; repeat for several (e.g., 2024-12-04,2024-12-05)")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes, one configuration each")
+    parser.add_argument("--output", type=str, default=None, help="Optional CSV file for the results table")
+    args = parser.parse_args()
+
+    paths, merged_path = action_paths(args.actions_dir)
+
+    configs = build_configs(args)
+    results = run_grid(configs, paths, merged_path, ResultCache(args.cache_dir), jobs=args.jobs)
+    print(results.sort_values("approx_pnl", ascending=False).to_string(index=False))
+
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"✅ Results saved to {args.output}")
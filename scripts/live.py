@@ -0,0 +1,96 @@
+import sys
+import os
+import json
+import asyncio
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import add_config_arguments, config_from_args, action_paths
+from objects.order_book import OrderBook
+from objects.backtest import StrategyRun
+from objects.action_stream import ensure_merged_actions
+from objects.live import ReplayServer, LiveRunner, ParquetSource, SocketSource, BACKPRESSURE_POLICIES
+from __init__ import *
+
+
+def add_endpoint_arguments(parser):
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="TCP host of the replay server")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port of the replay server")
+    parser.add_argument("--unix", type=str, default=None, help="Unix socket path, instead of TCP")
+
+
+def serve(args):
+    paths, merged_path = action_paths(args.actions_dir)
+    server = ReplayServer(ensure_merged_actions(paths, merged_path), speed=args.speed, max_gap=args.max_gap,
+                          end=args.end, sessions=args.sessions)
+    asyncio.run(server.serve(args.host, args.port, args.unix))
+
+
+def run(args):
+    config = config_from_args(args)
+    order_books = {inst: OrderBook(None, inst) for inst in ["spot", "itrf", "perp"]}
+    strategy = StrategyRun.from_config(config, order_books)
+
+    if args.source == "parquet":
+        paths, merged_path = action_paths(args.actions_dir)
+        source = ParquetSource(ensure_merged_actions(paths, merged_path), speed=args.speed, max_gap=args.max_gap, end=config["end"])
+    else:
+        source = SocketSource(args.host, args.port, args.unix)
+
+    runner = LiveRunner(strategy, source, max_queue=args.max_queue, backpressure=args.backpressure, start=config["start"])
+    report = asyncio.run(runner.run())
+    runner.print_report(report)
+
+    summary = strategy.summary()
+    print(f"\n📈 {summary['trades']:,} trades | Approx. PnL: {summary['approx_pnl']:,.2f} RUB | Sharpe: {summary['sharpe']:.4f}")
+
+    # Latency budgets apply to the 99th percentile
+    failed = False
+    for name, budget in (("tick_to_decision", args.budget_us), ("dequeue_to_decision", args.step_budget_us),
+                         ("decision_to_order", args.order_budget_us)):
+        if budget is None:
+            continue
+        p99 = report["latency"][name]["p99_us"]
+        ok = p99 <= budget
+        failed = failed or not ok
+        print(f"{'✅' if ok else '❌'} {name} p99 {p99:,.1f}µs {'within' if ok else 'over'} the {budget:,.1f}µs budget")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": config, "summary": summary, **report}, f, indent=2, default=float)
+        print(f"✅ Report saved to {args.output}")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the strategy on a live action feed and measure its latencies.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Replay the merged actions to clients, standing in for the exchange feed")
+    serve_parser.add_argument("--actions-dir", type=str, default="data/preprocessed_data/actions", help="Directory with the *_actions.parquet files")
+    serve_parser.add_argument("--speed", type=float, default=1.0, help="Replay speed relative to exchange time, 0 for as fast as possible")
+    serve_parser.add_argument("--max-gap", type=float, default=1.0, help="Longest pause in seconds of exchange time, e.g. overnight")
+    serve_parser.add_argument("--end", type=str, default=None, help="Timestamp to stop the replay at, exclusive")
+    serve_parser.add_argument("--sessions", type=int, default=None, help="Exit after this many client sessions (default: serve forever)")
+    add_endpoint_arguments(serve_parser)
+
+    run_parser = subparsers.add_parser("run", help="Trade on a feed and report tick-to-decision and decision-to-order latencies")
+    add_config_arguments(run_parser)
+    run_parser.add_argument("--source", choices=("socket", "parquet"), default="socket", help="Replay server connection, or the merged actions file in process")
+    add_endpoint_arguments(run_parser)
+    run_parser.add_argument("--speed", type=float, default=1.0, help="Replay speed of the parquet source, 0 for as fast as possible")
+    run_parser.add_argument("--max-gap", type=float, default=1.0, help="Longest pause of the parquet source, in seconds of exchange time")
+    run_parser.add_argument("--max-queue", type=int, default=1024, help="Frames buffered between the feed and the strategy")
+    run_parser.add_argument("--backpressure", choices=BACKPRESSURE_POLICIES, default="block",
+                            help="When behind: block the feed, or also skip evaluating timestamps that have newer ones queued")
+    run_parser.add_argument("--budget-us", type=float, default=None, help="p99 tick-to-decision budget in µs; exit with 1 if exceeded")
+    run_parser.add_argument("--step-budget-us", type=float, default=None, help="p99 dequeue-to-decision budget in µs; exit with 1 if exceeded")
+    run_parser.add_argument("--order-budget-us", type=float, default=None, help="p99 decision-to-order budget in µs; exit with 1 if exceeded")
+    run_parser.add_argument("--output", type=str, default=None, help="Optional JSON file for the report")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args)
+    elif run(args):
+        sys.exit(1)
@@ -1,44 +1,55 @@
 import sys
 import os
-from datetime import time
+import argparse
+import contextlib
 from tqdm import tqdm
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from objects.action import Action
 from objects.order_book import OrderBook
-from objects.portfolio import Portfolio
-from objects.trader import SpreadTrader
-from objects.action_stream import merge_sorted_actions
+from utils import add_config_arguments, config_from_args, action_paths
+from objects.backtest import run_backtest
+from objects.action_stream import ActionStream, ensure_merged_actions
+from objects.manifest import file_manifest, manifest_hash
+from objects.checkpoint import Checkpoint, CheckpointWriter, checkpoint_dir, find_checkpoint
+from objects.profiler import Profiler
+from objects.trade_journal import TradeJournal
+from objects.feature_store import FeatureStore
 from __init__ import *
 
 
 # --- CONFIGURATION ---
-CNY_INITIAL = 10_000_000
-UNWIND_TIME = time(11, 0)
-PRINT_INTERVAL = 5_000
+parser = argparse.ArgumentParser(description="Backtest the OBI spread trading strategy on the merged action timeline.")
+add_config_arguments(parser)
+parser.add_argument("--print-interval", type=int, default=5_000, help="Print a summary every N signals")
+parser.add_argument("--checkpoint-dir", type=str, default="data/checkpoints", help="Checkpoint directory")
+parser.add_argument("--checkpoint-every", type=float, default=300, help="Seconds of market time between checkpoints, 0 to disable")
+parser.add_argument("--resume-from", type=str, default=None, help="Continue this run from its latest checkpoint at or before a timestamp")
+parser.add_argument("--trades-dir", type=str, default="data/trades", help="Directory the trade journal is flushed to as the run goes")
+parser.add_argument("--equity-curve", type=str, default=None, help="Optional Parquet file for the equity curve")
+parser.add_argument("--curve-interval", type=float, default=60, help="Seconds of exchange time between equity curve points")
+parser.add_argument("--features", action="store_true", help="Read OBI from the feature store in --pqt-dir instead of the books")
+parser.add_argument("--pqt-dir", type=str, default="data/preprocessed_data/pqt", help="Directory with the snapshots and their features (for --features)")
+parser.add_argument("--profile", action="store_true", help="Time every replay stage and print a report at the end")
+parser.add_argument("--profile-sample-every", type=int, default=1, help="Time only every Nth call of a stage (counts stay exact)")
+parser.add_argument("--profile-output", type=str, default=None, help="Optional JSON file for the profile report (implies --profile)")
+args = parser.parse_args()
+
+config = config_from_args(args)
+PRINT_INTERVAL = args.print_interval
+profiler = Profiler(args.profile_sample_every) if args.profile or args.profile_output else None
 
 # --- INITIALIZATION ---
-portfolio = Portfolio(initial_cny=CNY_INITIAL, initial_rub=0)
-portfolio.last_update_ts_dt = None
-
 order_books = {inst: OrderBook(None, inst) for inst in ["spot", "itrf", "perp"]}
-for ob in order_books.values():
-    ob.asks, ob.bids = {}, {}
-
-trader = SpreadTrader(order_books, portfolio)
 
-paths = {
-    "spot": "data/preprocessed_data/actions/spot_actions.parquet",
-    "perp": "data/preprocessed_data/actions/perp_actions.parquet",
-    "itrf": "data/preprocessed_data/actions/itrf_actions.parquet",
-}
+paths, MERGED_PATH = action_paths(args.actions_dir)
 
 # --- HELPER FUNCTIONS ---
-def print_portfolio_summary(trade_count, timestamp):
+def print_portfolio_summary(run, timestamp):
     """Prints the current portfolio state and key metrics."""
+    portfolio = run.portfolio
     print("\n" + "=" * 60)
-    print(f"  Trades Executed: {trade_count:,} | Timestamp: {timestamp}")
+    print(f"  Trades Executed: {run.trade_count:,} | Timestamp: {timestamp}")
     print("-" * 60)
     print(f"  {'Asset':<10} | {'Balance':>15}")
     print("-" * 60)
@@ -47,37 +58,84 @@ def print_portfolio_summary(trade_count, timestamp):
     print(f"  {'PERP':<10} | {portfolio.perp_balance:>15,.2f}")
     print(f"  {'ITRF':<10} | {portfolio.itrf_balance:>15,.2f}")
     print("-" * 60)
-    print(f"  Approx. PnL (No Liquidity Constraints): {portfolio.approximate_pnl(order_books, CNY_INITIAL):>15,.2f} RUB")
-    print(f"  Sharpe Ratio: {portfolio.calculate_sharpe():>15.4f}")
-    print(f"  Max Drawdown: {portfolio.calculate_max_drawdown():>15.2%}")
+    print(f"  Approx. PnL (No Liquidity Constraints): {portfolio.approximate_pnl(order_books, run.cny_initial):>15,.2f} RUB")
+    metrics = run.metrics.summary(run.trader.trades.notional)
+    print(f"  Sharpe Ratio: {metrics['sharpe']:>15.4f}")
+    print(f"  Max Drawdown: {metrics['max_drawdown']:>15.2%}")
+    print(f"  Turnover: {metrics['turnover']:>15.2f}x | Exposure: {metrics['mean_exposure']:.2%} mean, {metrics['max_exposure']:.2%} max")
     print("=" * 60 + "\n")
 
 
 # --- TRADING LOOP ---
-trade_count = 0
-previous_timestamp = None
-
-for action in tqdm(merge_sorted_actions(paths)):
-    action = Action(*action)
-    action.apply_ob(order_books)
-
-    for inst in order_books:
-        order_books[inst].ts_dt = action.ts_dt
-
-    if portfolio.last_update_ts_dt in [None, 0]:
-        portfolio.last_update_ts_dt = action.ts_dt
-
-    if previous_timestamp is None or action.ts_dt != previous_timestamp:
-        if action.ts_dt.time() >= UNWIND_TIME:
-            trader.unwind(cny_initial=CNY_INITIAL)
-        else:
-            trade_count += trader.find_trade_opportunity()
-
-        previous_timestamp = action.ts_dt
-
-    if trade_count % PRINT_INTERVAL == 0 and trade_count > 0:
-        print_portfolio_summary(trade_count, previous_timestamp)
+with profiler.timed("merge") if profiler else contextlib.nullcontext():
+    stream = ActionStream(ensure_merged_actions(paths, MERGED_PATH), end=config["end"])
+
+# Checkpoints are kept per set of input files and config; store features give other decisions
+input_hash = manifest_hash(file_manifest(paths))
+run_key = {**config, "features": True} if args.features else config
+CHECKPOINT_DIR = checkpoint_dir(args.checkpoint_dir, input_hash, run_key)
+checkpoint = None
+if args.resume_from:
+    checkpoint_path = find_checkpoint([CHECKPOINT_DIR], args.resume_from)
+    if checkpoint_path is None:
+        print(f"⚠️  No checkpoint of this configuration at or before {args.resume_from}, replaying from the start")
+    else:
+        checkpoint = Checkpoint.load(checkpoint_path)
+
+first_row = 0
+if checkpoint is not None:
+    order_books, first_row = checkpoint.order_books, checkpoint.row
+    print(f"⏩ Resuming from the checkpoint at {pd.Timestamp(checkpoint.ts)} (row {first_row:,})")
+
+# The journal keeps the trades a resumed checkpoint flushed, and drops later ones; the
+# checkpoint holds the rest
+TRADES_DIR = checkpoint_dir(args.trades_dir, input_hash, run_key)
+journal = TradeJournal(TRADES_DIR, keep=checkpoint.state["trades"]["flushed"] if checkpoint is not None else 0)
+
+features = None
+if args.features:
+    features = FeatureStore(args.pqt_dir).view()
+    print(f"📦 Reading OBI from the feature store in {args.pqt_dir}")
+
+checkpoint_writer = None
+if args.checkpoint_every > 0:
+    checkpoint_writer = CheckpointWriter(CHECKPOINT_DIR, pd.Timedelta(seconds=args.checkpoint_every))
+
+progress = tqdm(total=stream.parquet_file.metadata.num_rows - first_row)
+
+def tracked_batches():
+    for batch in stream.iter_batches(first_row):
+        yield batch
+        progress.update(len(batch))
+
+def on_evaluated(run, ts_dt):
+    if run.trade_count % PRINT_INTERVAL == 0 and run.trade_count > 0:
+        print_portfolio_summary(run, ts_dt)
+
+try:
+    run, previous_timestamp = run_backtest(config, tracked_batches(), order_books, on_evaluated,
+                                           checkpoint=checkpoint, checkpoint_writer=checkpoint_writer,
+                                           profiler=profiler, journal=journal, features=features,
+                                           curve_interval=pd.Timedelta(seconds=args.curve_interval) if args.equity_curve else None)
+finally:
+    journal.close()  # Also keeps the trades of an interrupted run
+portfolio = run.portfolio
+trader = run.trader
+
+progress.close()
 
 # --- FINAL SUMMARY ---
 print("\nFINAL PORTFOLIO STATE:")
-print_portfolio_summary(trade_count, previous_timestamp)
+print_portfolio_summary(run, previous_timestamp)
+print(f"Pair evaluations: {trader.evaluations:,} | Skipped (signal state unchanged): {trader.skipped_evaluations:,}")
+print(f"✅ {len(journal):,} trades journaled to {TRADES_DIR}")
+if args.equity_curve:
+    run.metrics.save_curve(args.equity_curve)
+    print(f"✅ Equity curve saved to {args.equity_curve}")
+
+if profiler is not None:
+    report = profiler.report()
+    profiler.print_report(report)
+    if args.profile_output:
+        profiler.save(args.profile_output, report, config=config)
+        print(f"✅ Profile saved to {args.profile_output}")
@@ -0,0 +1,20 @@
+import sys
+import os
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from objects.action_stream import ensure_merged_actions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge per-instrument action files into one time-sorted timeline.")
+    parser.add_argument("actions_dir", type=str, help="Directory with the per-instrument actions Parquet files (e.g., data/preprocessed_data/actions)")
+    parser.add_argument("--output", type=str, default=None, help="Merged output path (default: <actions_dir>/merged_actions.parquet)")
+
+    args = parser.parse_args()
+
+    paths = {inst: os.path.join(args.actions_dir, f"{inst}_actions.parquet") for inst in ["spot", "perp", "itrf"]}
+    output_path = args.output or os.path.join(args.actions_dir, "merged_actions.parquet")
+
+    ensure_merged_actions(paths, output_path)
+    print(f"✅ Merged timeline available at {output_path}")
@@ -1,5 +1,4 @@
 from __init__ import *
-import gzip
 
 # Map raw file patterns to target instrument names
 INSTRUMENT_MAP = {
@@ -35,17 +34,17 @@ for file in os.listdir(source_dir):
             new_dir = os.path.join(destination_dir, formatted_date)
             Path(new_dir).mkdir(parents=True, exist_ok=True)
 
-            source_path = os.path.join(source_dir, file)
+            source_path = os.path.abspath(os.path.join(source_dir, file))
             destination_path = os.path.join(new_dir, f"{instrument}.csv.gz")
 
-            shutil.copy2(source_path, destination_path)
+            # Link the archive as `spot.csv.gz`, `perp.csv.gz`, or `itrf.csv.gz`; preprocessing streams it directly
+            if os.path.lexists(destination_path):
+                os.remove(destination_path)
+            try:
+                os.symlink(source_path, destination_path)
+            except OSError:
+                shutil.copy2(source_path, destination_path)  # Filesystems without symlink support
 
-            # Unzip and save as `spot.csv`, `perp.csv`, or `itrf.csv`
-            extracted_file_path = os.path.join(new_dir, f"{instrument}.csv")
-            with gzip.open(destination_path, "rb") as gz_file, open(extracted_file_path, "wb") as out_file:
-                shutil.copyfileobj(gz_file, out_file)
+            print(f"✅ {file} -> {instrument}.csv.gz")
 
-            os.remove(destination_path)  # Delete the .gz file after extraction
-            print(f"✅ {file} -> {instrument}.csv")
-
-print("All selected files copied, renamed, and extracted.")
+print("All selected files linked and renamed.")
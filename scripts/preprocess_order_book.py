@@ -1,13 +1,14 @@
 import sys
 import argparse
 from pathlib import Path
-from utils import preprocess_and_save_to_parquet, get_data_paths
+from utils import preprocess_and_save_to_parquet, get_data_paths, run_parallel
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Convert CSV files to Parquet format.")
     parser.add_argument("days", type=str, help="Comma-separated list of days to process (e.g., 12-04,12-05)")
-    parser.add_argument("folder", type=str, help="Folder containing the raw CSV files (e.g., data/raw_data)")
+    parser.add_argument("folder", type=str, help="Folder containing the raw .csv.gz or .csv files (e.g., data/raw_data)")
     parser.add_argument("output_dir", type=str, help="Output directory for the Parquet files (e.g., data/preprocessed_data/pqt)")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes, one (day, instrument) unit each")
 
     args = parser.parse_args()
 
@@ -15,12 +16,17 @@ if __name__ == "__main__":
     input_folder = Path(args.folder)
     output_dir = Path(args.output_dir)
 
+    tasks, labels = [], []
     for day in days:
         for instrument in ['spot', 'perp', 'itrf']:
-            input_csv_path = f"{input_folder}/{day}/{instrument}.csv"
+            input_csv_path = f"{input_folder}/{day}/{instrument}.csv.gz"
+            if not Path(input_csv_path).exists():
+                input_csv_path = f"{input_folder}/{day}/{instrument}.csv"  # Already extracted
             
             Path(f"{output_dir}/{day}").mkdir(parents=True, exist_ok=True)
             output_parquet_path = f"{output_dir}/{day}/{instrument}_ob_data.parquet"
             
-            preprocess_and_save_to_parquet(input_csv_path, output_parquet_path)
+            tasks.append((input_csv_path, output_parquet_path, 100_000, 10, args.jobs <= 1))
+            labels.append(f"{day} {instrument}")
 
+    run_parallel(preprocess_and_save_to_parquet, tasks, args.jobs, desc="CSV to Parquet", labels=labels)
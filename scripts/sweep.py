@@ -0,0 +1,58 @@
+import sys
+import os
+import argparse
+import itertools
+from tqdm import tqdm
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import parse_values, action_paths
+from objects.order_book import OrderBook
+from objects.backtest import make_config
+from objects.sweep import Sweep
+from objects.action_stream import ActionStream, ensure_merged_actions
+from __init__ import *
+
+
+def build_grid(spot_perp, spot_itrf, perp_itrf, leverage_limits):
+    """Returns one config per point of the cartesian product of the parameter lists."""
+    return [
+        make_config(obi_thresholds={"spot_perp": a, "spot_itrf": b, "perp_itrf": c}, leverage_limit=leverage)
+        for a, b, c, leverage in itertools.product(spot_perp, spot_itrf, perp_itrf, leverage_limits)
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate a grid of SpreadTrader configurations in one replay.")
+    parser.add_argument("--actions-dir", type=str, default="data/preprocessed_data/actions", help="Directory with the *_actions.parquet files")
+    parser.add_argument("--spot-perp", type=parse_values, default=[0.1], help="OBI thresholds for spot/perp, e.g. 0.05,0.1,0.2")
+    parser.add_argument("--spot-itrf", type=parse_values, default=[0.1], help="OBI thresholds for spot/itrf")
+    parser.add_argument("--perp-itrf", type=parse_values, default=[0.1], help="OBI thresholds for perp/itrf")
+    parser.add_argument("--leverage-limit", type=parse_values, default=[5], help="Portfolio leverage limits")
+    parser.add_argument("--output", type=str, default=None, help="Optional CSV file for the results table")
+    args = parser.parse_args()
+
+    configs = build_grid(args.spot_perp, args.spot_itrf, args.perp_itrf, args.leverage_limit)
+    print(f"🧮 Sweeping {len(configs)} configurations in a single replay...")
+
+    order_books = {inst: OrderBook(None, inst) for inst in ["spot", "itrf", "perp"]}
+    sweep = Sweep(order_books, configs)
+
+    paths, merged_path = action_paths(args.actions_dir)
+    stream = ActionStream(ensure_merged_actions(paths, merged_path))
+    progress = tqdm(total=stream.parquet_file.metadata.num_rows)
+
+    def tracked_batches():
+        for batch in stream.iter_batches():
+            yield batch
+            progress.update(len(batch))
+
+    sweep.run(tracked_batches())
+    progress.close()
+
+    results = sweep.results().sort_values("approx_pnl", ascending=False)
+    print(results.to_string(index=False))
+
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"✅ Results saved to {args.output}")
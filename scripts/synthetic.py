@@ -0,0 +1,143 @@
+import sys
+import os
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from __init__ import *
+
+import gzip
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+# Raw feed names, as matched by organize_raw_data.py
+RAW_FILE_NAMES = {
+    "spot": "Local_FAST_CURR_MD_MOEX_CURR_CETS_CNYRUB_TOM",
+    "perp": "Local_FAST_SPECTRA_MD_MOEX_SPECTRA_FUT_CNYRUBF",
+    "itrf": "Local_FAST_SPECTRA_MD_MOEX_SPECTRA_FUT_CRZ4",
+}
+
+# (base price, tick size) per instrument
+MARKETS = {
+    "spot": (13.50, 0.0005),
+    "perp": (13.52, 0.001),
+    "itrf": (13.60, 0.001),
+}
+
+N_COLUMNS = 33
+N_LEVELS = 10
+MESSAGE_TYPES = ("MS", "MT")  # Only MS rows are order book snapshots
+
+
+def _forward_fill(values, updated):
+    """Keeps each row's value where `updated`, else repeats the last updated value above it."""
+    rows = np.where(updated, np.arange(len(values))[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return np.take_along_axis(values, rows, axis=0)
+
+
+def _cells(prices, volumes, present):
+    """Formats `[price;volume;1]` cells, empty where a level is not present."""
+    cells = pc.binary_join_element_wise(
+        "[", pc.cast(pa.array(prices), pa.string()), ";", pc.cast(pa.array(volumes), pa.string()), ";1]", ""
+    )
+    return pc.if_else(pa.array(present), cells, "")
+
+
+def generate_raw_feed(output_path, instrument, day, start_time="10:00", minutes=60, rate=50.0,
+                      common_path=None, seed=0, ms_share=0.9, depth_gap_share=0.02):
+    """Writes one synthetic raw feed as a gzipped CSV in the MOEX export column layout.
+
+    Events arrive as a Poisson process at `rate` per second. The mid price follows
+    `common_path` (ticks of a shared random walk sampled every 100 ms, so instruments
+    move together) plus an instrument-specific walk, and a few book levels change
+    size at every event. Returns the number of rows written.
+    """
+    base_price, tick = MARKETS[instrument]
+    rng = np.random.default_rng([seed, list(MARKETS).index(instrument), pd.Timestamp(day).dayofyear])
+    start = pd.Timestamp(f"{day} {start_time}").value
+    duration = minutes * 60 * 10**9
+
+    n = max(int(rng.poisson(rate * minutes * 60)), 1)
+    # Arrivals at 1 ms resolution, so simultaneous events (ties) occur at high rates
+    ts = start + np.sort(rng.integers(0, duration // 10**6, n)) * 10**6
+
+    common = common_path[(ts - start) // 10**8] if common_path is not None else 0
+    own = np.cumsum(rng.choice([-1, 0, 1], size=n, p=[0.05, 0.9, 0.05]))
+    mid = int(round(base_price / tick)) + np.round(common / tick).astype(np.int64) + own
+    spread = rng.choice([1, 2], size=n, p=[0.8, 0.2])
+
+    level = np.arange(N_LEVELS)
+    bid_ticks = (mid - spread)[:, None] - level  # Best first
+    ask_ticks = (mid + spread)[:, None] + level
+
+    def volumes():
+        sizes = rng.integers(1, 500, size=(n, N_LEVELS))
+        updated = rng.random((n, N_LEVELS)) < 0.3
+        updated[0] = True
+        return _forward_fill(sizes, updated)
+
+    bid_volumes, ask_volumes = volumes(), volumes()
+    bid_present = rng.random((n, N_LEVELS)) >= depth_gap_share * (level / N_LEVELS)
+    ask_present = rng.random((n, N_LEVELS)) >= depth_gap_share * (level / N_LEVELS)
+
+    decimals = len(f"{tick:f}".rstrip("0").split(".")[1])
+    columns = [None] * N_COLUMNS
+    columns[0] = pa.array(ts, type=pa.int64())
+    columns[1] = pa.array(np.arange(n), type=pa.int64())
+    columns[2] = pc.strftime(pa.array(ts, type=pa.timestamp("ns")), format="%Y-%m-%d %H:%M:%S")
+    for i in range(N_LEVELS):
+        # Bids are stored worst level first, asks best level first
+        worst = N_LEVELS - 1 - i
+        columns[5 + i] = _cells(np.round(bid_ticks[:, worst] * tick, decimals), bid_volumes[:, worst], bid_present[:, worst])
+        columns[16 + i] = _cells(np.round(ask_ticks[:, i] * tick, decimals), ask_volumes[:, i], ask_present[:, i])
+    columns[31] = pa.array(np.where(rng.random(n) < ms_share, *MESSAGE_TYPES))
+    for i in range(N_COLUMNS):
+        if columns[i] is None:
+            columns[i] = pa.array(np.zeros(n, dtype=np.int64))
+
+    table = pa.table(columns, names=[f"col_{i}" for i in range(N_COLUMNS)])
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    buffer = pa.BufferOutputStream()
+    pa_csv.write_csv(table, buffer, pa_csv.WriteOptions(quoting_style="none"))
+    # Fast compression level: the feeds are regenerated, not archived
+    with gzip.open(output_path, "wb", compresslevel=1) as f:
+        f.write(buffer.getvalue())
+    return n
+
+
+def generate_dataset(output_dir, days, instruments=("spot", "perp", "itrf"), year=2024, start_time="10:00",
+                     minutes=60, rate=50.0, seed=0):
+    """Writes raw feeds for every (day, instrument) as `<feed name>.<year>-<day>.gz`.
+
+    Returns {(day, instrument): rows}. The same arguments always give the same files.
+    """
+    rows = {}
+    for day in days:
+        date = f"{year}-{day}"
+        # Shared price moves of all instruments, one step per 100 ms
+        rng = np.random.default_rng([seed, pd.Timestamp(date).dayofyear])
+        common_path = np.cumsum(rng.normal(0, 0.0005, minutes * 600 + 1))
+        for instrument in instruments:
+            path = os.path.join(output_dir, f"{RAW_FILE_NAMES[instrument]}.{date}.gz")
+            rows[(day, instrument)] = generate_raw_feed(
+                path, instrument, date, start_time, minutes, rate, common_path, seed
+            )
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate deterministic synthetic raw order book feeds for tests and benchmarks.")
+    parser.add_argument("output_dir", type=str, help="Directory for the .gz feeds (use it as the raw folder of prepare_data.sh)")
+    parser.add_argument("--days", type=str, default="12-04,12-05", help="Comma-separated days (MM-DD)")
+    parser.add_argument("--year", type=int, default=2024, help="Year of the days")
+    parser.add_argument("--start-time", type=str, default="10:00", help="Session start time")
+    parser.add_argument("--minutes", type=int, default=60, help="Session length in minutes")
+    parser.add_argument("--rate", type=float, default=50.0, help="Events per second per instrument")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    rows = generate_dataset(args.output_dir, args.days.split(","), year=args.year, start_time=args.start_time,
+                            minutes=args.minutes, rate=args.rate, seed=args.seed)
+    for (day, instrument), n in rows.items():
+        print(f"✅ {day} {instrument}: {n:,} rows")
@@ -2,11 +2,32 @@ from __init__ import *
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from objects.order_book import OrderBook
-from objects.action import Action
+from objects.order_book import OrderBook, compute_snapshot_differences
+from objects.action import Action, INSTRUMENTS
+from objects.action_format import (
+    COMPACT_SCHEMA, WRITER_OPTIONS, RowGroupWriter, compact_schema, infer_price_scale,
+    read_price_scales, to_compact_table,
+)
+from objects.backtest import DEFAULT_CONFIG, make_config
+
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import time
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 
 OB_PATTERN = re.compile(r"\[(.*?);(.*?);1\]")
+# Same cell format for Arrow's RE2 engine; leading whitespace mirrors the str.strip() above
+OB_CELL_PATTERN = r"^\s*\[(?P<price>.*?);(?P<volume>.*?);1\]"
+
+# Positions of the raw CSV columns the snapshots are built from
+RAW_TS_NS_COLUMN = 0
+RAW_TS_DT_COLUMN = 2
+RAW_BID_COLUMNS = range(5, 15)
+RAW_ASK_COLUMNS = range(16, 26)
+RAW_MESSAGE_TYPE_COLUMN = 31
 
 def extract_gz(file_path):
     """Unzips a .gz file and removes the original compressed file."""
@@ -32,6 +53,15 @@ def parse_order_book(entries, max_levels=10):
     
     return parsed[:max_levels]  # Always return `max_levels` elements
 
+def parse_order_book_column(cells):
+    """Vectorized `parse_order_book` for one level column: returns (prices, volumes) arrays."""
+    cells = pa.array(cells.astype(str), type=pa.string())
+    price, volume = pc.extract_regex(cells, pattern=OB_CELL_PATTERN).flatten()  # Null where no match
+    return (
+        pc.cast(price, pa.float64()).fill_null(0.0).to_numpy(),
+        pc.cast(volume, pa.int64()).fill_null(0).to_numpy(),
+    )
+
 def process_dataframe_chunk(df_chunk, max_levels=10):
     """Processes a single chunk of data, extracting full OB depth correctly."""
     df_chunk = df_chunk.rename(columns={col: str(i) for i, col in enumerate(df_chunk.columns)})
@@ -39,22 +69,25 @@ def process_dataframe_chunk(df_chunk, max_levels=10):
     # Filter only relevant order book updates
     df_chunk = df_chunk[df_chunk['31'] == 'MS']
 
+    return build_snapshot_frame(df_chunk, max_levels)
+
+def build_snapshot_frame(df_chunk, max_levels=10):
+    """Turns MS rows, with columns named by raw CSV position, into one row per book snapshot."""
     # Drop unnecessary columns
     df_chunk = df_chunk.drop(columns=[str(i) for i in range(26, 33)], errors='ignore')
 
     # Convert timestamps
     df_chunk["2"] = pd.to_datetime(df_chunk["2"], errors='coerce')
 
-    # Apply order book parsing
-    bid_data = df_chunk[[str(i) for i in range(5, 15)]].apply(lambda row: parse_order_book(row, max_levels), axis=1)
-    ask_data = df_chunk[[str(i) for i in range(16, 26)]].apply(lambda row: parse_order_book(row, max_levels), axis=1)
+    # Parse whole level columns at once; bids are stored worst level first
+    bid_data = [parse_order_book_column(df_chunk[str(5 + i)]) for i in range(max_levels)]
+    ask_data = [parse_order_book_column(df_chunk[str(16 + i)]) for i in range(max_levels)]
 
-    # Convert lists into separate columns
+    levels = {}
     for i in range(max_levels):
-        df_chunk[f"bid_price_{max_levels-i}"] = bid_data.apply(lambda x: x[i][0])
-        df_chunk[f"bid_volume_{max_levels-i}"] = bid_data.apply(lambda x: x[i][1])
-        df_chunk[f"ask_price_{i+1}"] = ask_data.apply(lambda x: x[i][0])
-        df_chunk[f"ask_volume_{i+1}"] = ask_data.apply(lambda x: x[i][1])
+        levels[f"bid_price_{max_levels-i}"], levels[f"bid_volume_{max_levels-i}"] = bid_data[i]
+        levels[f"ask_price_{i+1}"], levels[f"ask_volume_{i+1}"] = ask_data[i]
+    df_chunk = pd.concat([df_chunk, pd.DataFrame(levels, index=df_chunk.index)], axis=1)
 
     df_chunk = df_chunk.drop(columns=[str(i) for i in range(5, 16)] + [str(i) for i in range(16, 26)], errors='ignore')
 
@@ -62,12 +95,56 @@ def process_dataframe_chunk(df_chunk, max_levels=10):
 
     return df_chunk.reset_index()[5:].reset_index().drop(['level_0', 'index'], axis=1).rename(columns={'0': 'ts_ns', '2': 'ts_dt'}).dropna()
 
-def preprocess_and_save_to_parquet(input_csv_path, output_parquet_path, chunk_size=100_000, max_levels=10):
-    """Reads a large CSV in chunks, processes each chunk, and appends to Parquet iteratively."""
+def iter_raw_csv_chunks(input_csv_path, chunk_size=100_000, block_size=1 << 24):
+    """Streams a raw CSV, plain or gzipped, as MS-only pandas chunks.
+
+    Only the columns used by `build_snapshot_frame` are decoded, with explicit types, and
+    columns are named by their raw position. Chunks hold `chunk_size` raw rows each, as
+    with `pd.read_csv(chunksize=...)`, so the output matches the pandas reader.
+    """
+    header = pa_csv.open_csv(input_csv_path).schema.names
+    positions = [RAW_TS_NS_COLUMN, RAW_TS_DT_COLUMN, *RAW_BID_COLUMNS, *RAW_ASK_COLUMNS, RAW_MESSAGE_TYPE_COLUMN]
+    names = [header[i] for i in positions]
+    column_types = {name: pa.string() for name in names}
+    column_types[header[RAW_TS_NS_COLUMN]] = pa.int64()
+
+    reader = pa_csv.open_csv(
+        input_csv_path,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        convert_options=pa_csv.ConvertOptions(include_columns=names, column_types=column_types),
+    )
+    message_type = header[RAW_MESSAGE_TYPE_COLUMN]
+    renames = [str(i) for i in positions]
+
+    def to_chunk(table):
+        table = table.filter(pc.equal(table.column(message_type), "MS")).drop_columns([message_type])
+        return table.rename_columns(renames[:-1]).to_pandas()
+
+    pending = []
+    pending_rows = 0
+    for batch in reader:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= chunk_size:
+            table = pa.Table.from_batches(pending)
+            yield to_chunk(table.slice(0, chunk_size))
+            rest = table.slice(chunk_size)
+            pending, pending_rows = rest.to_batches(), rest.num_rows
+
+    if pending_rows:
+        yield to_chunk(pa.Table.from_batches(pending))
+
+def preprocess_and_save_to_parquet(input_csv_path, output_parquet_path, chunk_size=100_000, max_levels=10, show_progress=True):
+    """Streams a large CSV (or .csv.gz) in chunks, processes each chunk, and appends to Parquet iteratively.
+
+    Returns the number of snapshots written.
+    """
     first_chunk = True
+    n_snapshots = 0
 
-    for df_chunk in tqdm(pd.read_csv(input_csv_path, chunksize=chunk_size, low_memory=False), desc=f"Processing {input_csv_path}"):
-        processed_chunk = process_dataframe_chunk(df_chunk, max_levels)
+    for df_chunk in tqdm(iter_raw_csv_chunks(input_csv_path, chunk_size), desc=f"Processing {input_csv_path}", disable=not show_progress):
+        processed_chunk = build_snapshot_frame(df_chunk, max_levels)
+        n_snapshots += len(processed_chunk)
 
         if first_chunk:
             processed_chunk.to_parquet(output_parquet_path, engine='fastparquet', index=False, compression='snappy')
@@ -76,6 +153,98 @@ def preprocess_and_save_to_parquet(input_csv_path, output_parquet_path, chunk_si
         
         first_chunk = False
 
+    return n_snapshots
+
+def _timed_unit(func, args):
+    """Runs one unit of work in a worker and reports (result, elapsed seconds)."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def run_parallel(func, tasks, jobs=1, desc="Processing", labels=None, unit="rows", count=None):
+    """Runs func(*task) for every task on up to `jobs` processes and prints an aggregated report.
+
+    Each worker process handles a single task before it is replaced, so memory held by one
+    (day, instrument) unit is released before the next one starts. Returns the results in
+    task order. The report shows each result, or count(result) if given, in `unit`s.
+    """
+    labels = labels or [str(task) for task in tasks]
+    results = [None] * len(tasks)
+    elapsed = [0.0] * len(tasks)
+    start = time.perf_counter()
+
+    if jobs <= 1:
+        for i, task in enumerate(tqdm(tasks, desc=desc)):
+            results[i], elapsed[i] = _timed_unit(func, task)
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=context, max_tasks_per_child=1) as pool:
+            futures = {pool.submit(_timed_unit, func, task): i for i, task in enumerate(tasks)}
+            for future in tqdm(as_completed(futures), total=len(futures), desc=f"{desc} ({jobs} jobs)"):
+                i = futures[future]
+                results[i], elapsed[i] = future.result()
+
+    print(f"\n📊 {desc}: {len(tasks)} units in {time.perf_counter() - start:.1f}s")
+    for label, result, seconds in zip(labels, results, elapsed):
+        value = count(result) if count is not None and result is not None else result
+        print(f"  {label:<20} | {value if value is not None else '-':>12} {unit} | {seconds:>8.1f}s")
+    return results
+
+def add_config_arguments(parser):
+    """Adds one command line option per backtest parameter (see objects.backtest.make_config)."""
+    parser.add_argument("--actions-dir", type=str, default="data/preprocessed_data/actions", help="Directory with the *_actions.parquet files")
+    for pair, threshold in DEFAULT_CONFIG["obi_thresholds"].items():
+        parser.add_argument(f"--{pair.replace('_', '-')}", type=float, default=threshold, help=f"OBI threshold for the {pair} pair")
+    parser.add_argument("--unwind-time", type=str, default=DEFAULT_CONFIG["unwind_time"], help="Time of day from which positions are unwound (HH:MM[:SS])")
+    parser.add_argument("--leverage-limit", type=float, default=DEFAULT_CONFIG["leverage_limit"], help="Portfolio leverage limit")
+    parser.add_argument("--cny-initial", type=int, default=DEFAULT_CONFIG["cny_initial"], help="Initial CNY balance")
+    parser.add_argument("--mark-interval", type=float, default=DEFAULT_CONFIG["mark_interval"], help="Seconds of exchange time between mark-to-market samples of the metrics")
+    parser.add_argument("--start", type=str, default=None, help="First timestamp to trade at (e.g., 2024-12-05)")
+    parser.add_argument("--end", type=str, default=None, help="Timestamp to stop the replay at, exclusive")
+
+def config_from_args(args):
+    """Builds the backtest config from options added by add_config_arguments."""
+    return make_config(
+        obi_thresholds={pair: getattr(args, pair) for pair in DEFAULT_CONFIG["obi_thresholds"]},
+        unwind_time=args.unwind_time,
+        leverage_limit=args.leverage_limit,
+        cny_initial=args.cny_initial,
+        mark_interval=args.mark_interval,
+        start=args.start,
+        end=args.end,
+    )
+
+def parse_values(text):
+    """Parses a comma-separated list of numbers."""
+    return [float(value) for value in text.split(",") if value]
+
+def parse_range(text):
+    """Parses a START,END date range; either side may be empty."""
+    start, _, end = text.partition(",")
+    return start or None, end or None
+
+def build_configs(args):
+    """Returns the normalized config of every point of a grid of comma-separated options."""
+    return [
+        make_config(
+            obi_thresholds={"spot_perp": a, "spot_itrf": b, "perp_itrf": c},
+            unwind_time=unwind_time,
+            leverage_limit=leverage,
+            cny_initial=cny_initial,
+            start=start,
+            end=end,
+        )
+        for a, b, c, unwind_time, leverage, cny_initial, (start, end) in itertools.product(
+            args.spot_perp, args.spot_itrf, args.perp_itrf, args.unwind_time.split(","),
+            args.leverage_limit, args.cny_initial, args.range or [(None, None)],
+        )
+    ]
+
+def action_paths(actions_dir):
+    """Returns the per-instrument action files and the merged timeline path in `actions_dir`."""
+    paths = {inst: os.path.join(actions_dir, f"{inst}_actions.parquet") for inst in ["spot", "perp", "itrf"]}
+    return paths, os.path.join(actions_dir, "merged_actions.parquet")
+
 def get_data_paths(folder='data/raw_data', days=['12-04', '12-05', '12-06']):
     """Generates paths for given days and instruments."""
     instruments = ['spot', 'perp', 'itrf']
@@ -107,74 +276,130 @@ def convert_csv_to_parquet(days, input_folder, output_dir):
             else:
                 print(f"⚠️ Skipping {instrument} for {day} (file not found)")
 
-def process_order_book_actions(folder, output_dir, instrument, days, chunk_size=100_000):
-    """Processes order book snapshots, extracts actions, and writes them to Parquet."""
-    
-    parquet_schema = pa.schema([
-        ("action_type", pa.string()),
-        ("side", pa.string()),
-        ("price", pa.float64()),
-        ("volume", pa.int64()),
-        ("ts_dt", pa.timestamp('ns')),
-        ("instrument", pa.string())
-    ])
-
-    output_path = Path(output_dir) / f"{instrument}_actions.parquet"
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+def _snapshot_arrays(df, n_levels=10):
+    """Returns (ask_prices, ask_volumes, bid_prices, bid_volumes, ts) arrays of a snapshot frame."""
+    def levels(name):
+        return df[[f"{name}_{i}" for i in range(1, n_levels + 1)]].to_numpy()
+
+    ts = df["ts_dt"].to_numpy().astype("datetime64[ns]")
+    return levels("ask_price"), levels("ask_volume"), levels("bid_price"), levels("bid_volume"), ts
+
+def _last_snapshot(input_path):
+    """Returns the last snapshot of a preprocessed Parquet file as a one-row frame, or None if it is empty."""
+    reader = pq.ParquetFile(input_path)
+    for i in reversed(range(reader.num_row_groups)):
+        df = reader.read_row_group(i).to_pandas()
+        if len(df):
+            return df.iloc[-1:]
+    return None
+
+def _actions_table(instrument, price_scale, rows, action_types, sides, prices, volumes, ts):
+    """Builds a compact actions table from the diff engine output."""
+    return pa.table({
+        "action_type": action_types,
+        "side": sides,
+        "price_ticks": np.round(prices * price_scale).astype(np.int64),
+        "volume": volumes.astype(np.int64),
+        "ts_dt": pa.array(ts[rows], type=pa.timestamp('ns')),
+        "instrument": np.full(len(rows), INSTRUMENTS.index(instrument), dtype=np.int8),
+    }, schema=COMPACT_SCHEMA)
+
+def _day_price_scale(input_path, n_levels=10):
+    """Infers the tick price scale of one preprocessed snapshot file from all its price levels."""
+    columns = [f"{side}_price_{i}" for side in ("ask", "bid") for i in range(1, n_levels + 1)]
+    prices = pq.read_table(input_path, columns=columns)
+    return max((infer_price_scale(column.to_numpy()) for column in prices.columns), default=1)
+
+def process_day_actions(folder, output_path, instrument, day, previous_day=None, chunk_size=10_000, show_progress=True):
+    """Extracts the actions of one (day, instrument) unit and writes them to `output_path`.
+
+    Snapshots are diffed `chunk_size` at a time with the vectorized engine. Diffs start from
+    the last snapshot of `previous_day`, so the units together produce the same actions as
+    one sequential pass over all days. Returns the number of actions written.
+    """
+    input_path = Path(folder) / day / f"{instrument}_ob_data.parquet"
+    previous_path = Path(folder) / previous_day / f"{instrument}_ob_data.parquet" if previous_day else None
+    previous = _last_snapshot(previous_path) if previous_path else None
+    carry = _snapshot_arrays(previous) if previous is not None else None
+
+    price_scale = _day_price_scale(input_path)
+    if previous_path:  # The first diff may remove levels of the previous day
+        price_scale = max(price_scale, _day_price_scale(previous_path))
+    schema = compact_schema({instrument: price_scale})
 
     writer = None
-    actions_list = []
-    
-    first_orderbook = True
-    ob = None
-
-    for day in days:
-        input_path = Path(folder) / day / f"{instrument}_ob_data.parquet"
-        if not input_path.exists():
-            print(f"⚠️ Skipping {input_path} (File not found)")
-            continue
-
-        reader = pq.ParquetFile(input_path)
-        for i in range(reader.num_row_groups):
-            df = reader.read_row_group(i).to_pandas()
-
-            for _, row in tqdm(df.iterrows(), total=len(df), desc=f"Processing {instrument} - {day} (Row Group {i+1}/{reader.num_row_groups})"):
-                
-                if first_orderbook:
-                    ob = OrderBook(row, instrument)
-                    first_orderbook = False
-                    continue  # Skip action extraction on the first iteration
-                
-                ob_new = OrderBook(row, instrument)
-                actions = ob.compute_differences(ob_new)
-                ob = ob_new
-
-                for action in actions:
-                    actions_list.append({
-                        "action_type": action.action_type,
-                        "side": action.side,
-                        "price": action.price,
-                        "volume": action.volume,
-                        "ts_dt": action.ts_dt,
-                        "instrument": action.instrument
-                    })
-
-                if len(actions_list) >= chunk_size:
-                    df_chunk = pd.DataFrame(actions_list, columns=parquet_schema.names)
-                    table = pa.Table.from_pandas(df_chunk, schema=parquet_schema)
-                    if writer is None:
-                        writer = pq.ParquetWriter(output_path, parquet_schema)
-                    writer.write_table(table)
-                    actions_list = []
-
-    if actions_list:
-        df_chunk = pd.DataFrame(actions_list, columns=parquet_schema.names)
-        table = pa.Table.from_pandas(df_chunk, schema=parquet_schema)
-        if writer is None:
-            writer = pq.ParquetWriter(output_path, parquet_schema)
-        writer.write_table(table)
+    n_actions = 0
+
+    reader = pq.ParquetFile(input_path)
+    for i in tqdm(range(reader.num_row_groups), desc=f"Processing {instrument} - {day}", disable=not show_progress):
+        df = reader.read_row_group(i).to_pandas()
+
+        for start in range(0, len(df), chunk_size):
+            snapshots = _snapshot_arrays(df.iloc[start:start + chunk_size])
+            if carry is not None:  # Diff the first snapshot against the last one seen
+                snapshots = tuple(np.concatenate([old, new]) for old, new in zip(carry, snapshots))
+            carry = tuple(array[-1:] for array in snapshots)
+
+            *book, ts = snapshots
+            table = _actions_table(instrument, price_scale, *compute_snapshot_differences(*book), ts)
+            if table.num_rows:
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, schema, **WRITER_OPTIONS)
+                writer.write_table(table.cast(schema))
+                n_actions += table.num_rows
 
     if writer:
         writer.close()
-    
-    print(f"✅ Actions for {instrument} saved to {output_path}")
+
+    return n_actions
+
+def extract_actions(folder, output_dir, instruments, days, chunk_size=10_000, jobs=1):
+    """Extracts actions for every (day, instrument) unit in parallel, then joins them per instrument."""
+    output_dir = Path(output_dir)
+    tasks, labels = [], []
+    parts = {instrument: [] for instrument in instruments}
+
+    for instrument in instruments:
+        previous_day = None
+        for day in days:
+            input_path = Path(folder) / day / f"{instrument}_ob_data.parquet"
+            if not input_path.exists():
+                print(f"⚠️ Skipping {input_path} (File not found)")
+                continue
+
+            part_path = output_dir / "parts" / day / f"{instrument}_actions.parquet"
+            part_path.parent.mkdir(parents=True, exist_ok=True)
+            if part_path.exists():
+                part_path.unlink()
+
+            tasks.append((folder, part_path, instrument, day, previous_day, chunk_size, jobs <= 1))
+            labels.append(f"{day} {instrument}")
+            parts[instrument].append(part_path)
+            previous_day = day
+
+    run_parallel(process_day_actions, tasks, jobs, desc="Extracting actions", labels=labels)
+
+    for instrument in instruments:
+        output_path = output_dir / f"{instrument}_actions.parquet"
+        part_paths = [part_path for part_path in parts[instrument] if part_path.exists()]  # Missing: no actions that day
+        if not part_paths:
+            continue
+
+        # Days may need different tick precision; store the whole instrument at the finest one
+        price_scales = {instrument: max(read_price_scales(pq.read_schema(path))[instrument] for path in part_paths)}
+        schema = compact_schema(price_scales)
+        with pq.ParquetWriter(output_path, schema, **WRITER_OPTIONS) as writer:
+            row_groups = RowGroupWriter(writer)
+            for part_path in part_paths:
+                part = pq.ParquetFile(part_path)
+                for i in range(part.num_row_groups):
+                    row_groups.write_table(to_compact_table(part.read_row_group(i), price_scales).cast(schema))
+                part_path.unlink()
+            row_groups.close()
+        print(f"✅ Actions for {instrument} saved to {output_path}")
+
+    shutil.rmtree(output_dir / "parts", ignore_errors=True)
+
+def process_order_book_actions(folder, output_dir, instrument, days, chunk_size=10_000, jobs=1):
+    """Processes order book snapshots, extracts actions, and writes them to Parquet."""
+    extract_actions(folder, output_dir, [instrument], days, chunk_size, jobs)
@@ -0,0 +1,25 @@
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SCRIPTS = os.path.join(ROOT, "scripts")
+# Same layout as the scripts see: `utils` and `__init__` from scripts/, `objects` from the root
+sys.path[:0] = [path for path in (SCRIPTS, ROOT) if path not in sys.path]
+
+import pytest
+
+SYNTHETIC_DAYS = ["12-04", "12-05"]
+
+
+@pytest.fixture(scope="session")
+def synthetic_actions(tmp_path_factory):
+    """Runs two short synthetic days through the preprocessing pipeline; returns the merged actions path."""
+    from synthetic import generate_dataset
+    from benchmarks import _suite_paths, _stage_csv_parse, _stage_snapshot_to_actions, _stage_merge
+    from utils import action_paths
+
+    work_dir = str(tmp_path_factory.mktemp("synthetic"))
+    generate_dataset(os.path.join(work_dir, "raw"), SYNTHETIC_DAYS, minutes=5, rate=20.0, seed=1)
+    for stage in (_stage_csv_parse, _stage_snapshot_to_actions, _stage_merge):
+        stage(work_dir, SYNTHETIC_DAYS)
+    return action_paths(_suite_paths(work_dir, SYNTHETIC_DAYS)[2])[1]
@@ -0,0 +1,73 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from objects.action import INSTRUMENTS
+from objects.action_format import LEGACY_SCHEMA, compact_schema, to_compact_table, upgrade_actions_file
+from objects.action_stream import ActionStream, build_merged_actions
+
+START = np.datetime64("2024-12-04T10:00:00", "ns")
+
+
+def legacy_table(instrument, prices, offset=0):
+    n = len(prices)
+    return pa.table({
+        "action_type": ["add", "remove"] * (n // 2) + ["add"] * (n % 2),
+        "side": ["bid", "ask"] * (n // 2) + ["bid"] * (n % 2),
+        "price": prices,
+        "volume": np.arange(1, n + 1),
+        "ts_dt": START + (np.arange(n) * 2 + offset).astype("timedelta64[ms]"),
+        "instrument": [instrument] * n,
+    }, schema=LEGACY_SCHEMA)
+
+
+def read_prices(path):
+    return np.concatenate([batch.price for batch in ActionStream(path).iter_batches()])
+
+
+def test_upgrade_keeps_prices_exactly(tmp_path):
+    prices = [13.5, 13.51, 13.525, 13.4999, 0.0001, 1e5 + 0.25]
+    pq.write_table(legacy_table("spot", prices), tmp_path / "legacy.parquet")
+    path = upgrade_actions_file(tmp_path / "legacy.parquet", tmp_path / "compact.parquet")
+    assert ActionStream(path).price_scales == {"spot": 10_000}
+    assert read_prices(path).tolist() == prices
+
+
+def test_merge_of_parts_at_different_scales_keeps_prices_exactly(tmp_path):
+    # Two days of spot at 2 and 3 decimals, joined at the finer scale as extract_actions does
+    coarse, fine = [13.51, 13.52, 13.5], [13.512, 13.5, 13.499]
+    parts = []
+    for name, prices, offset in (("coarse", coarse, 0), ("fine", fine, 1000)):
+        pq.write_table(legacy_table("spot", prices, offset), tmp_path / f"{name}.parquet")
+        upgrade_actions_file(tmp_path / f"{name}.parquet", tmp_path / f"{name}_compact.parquet")
+        parts.append(pq.read_table(tmp_path / f"{name}_compact.parquet"))
+    assert [ActionStream(tmp_path / f"{name}_compact.parquet").price_scales["spot"] for name in ("coarse", "fine")] == [100, 1000]
+    schema = compact_schema({"spot": 1000})
+    pq.write_table(pa.concat_tables([to_compact_table(part, {"spot": 1000}).cast(schema) for part in parts]),
+                   tmp_path / "spot_actions.parquet")
+
+    # Merged with a legacy perp source at a third scale
+    perp = [13.5125, 13.6, 13.0001]
+    pq.write_table(legacy_table("perp", perp, 1), tmp_path / "perp_actions.parquet")
+    merged = build_merged_actions({"spot": str(tmp_path / "spot_actions.parquet"),
+                                   "perp": str(tmp_path / "perp_actions.parquet")}, str(tmp_path / "merged.parquet"))
+
+    stream = ActionStream(merged)
+    assert stream.price_scales == {"perp": 10_000, "spot": 1000}
+    batches = list(stream.iter_batches())
+    instruments = np.concatenate([batch.instrument for batch in batches])
+    prices = np.concatenate([batch.price for batch in batches])
+    ts = np.concatenate([batch.ts for batch in batches])
+    assert prices[instruments == INSTRUMENTS.index("perp")].tolist() == perp
+    assert prices[instruments == INSTRUMENTS.index("spot")].tolist() == coarse + fine
+    assert np.all(np.diff(ts) >= 0)
+
+
+def test_coarser_target_scale_raises(tmp_path):
+    pq.write_table(legacy_table("spot", [13.512]), tmp_path / "legacy.parquet")
+    table = pq.read_table(upgrade_actions_file(tmp_path / "legacy.parquet", tmp_path / "compact.parquet"))
+    with pytest.raises(ValueError):
+        to_compact_table(table, {"spot": 100})
+    with pytest.raises(ValueError):
+        to_compact_table(table, {"spot": 2500})
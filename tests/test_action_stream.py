@@ -0,0 +1,127 @@
+import heapq
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from objects.action import Action, INSTRUMENTS
+from objects.action_format import RowGroupWriter, compact_schema
+from objects.action_stream import ActionStream, build_merged_actions
+from objects.backtest import StrategyRun, make_config, replay
+from objects.order_book import OrderBook
+
+START = 1_733_306_400_000_000_000  # 2024-12-04 10:00
+
+
+def write_actions(path, instrument, ts, price_scale=100):
+    """Writes a compact actions file whose volumes number its rows, to track their order."""
+    n = len(ts)
+    table = pa.table({
+        "action_type": np.zeros(n, dtype=np.int8),
+        "side": np.arange(n, dtype=np.int8) % 2,
+        "price_ticks": np.full(n, 1350, dtype=np.int64),
+        "volume": np.arange(n, dtype=np.int64),
+        "ts_dt": pa.array(ts, type=pa.timestamp("ns")),
+        "instrument": np.full(n, INSTRUMENTS.index(instrument), dtype=np.int8),
+    }, schema=compact_schema({instrument: price_scale}))
+    pq.write_table(table, path)
+
+
+@pytest.mark.parametrize("batch_size", [1, 3, 7, 1000])
+def test_merge_matches_heap_merge_across_refills(tmp_path, batch_size):
+    rng = np.random.default_rng(2)
+    paths, rows = {}, {}
+    for inst in ["spot", "perp", "itrf"]:
+        # Few distinct timestamps: long runs of ties, within a file and across files
+        ts = START + np.sort(rng.integers(0, 25, 150)) * 10**6
+        paths[inst] = str(tmp_path / f"{inst}_actions.parquet")
+        write_actions(paths[inst], inst, ts)
+        rows[inst] = [(int(t), INSTRUMENTS.index(inst), i) for i, t in enumerate(ts)]
+
+    merged = pq.read_table(build_merged_actions(paths, str(tmp_path / "merged.parquet"), batch_size=batch_size))
+
+    # heapq.merge is stable: ties come out in instrument name order, then file order
+    expected = list(heapq.merge(*(rows[inst] for inst in sorted(paths)), key=lambda row: row[0]))
+    got = list(zip(merged.column("ts_dt").cast("int64").to_pylist(), merged.column("instrument").to_pylist(),
+                   merged.column("volume").to_pylist()))
+    assert got == expected
+
+
+def book_state(order_books):
+    return tuple((tuple(sorted(ob.bids.items())), tuple(sorted(ob.asks.items())))
+                 for _, ob in sorted(order_books.items()))
+
+
+def new_run():
+    order_books = {inst: OrderBook(None, inst) for inst in ["spot", "itrf", "perp"]}
+    return StrategyRun.from_config(make_config(), order_books)
+
+
+def per_event_states(merged_path):
+    """The original loop: apply one Action at a time, run the strategy on each new timestamp."""
+    stream, run = ActionStream(merged_path), new_run()
+    states, previous_ts = [], None
+    while (view := stream.next_action()) is not None:
+        action = Action(*view)
+        action.apply_ob(run.order_books)
+        for ob in run.order_books.values():
+            ob.ts_dt = action.ts_dt
+        if previous_ts is None or action.ts_dt != previous_ts:
+            run.on_timestamp(action.ts_dt)
+            states.append((action.ts_dt.value, book_state(run.order_books)))
+            previous_ts = action.ts_dt
+    return states, run
+
+
+@pytest.mark.parametrize("resume", [False, True])
+def test_segment_replay_matches_the_per_event_loop(synthetic_actions, resume):
+    expected, expected_run = per_event_states(synthetic_actions)
+
+    stream, run = ActionStream(synthetic_actions), new_run()
+    states = []
+
+    def on_timestamp(ts_dt):
+        run.on_timestamp(ts_dt)
+        states.append((ts_dt.value, book_state(run.order_books)))
+
+    if resume:
+        # Stop inside a run of equal timestamps, then resume from the next row
+        ts = np.concatenate([batch.ts for batch in stream.iter_batches()])
+        ties = np.flatnonzero(ts[1:] == ts[:-1]) + 1
+        split = int(ties[len(ties) // 2])
+        last_ts = replay(stream.iter_batches(0, split), run.order_books, on_timestamp)
+        assert last_ts.value == ts[split - 1] == ts[split]
+        replay(stream.iter_batches(split), run.order_books, on_timestamp, previous_ts=int(ts[split - 1]),
+               first_row=split)
+    else:
+        replay(stream.iter_batches(), run.order_books, on_timestamp)
+
+    assert len(states) == len(expected)
+    assert states == expected
+    assert run.trader.trades.to_table().equals(expected_run.trader.trades.to_table())
+
+
+def test_time_range_reads_only_overlapping_row_groups(tmp_path):
+    path = str(tmp_path / "actions.parquet")
+    schema = compact_schema({"spot": 100})
+    ts = START + np.arange(0, 2 * 3600, 7) * 10**9  # Two hours, eight 15-minute row groups
+    write_actions(str(tmp_path / "source.parquet"), "spot", ts)
+    with pq.ParquetWriter(path, schema) as writer:
+        row_groups = RowGroupWriter(writer)
+        row_groups.write_table(pq.read_table(tmp_path / "source.parquet"))
+        row_groups.close()
+
+    start, end = START + 20 * 60 * 10**9, START + 50 * 60 * 10**9
+    stream = ActionStream(path, batch_size=100, start=start, end=end)
+    groups = stream.row_groups()
+    assert len(groups) == 8
+
+    read = []
+    iter_batches = stream.parquet_file.iter_batches
+    stream.parquet_file.iter_batches = lambda *args, row_groups, **kwargs: (
+        read.extend(row_groups) or iter_batches(*args, row_groups=row_groups, **kwargs))
+
+    got = np.concatenate([batch.ts for batch in stream.iter_batches()])
+    assert read == [i for i, (_, _, min_ts, max_ts) in enumerate(groups) if max_ts >= start and min_ts < end] == [1, 2, 3]
+    assert np.array_equal(got, ts[(ts >= start) & (ts < end)])
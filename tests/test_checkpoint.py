@@ -0,0 +1,58 @@
+import glob
+import os
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from objects.action_stream import ActionStream
+from objects.backtest import make_config, run_backtest
+from objects.checkpoint import Checkpoint, CheckpointWriter, find_checkpoint
+from objects.trade_journal import TradeJournal
+
+SUMMARY_FIELDS = ("signals", "trades", "cny_balance", "rub_balance", "perp_balance", "itrf_balance",
+                  "approx_pnl", "turnover", "sharpe")
+
+
+@pytest.mark.parametrize("on_disk", [False, True])
+def test_resumed_run_matches_the_full_run(synthetic_actions, tmp_path, on_disk):
+    config = make_config()
+    stream = ActionStream(synthetic_actions)
+    trades_dir = str(tmp_path / "trades") if on_disk else None
+    writer = CheckpointWriter(str(tmp_path / "checkpoints"), pd.Timedelta(seconds=30))
+    full, _ = run_backtest(config, stream.iter_batches(), checkpoint_writer=writer,
+                           journal=TradeJournal(trades_dir, chunk_size=1 << 10))
+    full.trader.trades.flush()
+    expected = full.summary()
+
+    # Halfway through the replay, with trades both flushed and still buffered
+    middle = pd.Timestamp(full.trader.trades.to_table().column("ts_dt")[expected["trades"] // 2].as_py())
+    checkpoint = Checkpoint.load(find_checkpoint([writer.directory], middle))
+    assert 0 < checkpoint.state["trades"]["flushed"] + checkpoint.trades.num_rows < expected["trades"]
+
+    journal = TradeJournal(trades_dir, chunk_size=1 << 10, keep=checkpoint.state["trades"]["flushed"])
+    resumed, _ = run_backtest(config, stream.iter_batches(checkpoint.row), checkpoint=checkpoint, journal=journal)
+    journal.flush()
+
+    assert journal.to_table().equals(full.trader.trades.to_table())
+    summary = resumed.summary()
+    for name in SUMMARY_FIELDS:
+        assert summary[name] == expected[name], name
+    if on_disk:
+        assert TradeJournal.read(trades_dir).num_rows == expected["trades"]
+        # Checkpoints do not flush, so every part but the last is a full chunk
+        parts = [pq.ParquetFile(path).metadata.num_rows for path in sorted(glob.glob(os.path.join(trades_dir, "part-*.parquet")))]
+        assert set(parts[:-1]) == {1 << 10}
+
+
+def test_resume_needs_the_flushed_trades(synthetic_actions, tmp_path):
+    writer = CheckpointWriter(str(tmp_path / "checkpoints"), pd.Timedelta(seconds=30))
+    run_backtest(make_config(), ActionStream(synthetic_actions).iter_batches(), checkpoint_writer=writer,
+                 journal=TradeJournal(str(tmp_path / "trades"), chunk_size=1 << 8))
+    path = os.path.join(writer.directory, sorted(writer.index.values())[-1][1])
+    checkpoint = Checkpoint.load(path)
+    assert checkpoint.state["trades"]["flushed"] > 0
+
+    with pytest.raises(ValueError):
+        run_backtest(make_config(), ActionStream(synthetic_actions).iter_batches(checkpoint.row),
+                     checkpoint=checkpoint, journal=TradeJournal(str(tmp_path / "other")))
@@ -0,0 +1,23 @@
+import pytest
+
+from daily_backtest import run_days
+from objects.action_stream import ActionStream
+from objects.backtest import make_config, run_backtest
+from objects.daily import stitch_days
+
+
+def test_carried_days_match_the_sequential_backtest(synthetic_actions):
+    config = make_config()
+    run, _ = run_backtest(config, ActionStream(synthetic_actions).iter_batches())
+    expected = run.summary()
+
+    results = run_days(config, synthetic_actions, carry=True)
+    summary, trades, per_day = stitch_days(config, results)
+
+    assert per_day["carried_in"].tolist()[1:] == [True] * (len(results) - 1)
+    assert trades.to_table().equals(run.trader.trades.to_table())
+    for name in ("trades", "cny_balance", "rub_balance", "perp_balance", "itrf_balance", "approx_pnl"):
+        assert summary[name] == expected[name], name
+    # Stitched from per-day running sums, so equal up to summation order
+    for name in ("sharpe", "max_drawdown", "turnover", "mean_exposure", "max_exposure"):
+        assert summary[name] == pytest.approx(expected[name], rel=1e-9), name
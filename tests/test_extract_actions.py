@@ -0,0 +1,58 @@
+import os
+
+import pyarrow.parquet as pq
+import pytest
+
+from objects.action import ACTION_TYPES, SIDES
+from objects.action_format import read_price_scales
+from objects.order_book import OrderBook
+from conftest import SYNTHETIC_DAYS
+from utils import process_day_actions
+
+
+def reference_actions(snapshot_paths, instrument, price_scale):
+    """Actions of one sequential OrderBook.compute_differences pass over all the snapshots."""
+    rows = []
+    previous = None
+    for path in snapshot_paths:
+        for record in pq.read_table(path).to_pandas().to_dict("records"):
+            book = OrderBook(record, instrument)
+            if previous is not None:
+                for action in previous.compute_differences(book):
+                    rows.append((ACTION_TYPES.index(action.action_type), SIDES.index(action.side),
+                                 round(action.price * price_scale), action.volume, action.ts_dt.value))
+            previous = book
+    return rows
+
+
+@pytest.mark.parametrize("instrument", ["spot", "itrf"])
+@pytest.mark.parametrize("chunk_size", [97, 10_000])
+def test_day_units_match_sequential_compute_differences(synthetic_actions, tmp_path, instrument, chunk_size):
+    pqt_dir = os.path.join(os.path.dirname(os.path.dirname(synthetic_actions)), "pqt")
+    # Several row groups per day, so chunks both end inside a row group and at its end
+    for day in SYNTHETIC_DAYS:
+        os.makedirs(tmp_path / "pqt" / day)
+        table = pq.read_table(os.path.join(pqt_dir, day, f"{instrument}_ob_data.parquet"))
+        pq.write_table(table, tmp_path / "pqt" / day / f"{instrument}_ob_data.parquet", row_group_size=1000)
+
+    actions, previous_day = [], None
+    for day in SYNTHETIC_DAYS:
+        output_path = tmp_path / f"{day}_{instrument}_actions.parquet"
+        process_day_actions(str(tmp_path / "pqt"), output_path, instrument, day, previous_day, chunk_size, False)
+        actions.append(pq.read_table(output_path))
+        previous_day = day
+
+    price_scale = read_price_scales(actions[-1].schema)[instrument]
+    assert read_price_scales(actions[0].schema)[instrument] <= price_scale
+    got = [
+        (int(a), int(s), int(p) * price_scale // read_price_scales(table.schema)[instrument], int(v), int(ts))
+        for table in actions
+        for a, s, p, v, ts in zip(*(table.column(name).to_numpy() for name in
+                                    ("action_type", "side", "price_ticks", "volume")),
+                                  table.column("ts_dt").cast("int64").to_numpy())
+    ]
+    snapshot_paths = [tmp_path / "pqt" / day / f"{instrument}_ob_data.parquet" for day in SYNTHETIC_DAYS]
+    expected = reference_actions(snapshot_paths, instrument, price_scale)
+
+    assert len(got) == len(expected) > 0
+    assert got == expected
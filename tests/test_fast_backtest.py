@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from conftest import SYNTHETIC_DAYS
+from objects.action_stream import ActionStream
+from objects.backtest import make_config, run_backtest
+from objects.fast_backtest import FAST_TOLERANCE, FastBacktest
+from objects.feature_store import FeatureStore
+
+
+@pytest.mark.parametrize("thresholds", [{}, {"spot_perp": 0.05, "perp_itrf": 0.2}])
+def test_fast_path_within_documented_tolerance(synthetic_actions, thresholds):
+    config = make_config(obi_thresholds=thresholds)
+    pqt_dir = os.path.join(os.path.dirname(os.path.dirname(synthetic_actions)), "pqt")
+    fast, _ = FastBacktest(pqt_dir, SYNTHETIC_DAYS).run(config)
+
+    # The reference, reading OBI from the same feature store
+    features = FeatureStore(pqt_dir).view(SYNTHETIC_DAYS)
+    run, _ = run_backtest(config, ActionStream(synthetic_actions).iter_batches(), features=features)
+    reference = run.summary()
+
+    assert fast["fired_timestamps"] == pytest.approx(reference["signals"], rel=FAST_TOLERANCE)
+    assert fast["marks"] == reference["marks"]
+    # Own fills are not replayed against the book, so the fast path never trades more
+    assert 0 < fast["trades"] <= reference["trades"]
@@ -0,0 +1,60 @@
+import os
+import shutil
+
+import pyarrow.parquet as pq
+import pytest
+
+import objects.feature_store
+from objects.feature_store import FeatureStore, compute_features
+
+
+@pytest.fixture
+def store_dir(synthetic_actions, tmp_path):
+    """One day and instrument of the synthetic snapshots, in a store of its own."""
+    source = os.path.join(os.path.dirname(os.path.dirname(synthetic_actions)), "pqt", "12-04", "spot_ob_data.parquet")
+    os.makedirs(tmp_path / "12-04")
+    shutil.copy(source, tmp_path / "12-04" / "spot_ob_data.parquet")
+    return str(tmp_path)
+
+
+def count_digests(monkeypatch):
+    digests = []
+    file_digest = objects.feature_store.file_digest
+    monkeypatch.setattr(objects.feature_store, "file_digest", lambda path: digests.append(path) or file_digest(path))
+    return digests
+
+
+def test_touched_source_is_hashed_once_and_not_rebuilt(store_dir, monkeypatch):
+    assert FeatureStore(store_dir).build("12-04", "spot")
+    store = FeatureStore(store_dir)
+    built_at = os.stat(store.feature_path("12-04", "spot")).st_mtime_ns
+    assert not store.build("12-04", "spot")
+
+    source = store.source_path("12-04", "spot")
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    digests = count_digests(monkeypatch)
+    assert not FeatureStore(store_dir).build("12-04", "spot")
+    assert len(digests) == 1  # Same content under a new mtime
+
+    # The manifest now has the new mtime, so the next store does not hash the file again
+    assert not FeatureStore(store_dir).build("12-04", "spot")
+    assert len(digests) == 1
+    assert os.stat(store.feature_path("12-04", "spot")).st_mtime_ns == built_at
+
+
+def test_changed_source_is_rebuilt(store_dir):
+    store = FeatureStore(store_dir)
+    store.build("12-04", "spot")
+    source = store.source_path("12-04", "spot")
+    table = pq.read_table(source)
+    stat = os.stat(source)
+
+    # Half the snapshots, under a later mtime
+    pq.write_table(table.slice(0, table.num_rows // 2), source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    store = FeatureStore(store_dir)
+    assert store.build("12-04", "spot")
+    assert store.entries["12-04/spot"]["rows"] == table.num_rows // 2
+    assert store.read("12-04", "spot").equals(compute_features(pq.read_table(source)))
+    assert not FeatureStore(store_dir).build("12-04", "spot")
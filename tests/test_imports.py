@@ -0,0 +1,6 @@
+from benchmarks import IMPORT_BUDGET, benchmark_imports
+
+
+def test_engine_import_within_budget():
+    # Also fails if an engine module imports matplotlib, statsmodels or scipy eagerly
+    assert benchmark_imports(budget=IMPORT_BUDGET, repeat=3) == 0
@@ -0,0 +1,21 @@
+import asyncio
+
+from objects.action_stream import ActionStream
+from objects.backtest import StrategyRun, make_config, run_backtest
+from objects.live import LATENCIES, LiveRunner, ParquetSource
+from objects.order_book import OrderBook
+
+
+def test_live_run_trades_like_the_backtest(synthetic_actions):
+    config = make_config()
+    expected, _ = run_backtest(config, ActionStream(synthetic_actions).iter_batches())
+
+    strategy = StrategyRun.from_config(config, {inst: OrderBook(None, inst) for inst in ["spot", "itrf", "perp"]})
+    runner = LiveRunner(strategy, ParquetSource(synthetic_actions, speed=0))
+    report = asyncio.run(runner.run())
+
+    assert strategy.trader.trades.to_table().equals(expected.trader.trades.to_table())
+    assert "append" not in vars(strategy.trader.trades)  # Orders come from the trader's hook
+    assert report["orders"] == len(expected.trader.trades) > 0
+    assert set(report["latency"]) == set(LATENCIES)
+    assert report["latency"]["dequeue_to_decision"]["count"] == report["evaluations"]
@@ -0,0 +1,57 @@
+import copy
+
+from objects.order_book import BookSide
+
+
+def assert_consistent(side):
+    assert side.prices == sorted(dict.keys(side))
+    assert side.total == sum(dict.values(side))
+
+
+def test_book_side_dict_api_keeps_prices_and_total():
+    side = BookSide(is_bid=True, levels=[(10.0, 5), (11.0, 3)])
+    side |= {12.0: 4, 10.0: 1}
+    assert_consistent(side)
+    assert side.best() == 12.0
+
+    clone = side.copy()
+    assert type(clone) is BookSide and clone.is_bid
+    clone[13.0] = 2
+    assert_consistent(clone)
+    assert 13.0 not in side and side.total == 8
+
+    assert side.popitem() == (12.0, 4)
+    assert_consistent(side)
+    side.setdefault(9.0, 7)
+    side.pop(11.0)
+    side.update({8.0: 1})
+    assert_consistent(side)
+    assert_consistent(copy.deepcopy(side))
+
+    side.clear()
+    assert_consistent(side)
+    assert side.best() is None
+
+
+def test_running_side_volumes_match_summation_over_full_replay(synthetic_actions):
+    from objects.order_book import OrderBook
+    from objects.action_stream import ActionStream
+    from objects.backtest import StrategyRun, make_config, replay
+
+    order_books = {inst: OrderBook(None, inst) for inst in ["spot", "itrf", "perp"]}
+    run = StrategyRun.from_config(make_config(), order_books)
+    trader = run.trader
+    checked = []
+
+    def on_timestamp(ts_dt):
+        run.on_timestamp(ts_dt)  # Its trades take liquidity out of the books too
+        for inst, ob in order_books.items():
+            bid_volume, ask_volume = sum(ob.bids.values()), sum(ob.asks.values())
+            assert ob.get_side_volumes() == (bid_volume, ask_volume)
+            expected = (bid_volume - ask_volume) / (bid_volume + ask_volume) if bid_volume + ask_volume else None
+            assert trader.get_obi(inst) == expected
+        checked.append(ts_dt)
+
+    replay(ActionStream(synthetic_actions).iter_batches(), order_books, on_timestamp)
+    assert len(checked) > 1000
+    assert len(trader.trades) > 0
@@ -0,0 +1,69 @@
+from copy import deepcopy
+
+import numpy as np
+import pandas as pd
+
+from objects.portfolio import Portfolio
+from objects.trade import Trade
+
+MARKETS = ("spot", "perp", "itrf")
+
+
+def baseline_can_trade(portfolio, trade):
+    """Portfolio.can_trade as first written: a binary search over deep copies."""
+    unleveraged_balance = (
+        (portfolio.cny_balance + portfolio.itrf_balance + portfolio.perp_balance) * 14 + portfolio.rub_balance
+    )
+    if unleveraged_balance <= 0:
+        return 0
+
+    left, right = 0, trade.size
+    best_size = 0
+    while left <= right:
+        mid = (left + right) / 2
+        temp_trade = deepcopy(trade)
+        temp_trade.size = mid
+        temp_portfolio = deepcopy(portfolio)
+        temp_trade.apply(temp_portfolio)
+        leveraged_balance = (
+            (abs(temp_portfolio.cny_balance) + abs(temp_portfolio.itrf_balance) + abs(temp_portfolio.perp_balance)) * 14
+            + abs(temp_portfolio.rub_balance)
+        )
+        if leveraged_balance / unleveraged_balance <= portfolio.leverage_limit:
+            best_size = mid
+            left = mid + 1e-3
+        else:
+            right = mid - 1e-3
+    return round(best_size)
+
+
+def random_case(rng):
+    now = pd.Timestamp("2024-12-04 12:00")
+    portfolio = Portfolio(
+        initial_cny=int(rng.choice([10_000_000, rng.integers(-2_000_000, 12_000_000)])),
+        initial_rub=float(rng.choice([0.0, rng.normal(0, 5e7)])),
+        initial_perp=int(rng.integers(-3_000_000, 3_000_000)) if rng.random() < 0.5 else 0,
+        initial_itrf=int(rng.integers(-3_000_000, 3_000_000)) if rng.random() < 0.5 else 0,
+        leverage_limit=float(rng.choice([1, 1.5, 2, 5])),
+    )
+    # Up to a day of interest to accrue, or none
+    portfolio.last_update_ts_dt = now - pd.Timedelta(seconds=int(rng.choice([0, 3600, rng.integers(0, 86_400)])))
+    buy, sell = rng.choice(MARKETS, size=2, replace=False)
+    price = 13.5 + rng.normal(0, 0.05)
+    trade = Trade(now, str(buy), str(sell), round(price + 0.001, 4), round(price, 4),
+                  int(rng.integers(1, 5_000_000)), str(rng.choice(["taker", "maker"])))
+    return portfolio, trade
+
+
+def test_can_trade_matches_baseline_search():
+    rng = np.random.default_rng(5)
+    for _ in range(3000):
+        portfolio, trade = random_case(rng)
+        assert portfolio.can_trade(trade) == baseline_can_trade(portfolio, trade)
+
+
+def test_can_trade_at_the_limit_after_interest():
+    portfolio = Portfolio(initial_cny=10_000_000, leverage_limit=1)
+    portfolio.last_update_ts_dt = pd.Timestamp("2024-12-04 11:00")
+    trade = Trade(pd.Timestamp("2024-12-04 12:00"), "perp", "spot", 13.52, 13.51, 1_000, "taker")
+    assert portfolio.can_trade(trade) == baseline_can_trade(portfolio, trade)
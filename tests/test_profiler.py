@@ -0,0 +1,84 @@
+import math
+
+import pytest
+
+import objects.profiler
+from objects.action_stream import ActionStream
+from objects.backtest import make_config, run_backtest
+from objects.profiler import Profiler
+
+
+class FakeClock:
+    """Stands in for the time module; the clock only moves when the profiled code says so."""
+
+    def __init__(self):
+        self.now = 0
+
+    def perf_counter_ns(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(objects.profiler, "time", clock)
+    return clock
+
+
+def test_section_totals_with_every_call_timed(clock):
+    profiler = Profiler()
+
+    def work(ns):
+        clock.now += ns
+        return ns
+
+    step = profiler.wrap(work, "step")
+    items = profiler.wrap_iter((work(2_000) for _ in range(3)), "decode")
+    assert [step(ns) for ns in items] == [2_000] * 3
+    with profiler.timed("merge"):
+        clock.now += 5_000_000
+
+    report = profiler.report()
+    assert report["wall_seconds"] == pytest.approx(0.005012)
+    assert report["sample_every"] == 1
+    stages = report["stages"]
+    assert {name: stage["calls"] for name, stage in stages.items()} == {"step": 3, "decode": 3, "merge": 1}
+    assert stages["step"]["total_seconds"] == pytest.approx(6e-6)
+    assert stages["decode"]["total_seconds"] == pytest.approx(6e-6)
+    assert stages["merge"]["total_seconds"] == pytest.approx(5e-3)
+    assert stages["step"]["mean_us"] == stages["step"]["p50_us"] == stages["step"]["max_us"] == pytest.approx(2.0)
+    assert sum(stage["share"] for stage in stages.values()) == pytest.approx(1.0)
+
+
+def test_sampled_totals_are_scaled_to_all_calls(clock):
+    profiler = Profiler(sample_every=4)
+
+    def work(ns):
+        clock.now += ns
+
+    step = profiler.wrap(work, "step")
+    for i in range(10):
+        step((i + 1) * 1_000)
+
+    report = profiler.report()
+    stage = report["stages"]["step"]
+    assert report["sample_every"] == 4
+    # Calls 0, 4 and 8 are timed: 1, 5 and 9 µs, scaled by 10 calls over 3 samples
+    assert (stage["calls"], stage["sampled_calls"]) == (10, 3)
+    assert stage["total_seconds"] == pytest.approx(15e-6 * 10 / 3)
+    assert stage["mean_us"] == pytest.approx(5.0)
+    assert stage["max_us"] == pytest.approx(9.0)
+
+
+@pytest.mark.parametrize("sample_every", [1, 7])
+def test_backtest_profile_counts_every_call(synthetic_actions, sample_every):
+    profiler = Profiler(sample_every=sample_every)
+    run, _ = run_backtest(make_config(), ActionStream(synthetic_actions).iter_batches(), profiler=profiler)
+
+    report = profiler.report()
+    assert report["sample_every"] == sample_every
+    stages = report["stages"]
+    assert stages["strategy"]["calls"] == stages["find_trade_opportunity"]["calls"] + stages["unwind"]["calls"]
+    for stage in stages.values():
+        assert stage["sampled_calls"] == math.ceil(stage["calls"] / sample_every)
+    assert stages["decode"]["calls"] == len(list(ActionStream(synthetic_actions).iter_batches()))
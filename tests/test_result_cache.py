@@ -0,0 +1,58 @@
+import os
+import shutil
+
+import grid
+from grid import run_grid
+from objects.backtest import make_config
+from objects.manifest import file_manifest, manifest_hash
+from objects.result_cache import ResultCache
+from utils import action_paths
+
+CONFIGS = [make_config(end="2024-12-04 10:01"),
+           make_config(obi_thresholds={"spot_perp": 0.05}, end="2024-12-04 10:01")]
+
+
+def test_key_follows_config_and_sources(synthetic_actions, tmp_path):
+    paths, _ = action_paths(os.path.dirname(synthetic_actions))
+    input_hash = manifest_hash(file_manifest(paths))
+    key = ResultCache.key(CONFIGS[0], input_hash)
+
+    assert ResultCache.key(make_config(end="2024-12-04 10:01"), input_hash) == key
+    assert ResultCache.key(dict(reversed(list(CONFIGS[0].items()))), input_hash) == key
+    assert ResultCache.key(CONFIGS[1], input_hash) != key
+    assert ResultCache.key(make_config(end="2024-12-04 10:01", leverage_limit=4), input_hash) != key
+
+    # Any change of a source's path, size or mtime is a new input
+    for name in paths:
+        copy = str(tmp_path / os.path.basename(paths[name]))
+        shutil.copy2(paths[name], copy)
+        assert ResultCache.key(CONFIGS[0], manifest_hash(file_manifest({**paths, name: copy}))) != key
+
+
+def test_grid_reruns_only_cache_misses(synthetic_actions, tmp_path, monkeypatch):
+    actions_dir = tmp_path / "actions"
+    shutil.copytree(os.path.dirname(synthetic_actions), actions_dir)
+    paths, merged_path = action_paths(str(actions_dir))
+    cache = ResultCache(str(tmp_path / "results"))
+
+    runs = []
+    cached_backtest = grid.cached_backtest
+    monkeypatch.setattr(grid, "cached_backtest", lambda config, *args: runs.append(config) or cached_backtest(config, *args))
+
+    first = run_grid(CONFIGS, paths, merged_path, cache)
+    assert runs == CONFIGS
+    assert all(key in cache for key in first["key"])
+    assert cache.load_trades(first["key"][0]).num_rows == first["trades"][0] > 0
+
+    # Hits: nothing runs, the stored summaries come back
+    second = run_grid(CONFIGS + CONFIGS[:1], paths, merged_path, cache)
+    assert len(runs) == 2
+    assert second.iloc[:2].equals(first) and second.iloc[2].equals(first.iloc[0])
+
+    # A changed source invalidates every entry
+    stat = os.stat(paths["spot"])
+    os.utime(paths["spot"], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    third = run_grid(CONFIGS, paths, merged_path, cache)
+    assert len(runs) == 4
+    assert set(third["key"]).isdisjoint(first["key"])
+    assert third.drop(columns="key").equals(first.drop(columns="key"))
@@ -0,0 +1,35 @@
+import pytest
+
+from objects.action_stream import ActionStream
+from objects.backtest import make_config, run_backtest
+from objects.order_book import OrderBook
+from objects.sweep import Sweep
+
+CONFIGS = [
+    make_config(),
+    make_config(obi_thresholds={"spot_perp": 0.05, "perp_itrf": 0.2}),
+    make_config(obi_thresholds={"spot_itrf": 0.02}, leverage_limit=2),
+    make_config(unwind_time="10:03", cny_initial=1_000_000),
+    make_config(start="2024-12-05"),
+]
+
+
+def new_books():
+    return {inst: OrderBook(None, inst) for inst in ["spot", "itrf", "perp"]}
+
+
+@pytest.mark.parametrize("configs", [CONFIGS, CONFIGS[:2], [CONFIGS[2], CONFIGS[4]]],
+                         ids=["all", "thresholds", "leverage-and-start"])
+def test_sweep_matches_independent_backtests(synthetic_actions, configs):
+    sweep = Sweep(new_books(), configs)
+    sweep.run(ActionStream(synthetic_actions).iter_batches())
+
+    for config, swept in zip(configs, sweep.runs):
+        run, _ = run_backtest(config, ActionStream(synthetic_actions).iter_batches())
+        assert swept.trader.trades.to_table().equals(run.trader.trades.to_table())
+        assert swept.summary() == run.summary()
+
+
+def test_sweep_configs_share_the_end():
+    with pytest.raises(ValueError):
+        Sweep(new_books(), [make_config(end="2024-12-05"), make_config()])
@@ -0,0 +1,57 @@
+from objects.action_stream import ActionStream
+from objects.backtest import make_config, run_backtest
+from objects.order_book import OrderBook
+from objects.trader import SpreadTrader
+
+
+class NoVersions(dict):
+    """Pair versions that never match, so every pair is read and evaluated."""
+
+    def get(self, key, default=None):
+        return default
+
+
+def test_every_write_changes_the_book_version():
+    ob = OrderBook(None, "spot")
+    seen = {ob.get_version()}
+    for write in (lambda: ob.bids.__setitem__(10.0, 5), lambda: ob.asks.__setitem__(11.0, 3),
+                  lambda: ob.bids.__setitem__(10.0, 5), lambda: ob.bids.pop(10.0), lambda: ob.asks.clear()):
+        write()
+        assert ob.get_version() not in seen
+        seen.add(ob.get_version())
+    ob.bids.best()
+    ob.get_side_volumes()
+    assert ob.get_version() in seen
+
+
+def test_version_skip_keeps_the_trades(synthetic_actions):
+    def run(on_evaluated=None):
+        return run_backtest(make_config(), ActionStream(synthetic_actions).iter_batches(), on_evaluated=on_evaluated)[0]
+
+    def read_every_pair(run_, ts_dt):
+        if not isinstance(run_.trader._pair_versions, NoVersions):
+            run_.trader._pair_versions = NoVersions()
+
+    fast, reference = run(), run(read_every_pair)
+    # A pair skipped on its versions would have been skipped on its signal state as well
+    assert fast.trader.evaluations == reference.trader.evaluations
+    assert fast.trader.skipped_evaluations == reference.trader.skipped_evaluations
+    assert fast.trader.trades.to_table().equals(reference.trader.trades.to_table())
+
+
+def test_untouched_pairs_are_skipped_without_reading_the_books(synthetic_actions):
+    run, _ = run_backtest(make_config(), ActionStream(synthetic_actions).iter_batches())
+    # OBI is within [-1, 1], so no rule fires and every pair is remembered after one evaluation
+    trader = SpreadTrader(run.order_books, run.portfolio, dict.fromkeys(run.trader.obi_thresholds, 1.0))
+    assert not trader.find_trade_opportunity()
+
+    reads = []
+    for ob in run.order_books.values():
+        for name in ("get_best_bid_ask", "get_side_volumes"):
+            method = getattr(ob, name)
+            setattr(ob, name, lambda method=method, name=name: reads.append(name) or method())
+
+    skipped = trader.skipped_evaluations
+    assert not trader.find_trade_opportunity()
+    assert reads == []
+    assert trader.skipped_evaluations == skipped + len(trader.PAIRS)